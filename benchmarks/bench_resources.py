@@ -0,0 +1,78 @@
+"""Memory of one scan held as plain resource dicts vs compact Resource records
+
+    python -m benchmarks.bench_resources [instances] [volumes]
+
+Builds the same synthetic fleet twice, as the scanner's old per-resource dicts and as
+src/resources.py records, and reports the traced bytes per resource of each, the
+CostAnalyzer time on both and whether they serialize to identical JSON.
+"""
+import contextlib
+import io
+import json
+import sys
+import time
+import tracemalloc
+from benchmarks.bench_analyzer import synthetic_region
+from src.analyzer import CostAnalyzer
+from src.resources import EC2Instance, compact_records, to_json
+from config import UTILIZATION_FIELDS
+
+
+def fleet(instances, volumes):
+    region = synthetic_region(instances, volumes, idle_rate=0.05)
+    for n, instance in enumerate(region['ec2_instances']):
+        for field in UTILIZATION_FIELDS:
+            instance.setdefault(field, float(n % 97))
+        instance['tags'].update({'team': f"team-{n % 20}", 'env': 'prod' if n % 3 else 'staging'})
+        instance['account_id'] = '111111111111'
+    # Fields in the order the scanner sets them
+    region['ec2_instances'] = [{field: instance[field] for field in EC2Instance.FIELDS}
+                               for instance in region['ec2_instances']]
+    for volume in region['ebs_volumes']:
+        volume['attached'] = volume['state'] == 'in-use'
+        volume['account_id'] = '111111111111'
+    return region
+
+
+def traced(build):
+    """(result of build(), bytes it allocated and still holds)"""
+    tracemalloc.start()
+    try:
+        result = build()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def analyze_seconds(region):
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        CostAnalyzer({'regions': {'us-east-1': region}}).analyze()
+        return time.perf_counter() - started
+
+
+def run(instances=100000, volumes=20000):
+    # Both builds start from JSON text, as a scan does from API responses or a file
+    text = json.dumps(fleet(instances, volumes))
+    dicts, dict_bytes = traced(lambda: json.loads(text))
+    compact, compact_bytes = traced(lambda: {resource_type: compact_records(resource_type, records)
+                                             for resource_type, records in json.loads(text).items()})
+    resources = instances + volumes
+    analyze_seconds(dicts)  # warm up imports and the pricing tables
+
+    return {
+        'benchmark': 'resources',
+        'instances': instances,
+        'volumes': volumes,
+        'dict_bytes_per_resource': round(dict_bytes / resources),
+        'compact_bytes_per_resource': round(compact_bytes / resources),
+        'memory_ratio': round(dict_bytes / compact_bytes, 2),
+        'dict_analyze_seconds': round(analyze_seconds(dicts), 4),
+        'compact_analyze_seconds': round(analyze_seconds(compact), 4),
+        'identical_json': json.dumps(compact, default=to_json) == text,
+    }
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:3]]
+    print(json.dumps(run(*args), indent=2))
@@ -0,0 +1,91 @@
+"""Import cost of each entry point, measured in fresh interpreters
+
+    python -m benchmarks.bench_startup [--repeat N] [--top N] [--output results.json]
+
+For src.app, src.scheduler and src.scanner (the modules behind the dashboard, the
+scheduler and `python -m src.scanner`), runs `python -X importtime -c "import <module>"`
+--repeat times and reports the median wall-clock import time, the heavy third-party
+packages the import pulled in, and the slowest imports by cumulative time from the
+median run. Heavy packages should show up only where the entry point really needs them.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ENTRY_POINTS = ['src.app', 'src.scheduler', 'src.scanner']
+HEAVY_PACKAGES = ['numpy', 'sklearn', 'scipy', 'boto3', 'botocore', 'flask', 'apscheduler']
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Prints the heavy packages present after the import, on a 'heavy:' stdout line
+PROBE = "import sys; import {module}; print('heavy:' + ','.join(p for p in {heavy!r} if p in sys.modules))"
+
+
+def parse_importtime(stderr):
+    """{module: cumulative microseconds} from -X importtime output"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+
+def measure(module):
+    """One fresh-interpreter import of module: (seconds, heavy packages loaded, {module: cumulative us})"""
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module,
+                                                                                      heavy=HEAVY_PACKAGES)],
+                               cwd=ROOT, capture_output=True, text=True, check=True)
+    seconds = time.perf_counter() - started
+    probe = [line for line in completed.stdout.splitlines() if line.startswith('heavy:')][-1]
+    heavy = [name for name in probe[len('heavy:'):].split(',') if name]
+    return seconds, heavy, parse_importtime(completed.stderr)
+
+
+def run(repeat=5, top=10, entry_points=ENTRY_POINTS):
+    results = {}
+    for module in entry_points:
+        runs = sorted((measure(module) for _ in range(repeat)), key=lambda run: run[0])
+        seconds, heavy, cumulative = runs[len(runs) // 2]
+        slowest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)
+        results[module] = {
+            'seconds_median': round(seconds, 4),
+            'seconds_min': round(runs[0][0], 4),
+            'seconds_stdev': round(statistics.pstdev(run[0] for run in runs), 4),
+            'heavy_packages': heavy,
+            'slowest_imports_ms': {name: round(us / 1000, 1) for name, us in slowest[:top]},
+        }
+
+    # The interpreter itself, so entry point numbers can be read as overhead on top of it
+    baseline = statistics.median(measure('sys')[0] for _ in range(repeat))
+    return {
+        'benchmark': 'startup',
+        'python': platform.python_version(),
+        'repeat': repeat,
+        'interpreter_seconds': round(baseline, 4),
+        'entry_points': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per entry point')
+    parser.add_argument('--top', type=int, default=10, help='slowest imports listed per entry point')
+    parser.add_argument('--output', help='also write the JSON result to this file')
+    args = parser.parse_args(argv)
+
+    text = json.dumps(run(args.repeat, args.top), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
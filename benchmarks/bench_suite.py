@@ -0,0 +1,143 @@
+"""End-to-end timings on a synthetic fleet served by the in-process FakeAWS
+
+    python -m benchmarks.bench_suite [--instances N] [--regions N] [--latency S] [--throttle-rate P]
+                                     [--output results.json]
+
+Times a full scan_all_regions, CostAnalyzer.analyze, MLRecommender.generate_ml_recommendations,
+a real-mode executor batch (stops plus pipelined snapshot-then-delete) and the Flask read
+APIs, and prints one JSON document: the fleet parameters, seconds per stage, AWS calls per
+operation and the rate limiter totals. Keep the parameters fixed to compare runs.
+Everything is written to a temporary directory; the real data directories are not touched.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+from unittest.mock import patch
+from benchmarks.fake_aws import FakeAWS
+from config import AWS_REGIONS
+from src import app as app_module
+from src import scanner as scanner_module
+from src.analyzer import CostAnalyzer
+from src.artifacts import LatestArtifact, notify_written
+from src.clients import client_pool
+from src.executor import RemediationExecutor
+from src.history import HistoryStore
+from src.ratelimit import rate_limiter
+from src.recommender import MLRecommender
+from src.resources import to_json
+from src.snapshots import SnapshotPipeline
+from src.storage import list_scan_files
+
+
+def stage(timings, name, fn):
+    """Run fn() once with its output silenced, recording seconds under timings[name]"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        result = fn()
+        timings[name] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def run(instances=10000, regions=4, latency=0.0, throttle_rate=0.0, actions=1000, api_requests=20, seed=42):
+    fake = FakeAWS(AWS_REGIONS[:regions], instances=instances, latency=latency, throttle_rate=throttle_rate,
+                   seed=seed)
+    timings = {}
+    rate_limiter.reset()
+    client_pool.use_factory(fake.client)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            scan_dir = os.path.join(tmp, 'scans')
+            report_dir = os.path.join(tmp, 'recommendations')
+            os.makedirs(scan_dir)
+            os.makedirs(report_dir)
+
+            # The scan's history rows go to a throwaway store, as its files go to scan_dir
+            history = HistoryStore(os.path.join(tmp, 'history.db'))
+            with patch.object(scanner_module, 'SCAN_DATA_DIR', scan_dir), \
+                    patch.object(scanner_module, 'get_history_store', lambda: history):
+                scan = stage(timings, 'scan_all_regions', lambda: scanner_module.AWSResourceScanner().scan_all_regions())
+            history.close()
+
+            analysis = stage(timings, 'analyze', lambda: CostAnalyzer(scan).analyze())
+            ml_recommendations = stage(timings, 'ml_recommendations', lambda: MLRecommender(
+                model_path=os.path.join(tmp, 'model.pkl')).generate_ml_recommendations(scan))
+            recommendations = analysis['recommendations'] + ml_recommendations
+
+            report_path = os.path.join(report_dir, 'report_bench.json')
+            with open(report_path, 'w') as f:
+                json.dump({'timestamp': scan['scan_time'], 'recommendations': recommendations}, f, default=to_json)
+            notify_written(report_dir)
+
+            executable = [rec for rec in recommendations if rec['action'] in ('STOP', 'SNAPSHOT_DELETE')][:actions]
+            executor = RemediationExecutor(dry_run=False, snapshots=SnapshotPipeline(
+                state_path=os.path.join(tmp, 'snapshots.json'), poll_interval=0))
+            executed = stage(timings, 'executor_batch', lambda: executor.execute_batch(executable))
+
+            latest_scans = LatestArtifact(scan_dir, list_files=lambda: list_scan_files(scan_dir))
+            with patch.object(app_module, 'latest_scans', latest_scans), \
+                    patch.object(app_module, 'latest_recommendations', LatestArtifact(report_dir)):
+                api = app_module.app.test_client()
+                for name, url in (('api_latest_scan', '/api/latest-scan'),
+                                  ('api_latest_recommendations', '/api/latest-recommendations'),
+                                  ('api_recommendations_query', '/api/recommendations?sort=-monthly_savings&limit=50')):
+                    first = stage(timings, f"{name}_cold", lambda: api.get(url))
+                    assert first.status_code == 200, (url, first.status_code)
+                    stage(timings, f"{name}_warm", lambda: [api.get(url) for _ in range(api_requests)])
+                    timings[f"{name}_warm"] = round(timings[f"{name}_warm"] / api_requests, 5)
+    finally:
+        client_pool.use_factory(None)
+
+    return {
+        'benchmark': 'suite',
+        'python': platform.python_version(),
+        'fleet': {
+            'instances': instances,
+            'volumes': sum(fake.counts['ebs'].values()),
+            'rds_instances': sum(fake.counts['rds'].values()),
+            'regions': regions,
+            'latency': latency,
+            'throttle_rate': throttle_rate,
+            'seed': seed,
+        },
+        'seconds': timings,
+        'results': {
+            'recommendations': len(analysis['recommendations']),
+            'ml_recommendations': len(ml_recommendations),
+            'actions': len(executed),
+            'failed_actions': sum(1 for action in executed if not action['success']),
+            'scan_errors': len(scan.get('scan_errors', {})),
+        },
+        'aws_calls': {f"{service}.{operation}": count for (service, operation), count in sorted(fake.calls.items())},
+        'rate_limiter': rate_limiter.totals(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--instances', type=int, default=10000)
+    parser.add_argument('--regions', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every AWS call')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of AWS calls throttled')
+    parser.add_argument('--actions', type=int, default=1000, help='recommendations sent to the executor')
+    parser.add_argument('--api-requests', type=int, default=20, help='warm requests per API endpoint')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='also write the JSON result to this file')
+    args = parser.parse_args(argv)
+
+    result = run(args.instances, args.regions, args.latency, args.throttle_rate, args.actions, args.api_requests,
+                 args.seed)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+"""In-process stand-in for the EC2, EBS, RDS, CloudWatch and STS APIs the tool uses
+
+    fake = FakeAWS(regions=['us-east-1', 'eu-west-1'], instances=100000, latency=0.002, throttle_rate=0.01)
+    client_pool.use_factory(fake.client)
+
+With accounts=[...], STS AssumeRole into those accounts works and hands out credentials
+that expire after credential_ttl seconds (by `clock`); clients built with them see their
+own copy of the fleet and reject calls made with expired credentials.
+
+Resources are generated deterministically page by page, so a million-instance fleet
+costs no more memory than the pages in flight. Every call goes through the shared
+RateLimiter exactly as pooled boto3 clients do (a token per attempt, throttles halve
+the rate, retries draw on the budget) and is timed into the shared metrics, then sleeps
+`latency` seconds and is throttled with probability `throttle_rate`. Calls are counted
+per (service, operation).
+"""
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from src.accounts import parse_role_arn
+from types import SimpleNamespace
+from botocore.exceptions import ClientError
+from src.metrics import metrics
+from src.ratelimit import rate_limiter
+
+INSTANCE_TYPES = ['t2.micro', 't2.small', 't2.medium', 't3.micro', 't3.small', 't3.medium', 'm5.large', 'c5.xlarge']
+VOLUME_SIZES = [8, 20, 50, 100, 500]
+DB_CLASSES = ['db.t3.micro', 'db.t3.medium', 'db.m5.large']
+
+EC2_PAGE_SIZE = 1000
+EBS_PAGE_SIZE = 500
+RDS_PAGE_SIZE = 100
+# GetMetricData returns at most 100,800 datapoints per call before paging
+METRIC_PAGE_DATAPOINTS = 100800
+
+LAUNCH_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _mix(n, salt):
+    """Cheap deterministic hash of an index to [0, 1)"""
+    return ((n * 2654435761 + salt * 40503) % 1000003) / 1000003
+
+
+class FakeAWS:
+    """Synthetic fleet spread evenly over regions; see the module docstring"""
+
+    def __init__(self, regions, instances=1000, volumes=None, rds_instances=None, idle_rate=0.05,
+                 unattached_rate=0.05, latency=0.0, throttle_rate=0.0, snapshot_polls=1, seed=42,
+                 limiter=rate_limiter, sleep=time.sleep, accounts=(), credential_ttl=3600, clock=time.time):
+        self.regions = list(regions)
+        self.accounts = list(accounts)
+        self.credential_ttl = credential_ttl
+        self.clock = clock
+        self.issued = {}  # access key -> (account id, expiry timestamp)
+        self.idle_rate = idle_rate
+        self.unattached_rate = unattached_rate
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.snapshot_polls = snapshot_polls
+        self.seed = seed
+        self.limiter = limiter
+        self.sleep = sleep
+        self.counts = {
+            'ec2': self._spread(instances),
+            'ebs': self._spread(instances // 2 if volumes is None else volumes),
+            'rds': self._spread(instances // 50 if rds_instances is None else rds_instances),
+        }
+        self.calls = Counter()
+        self.snapshot_polls_seen = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _spread(self, total):
+        share, extra = divmod(total, max(1, len(self.regions)))
+        return {region: share + (1 if index < extra else 0) for index, region in enumerate(self.regions)}
+
+    def client(self, service, region, credentials=None):
+        """Client factory for ClientPool.use_factory"""
+        cls = {'ec2': FakeEC2, 'cloudwatch': FakeCloudWatch, 'rds': FakeRDS, 'sts': FakeSTS}[service]
+        return cls(self, service, region, credentials)
+
+    def issue_credentials(self, account_id, duration):
+        with self._lock:
+            access_key = f"ASIA{account_id}{len(self.issued):08d}"
+            expires = self.clock() + min(duration, self.credential_ttl)
+            self.issued[access_key] = (account_id, expires)
+        return access_key, expires
+
+    def account_of(self, credentials):
+        """Account the credentials belong to; raises ClientError once they have expired"""
+        account_id, expires = self.issued.get(credentials['access_key'], (None, 0))
+        if account_id is None:
+            raise ClientError({'Error': {'Code': 'InvalidClientTokenId', 'Message': 'Unknown access key'}}, 'Call')
+        if expires <= self.clock():
+            raise ClientError({'Error': {'Code': 'ExpiredToken', 'Message': 'Token expired'}}, 'Call')
+        return account_id
+
+    def throttled(self):
+        if not self.throttle_rate:
+            return False
+        with self._lock:
+            return self._rng.random() < self.throttle_rate
+
+    def region_index(self, region):
+        return self.regions.index(region) if region in self.regions else 255
+
+    def cpu_base(self, n):
+        """Average CPU of instance n: about idle_rate of the fleet sits below 5%"""
+        u = _mix(n, self.seed)
+        return round(u / self.idle_rate * 5, 2) if u < self.idle_rate else round(5 + u * 95, 2)
+
+
+class FakeClient:
+    """Shared call path: rate limiting, latency, throttling and call counts"""
+
+    def __init__(self, aws, service, region, credentials=None):
+        self.aws = aws
+        self.service = service
+        self.region = region
+        self.credentials = credentials
+        self.prefix = f"{aws.region_index(region):02x}"
+        if credentials is not None:
+            account_id = aws.account_of(credentials())
+            self.prefix = f"{aws.accounts.index(account_id) + 1:02x}{self.prefix}"
+        self.meta = SimpleNamespace(region_name=region)
+
+    def _call(self, operation):
+        with metrics.timer('aws_api_call', service=self.service, region=self.region, operation=operation):
+            self._attempts(operation)
+
+    def _attempts(self, operation):
+        aws = self.aws
+        limiter = aws.limiter
+        with aws._lock:
+            aws.calls[self.service, operation] += 1
+        if self.credentials is not None:
+            aws.account_of(self.credentials())
+
+        attempts = 0
+        while True:
+            attempts += 1
+            if limiter.enabled:
+                limiter.acquire(self.service, self.region, operation)
+            if aws.latency:
+                aws.sleep(aws.latency)
+
+            throttled = aws.throttled()
+            delay = None
+            if limiter.enabled:
+                delay = limiter.retry_delay(self.service, self.region, operation, attempts, throttled, throttled)
+            if not throttled:
+                return
+            if delay is None:
+                metrics.inc('aws_api_errors', service=self.service, region=self.region, operation=operation,
+                            code='Throttling')
+                raise ClientError({'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'}}, operation)
+            aws.sleep(delay)
+
+    def get_paginator(self, name):
+        pages = getattr(self, f"_pages_{name}")
+        return SimpleNamespace(paginate=lambda **kwargs: pages())
+
+    def _page_ranges(self, kind, page_size):
+        total = self.aws.counts[kind].get(self.region, 0)
+        for start in range(0, total, page_size):
+            yield range(start, min(total, start + page_size))
+        if not total:
+            yield range(0)
+
+    def _index(self, resource_id):
+        return int(resource_id.split('-', 1)[1][len(self.prefix):], 16)
+
+
+class FakeEC2(FakeClient):
+
+    def _pages_describe_instances(self):
+        for indexes in self._page_ranges('ec2', EC2_PAGE_SIZE):
+            self._call('DescribeInstances')
+            yield {'Reservations': [{'Instances': [self._instance(n) for n in indexes]}]}
+
+    def _instance(self, n):
+        return {
+            'InstanceId': f"i-{self.prefix}{n:015x}",
+            'InstanceType': INSTANCE_TYPES[int(_mix(n, 1) * len(INSTANCE_TYPES))],
+            'ImageId': f"ami-{int(_mix(n, 7) * 16):017x}",
+            'State': {'Name': 'running' if _mix(n, 2) < 0.8 else 'stopped'},
+            'LaunchTime': LAUNCH_TIME,
+            'Tags': [{'Key': 'Name', 'Value': f"node-{n}"}],
+            'PlatformDetails': 'Linux/UNIX',
+            'Placement': {'Tenancy': 'default'},
+        }
+
+    def _pages_describe_volumes(self):
+        for indexes in self._page_ranges('ebs', EBS_PAGE_SIZE):
+            self._call('DescribeVolumes')
+            yield {'Volumes': [self._volume(n) for n in indexes]}
+
+    def _volume(self, n):
+        attached = _mix(n, 3) >= self.aws.unattached_rate
+        return {
+            'VolumeId': f"vol-{self.prefix}{n:015x}",
+            'Size': VOLUME_SIZES[int(_mix(n, 4) * len(VOLUME_SIZES))],
+            'State': 'in-use' if attached else 'available',
+            'Attachments': [{'InstanceId': f"i-{self.prefix}{n:015x}"}] if attached else [],
+            'CreateTime': LAUNCH_TIME,
+            'VolumeType': 'gp3',
+        }
+
+    def stop_instances(self, InstanceIds):
+        self._call('StopInstances')
+        return {'StoppingInstances': [{'InstanceId': instance_id, 'CurrentState': {'Name': 'stopping'}}
+                                      for instance_id in InstanceIds]}
+
+    def create_snapshot(self, VolumeId, Description=''):
+        self._call('CreateSnapshot')
+        return {'SnapshotId': f"snap-{VolumeId[4:]}", 'State': 'pending'}
+
+    def describe_snapshots(self, SnapshotIds):
+        self._call('DescribeSnapshots')
+        with self.aws._lock:
+            polls = self.aws.snapshot_polls_seen
+            polls.update(SnapshotIds)
+            states = {snapshot_id: polls[snapshot_id] >= self.aws.snapshot_polls for snapshot_id in SnapshotIds}
+        return {'Snapshots': [{'SnapshotId': snapshot_id, 'State': 'completed' if done else 'pending'}
+                              for snapshot_id, done in states.items()]}
+
+    def delete_volume(self, VolumeId):
+        self._call('DeleteVolume')
+        return {}
+
+
+class FakeRDS(FakeClient):
+
+    def _pages_describe_db_instances(self):
+        for indexes in self._page_ranges('rds', RDS_PAGE_SIZE):
+            self._call('DescribeDBInstances')
+            yield {'DBInstances': [{
+                'DBInstanceIdentifier': f"db-{self.prefix}{n:015x}",
+                'DBInstanceClass': DB_CLASSES[int(_mix(n, 5) * len(DB_CLASSES))],
+                'Engine': 'postgres',
+                'DBInstanceStatus': 'available',
+                'AllocatedStorage': 100,
+                'MultiAZ': False,
+            } for n in indexes]}
+
+
+class FakeSTS(FakeClient):
+
+    def assume_role(self, RoleArn, RoleSessionName, DurationSeconds=3600, ExternalId=None):
+        self._call('AssumeRole')
+        account_id, _ = parse_role_arn(RoleArn)
+        if account_id not in self.aws.accounts:
+            raise ClientError({'Error': {'Code': 'AccessDenied', 'Message': f"Cannot assume {RoleArn}"}},
+                              'AssumeRole')
+        access_key, expires = self.aws.issue_credentials(account_id, DurationSeconds)
+        return {'Credentials': {
+            'AccessKeyId': access_key,
+            'SecretAccessKey': 'secret',
+            'SessionToken': f"token-{access_key}",
+            'Expiration': datetime.fromtimestamp(expires, tz=timezone.utc),
+        }}
+
+
+class FakeCloudWatch(FakeClient):
+
+    # (points, variant) -> multipliers around 1.0; shared so the fake's own cost stays
+    # small next to the code being measured
+    _shapes = {}
+
+    def _shape(self, points, variant):
+        shape = self._shapes.get((points, variant))
+        if shape is None:
+            shape = self._shapes[points, variant] = [0.8 + 0.4 * _mix(step * 16 + variant, 7)
+                                                     for step in range(points)]
+        return shape
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, NextToken=None, **kwargs):
+        """Values around each instance's base CPU (network sums scaled up); memory only for half the fleet"""
+        self._call('GetMetricData')
+        start = int(NextToken or 0)
+        results = []
+        budget = METRIC_PAGE_DATAPOINTS
+        timestamps_by_points = {}
+
+        for position in range(start, len(MetricDataQueries)):
+            query = MetricDataQueries[position]
+            stat = query['MetricStat']
+            period = stat['Period']
+            points = max(1, int((EndTime - StartTime).total_seconds() // period))
+            if results and points > budget:
+                return {'MetricDataResults': results, 'NextToken': str(position)}
+            budget -= points
+
+            n = self._index(stat['Metric']['Dimensions'][0]['Value'])
+            metric = stat['Metric']['MetricName']
+            if metric == 'mem_used_percent' and _mix(n, 6) < 0.5:
+                values, timestamps = [], []
+            else:
+                base = self.aws.cpu_base(n) * (1e6 if metric.startswith('Network') else 1)
+                values = [base * factor for factor in self._shape(points, n % 16)]
+                timestamps = timestamps_by_points.get(points)
+                if timestamps is None:
+                    timestamps = timestamps_by_points[points] = [StartTime + (EndTime - StartTime) * step / points
+                                                                 for step in range(points)]
+            results.append({'Id': query['Id'], 'Label': query.get('Label', ''), 'Timestamps': timestamps,
+                            'Values': values, 'StatusCode': 'Complete'})
+
+        return {'MetricDataResults': results}
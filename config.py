@@ -5,16 +5,106 @@ from datetime import datetime
 AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
 AWS_ACCOUNT_ID = os.getenv('AWS_ACCOUNT_ID', '411203042419')
 
+# Multi-account scanning (src/accounts.py): comma-separated IAM role ARNs, one per account to
+# scan; when empty only the ambient credentials' account (AWS_ACCOUNT_ID) is scanned. Assumed
+# role credentials are cached and refreshed AWS_CREDENTIAL_REFRESH_MARGIN seconds before expiry
+AWS_ASSUME_ROLE_ARNS = [arn.strip() for arn in os.getenv('AWS_ASSUME_ROLE_ARNS', '').split(',') if arn.strip()]
+AWS_ASSUME_ROLE_EXTERNAL_ID = os.getenv('AWS_ASSUME_ROLE_EXTERNAL_ID')
+AWS_ASSUME_ROLE_SESSION_NAME = 'aws-cost-optimizer'
+AWS_ASSUME_ROLE_DURATION = 3600
+AWS_CREDENTIAL_REFRESH_MARGIN = 900
+
+# Shared boto3 client pool (src/clients.py); size the HTTP pool for the scan concurrency
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv('AWS_MAX_POOL_CONNECTIONS', '50'))
+AWS_CONNECT_TIMEOUT = int(os.getenv('AWS_CONNECT_TIMEOUT', '10'))
+AWS_READ_TIMEOUT = int(os.getenv('AWS_READ_TIMEOUT', '60'))
+
+# Adaptive rate limiting and retries for every pooled client (src/ratelimit.py):
+# requests/second per (service, region, API), adapting between min and max on throttling,
+# attempts per call, and retries allowed per (service, region) before successes earn more back
+AWS_RATE_LIMIT_ENABLED = os.getenv('AWS_RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+AWS_API_RATE = 20.0
+AWS_API_BURST = 40
+AWS_API_MIN_RATE = 0.5
+AWS_API_MAX_RATE = 100.0
+AWS_MAX_ATTEMPTS = 5
+AWS_RETRY_BUDGET = 100
+AWS_BACKOFF_BASE = 0.5
+AWS_BACKOFF_CAP = 20.0
+
 # All AWS regions to scan
 AWS_REGIONS = [
     'us-east-1', 'us-west-1', 'us-west-2',
     'eu-west-1', 'eu-central-1', 'ap-southeast-1'
 ]
 
+# Scan concurrency: (account, region) pairs scanned at once across all accounts, and services
+# scanned at once per pair
+SCAN_PARALLEL = os.getenv('SCAN_PARALLEL', 'true').lower() == 'true'
+SCAN_REGION_CONCURRENCY = int(os.getenv('SCAN_REGION_CONCURRENCY', '6'))
+SCAN_SERVICE_CONCURRENCY = int(os.getenv('SCAN_SERVICE_CONCURRENCY', '3'))
+
+# CloudWatch GetMetricData accepts at most 500 metric queries per call
+CLOUDWATCH_MAX_QUERIES = 500
+
+# Incremental scans: only fetch metric days that are not in the local cache yet
+SCAN_INCREMENTAL = os.getenv('SCAN_INCREMENTAL', 'false').lower() == 'true'
+METRIC_CACHE_FILE = 'data/cache/metric_cache.json'
+METRIC_CACHE_TTL_DAYS = 14
+METRIC_CACHE_MAX_RESOURCES = 500000
+
+# Hourly utilization percentiles (p50/p95/p99) kept per instance via fixed-size quantile sketches
+UTILIZATION_SKETCHES = os.getenv('UTILIZATION_SKETCHES', 'true').lower() == 'true'
+UTILIZATION_DAYS = 30
+UTILIZATION_PERIOD = 3600  # seconds
+UTILIZATION_QUANTILES = (0.5, 0.95, 0.99)
+# Hourly series summarized into percentiles: <name>_p50, <name>_p95, <name>_p99 on each
+# instance, as (namespace, metric name, statistic)
+UTILIZATION_METRICS = {
+    'cpu': ('AWS/EC2', 'CPUUtilization', 'Average'),
+    'network_in': ('AWS/EC2', 'NetworkIn', 'Sum'),
+    'network_out': ('AWS/EC2', 'NetworkOut', 'Sum'),
+    'memory': ('CWAgent', 'mem_used_percent', 'Average'),
+}
+# Dimensions the CloudWatch agent publishes mem_used_percent with; the query must name exactly
+# the same set. The agent's default config appends InstanceId, ImageId and InstanceType:
+#   "append_dimensions": {"InstanceId": "${aws:InstanceId}", "ImageId": "${aws:ImageId}",
+#                         "InstanceType": "${aws:InstanceType}"}
+# If it also appends AutoScalingGroupName, add "aggregation_dimensions": [["InstanceId"]] to
+# the agent's metrics section and set CWAGENT_DIMENSIONS=InstanceId. Only InstanceId, ImageId
+# and InstanceType can be used (the fields an instance record carries)
+CWAGENT_DIMENSIONS = [name.strip() for name in os.getenv('CWAGENT_DIMENSIONS', 'InstanceId,ImageId,InstanceType').split(',')
+                      if name.strip()]
+UTILIZATION_FIELDS = tuple(f"{name}_p{round(quantile * 100)}" for name in UTILIZATION_METRICS
+                           for quantile in UTILIZATION_QUANTILES)
+SKETCH_RELATIVE_ACCURACY = 0.01
+SKETCH_MAX_BINS = 128
+# With a metric cache (incremental scans), an instance's percentiles are recomputed from
+# the full window only every UTILIZATION_REFRESH_DAYS days (must stay below
+# METRIC_CACHE_TTL_DAYS); refreshes are spread over the fleet by instance id
+UTILIZATION_REFRESH_DAYS = 7
+
+# Instrumentation (src/metrics.py): stage/API timers and counters served at /metrics and
+# embedded in scan and report files; tracing memory (tracemalloc) slows allocations noticeably
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_TRACE_MEMORY = os.getenv('METRICS_TRACE_MEMORY', 'false').lower() == 'true'
+
 # Thresholds for recommendations
 IDLE_CPU_THRESHOLD = 5.0  # CPU % below this = idle
 IDLE_DAYS_THRESHOLD = 7    # Days idle before recommendation
 EBS_UNATTACHED_DAYS = 30   # Days unattached before cleanup
+RIGHTSIZE_CPU_P95_TARGET = 70.0    # Downsize only if p95 CPU times the size ratio (e.g. 2 for 2xlarge->xlarge) stays below this
+RIGHTSIZE_MEMORY_P95_TARGET = 70.0  # Same check for memory, when the CloudWatch agent reports it
+
+# Use the vectorized (NumPy, struct-of-arrays) analysis path in CostAnalyzer
+ANALYZER_COLUMNAR = os.getenv('ANALYZER_COLUMNAR', 'true').lower() == 'true'
+
+# Incremental analysis (src/diff.py): analyze only resources added or changed since the
+# previous scan, plus those the previous report recommended something for.
+# Utilization percentages count as changed when they cross a DIFF_METRIC_STEP-point bucket
+# or an analyzer threshold (0 compares them exactly); p95s are always compared exactly
+ANALYSIS_INCREMENTAL = os.getenv('ANALYSIS_INCREMENTAL', 'false').lower() == 'true'
+DIFF_METRIC_STEP = float(os.getenv('DIFF_METRIC_STEP', '1.0'))
 
 # Cost settings
 EC2_HOURLY_COST = {
@@ -25,9 +115,51 @@ EC2_HOURLY_COST = {
     't3.small': 0.0208,
     't3.medium': 0.0416,
 }
+EC2_DEFAULT_HOURLY_COST = 0.05
+
+# EBS $/GB-month by volume type when no compiled price index is available
+EBS_GB_MONTH_COST = {}
+EBS_DEFAULT_GB_MONTH_COST = 0.10
+
+# Compiled AWS Price List index (python -m src.pricing compile <offer.csv>...); used when present
+PRICING_INDEX_FILE = os.getenv('PRICING_INDEX_FILE', 'data/pricing/price_index.bin')
+
+# Background jobs (src/jobs.py): scans running at once, finished jobs kept for /api/jobs
+MAX_CONCURRENT_JOBS = int(os.getenv('MAX_CONCURRENT_JOBS', '1'))
+JOB_HISTORY_SIZE = 50
+
+# Remediation (src/executor.py): regions acted on at once, instance IDs per StopInstances call
+EXECUTOR_REGION_CONCURRENCY = 4
+EXECUTOR_BATCH_SIZE = 50
+
+# Snapshot-then-delete pipeline (src/snapshots.py): snapshots in flight per region, polling,
+# and the state file that lets an interrupted run resume
+SNAPSHOT_MAX_IN_FLIGHT = 20
+SNAPSHOT_POLL_INTERVAL = 15
+SNAPSHOT_TIMEOUT = 6 * 3600
+SNAPSHOT_DESCRIBE_BATCH = 200
+SNAPSHOT_STATE_FILE = 'data/cache/snapshot_pipeline.json'
+
+# ML recommender: persisted MiniBatchKMeans model, updated incrementally each run
+ML_MODEL_FILE = 'data/models/ml_recommender.pkl'
+ML_N_CLUSTERS = 3
+ML_PARTIAL_FIT_SAMPLES = 10000
 
 # Scheduler settings
 SCAN_SCHEDULE_HOUR = 2  # Run daily at 2 AM
+
+# Sharded daily job (src/shards.py): one shard per region ('region') or per account ('account'),
+# scanned and analyzed on SCHEDULER_SHARD_WORKERS threads, shard i starting
+# SCHEDULER_SHARD_STAGGER * i seconds after the first
+SCHEDULER_SHARD_BY = os.getenv('SCHEDULER_SHARD_BY', 'region')
+SCHEDULER_SHARD_WORKERS = int(os.getenv('SCHEDULER_SHARD_WORKERS', '4'))
+SCHEDULER_SHARD_STAGGER = float(os.getenv('SCHEDULER_SHARD_STAGGER', '5'))
+
+# File leases (src/leases.py) keeping overlapping runs (manual scans, other app instances)
+# off the same shard: expiry (renewed every third of it) and how long a shard waits for one
+LEASE_DIR = os.getenv('LEASE_DIR', 'data/leases')
+LEASE_TTL = 300
+LEASE_WAIT = 1800
 REPORT_EMAIL = os.getenv('REPORT_EMAIL', 'your-email@example.com')
 
 # Flask settings
@@ -38,10 +170,29 @@ SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'super-secret-dev-key-change-in-prod'
 # Data directories
 SCAN_DATA_DIR = 'data/scans'
 RECOMMENDATIONS_DIR = 'data/recommendations'
+CACHE_DIR = 'data/cache'
+
+# Scan/report history (src/history.py): SQLite time series behind the trend APIs; day rows
+# older than HISTORY_DAILY_DAYS become weekly, week rows older than HISTORY_WEEKLY_DAYS monthly
+HISTORY_ENABLED = os.getenv('HISTORY_ENABLED', 'true').lower() == 'true'
+HISTORY_DB_FILE = os.getenv('HISTORY_DB_FILE', 'data/history.db')
+HISTORY_DAILY_DAYS = 90
+HISTORY_WEEKLY_DAYS = 730
+
+# Scan/report archive (src/archive.py): files older than ARCHIVE_FULL_DAYS are compacted (scans
+# into deltas against their month's first scan, reports gzipped); past ARCHIVE_RETENTION_DAYS
+# only each month's first file is kept
+ARCHIVE_FULL_DAYS = int(os.getenv('ARCHIVE_FULL_DAYS', '7'))
+ARCHIVE_RETENTION_DAYS = int(os.getenv('ARCHIVE_RETENTION_DAYS', '365'))
+ARCHIVE_COMPACT_HOUR = 3
+
+# Scan file format: 'compact' (indexed, gzip-compressed *.scan, see src/storage.py) or 'json'
+SCAN_STORAGE_FORMAT = os.getenv('SCAN_STORAGE_FORMAT', 'compact')
 
 # Create directories if they don't exist
 os.makedirs(SCAN_DATA_DIR, exist_ok=True)
 os.makedirs(RECOMMENDATIONS_DIR, exist_ok=True)
+os.makedirs(CACHE_DIR, exist_ok=True)
 
 # Current timestamp for filenames
 def get_timestamp():
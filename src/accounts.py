@@ -0,0 +1,114 @@
+import re
+import threading
+import time
+from datetime import timezone
+from config import (AWS_ACCOUNT_ID, AWS_ASSUME_ROLE_ARNS, AWS_ASSUME_ROLE_DURATION, AWS_ASSUME_ROLE_EXTERNAL_ID,
+                    AWS_ASSUME_ROLE_SESSION_NAME, AWS_CREDENTIAL_REFRESH_MARGIN, AWS_REGION)
+
+_ROLE_ARN = re.compile(r'^arn:aws[\w-]*:iam::(\d{12}):role/(.+)$')
+
+
+def parse_role_arn(role_arn):
+    """(account_id, role name) from an IAM role ARN"""
+    match = _ROLE_ARN.match(role_arn)
+    if not match:
+        raise ValueError(f"Not an IAM role ARN: {role_arn}")
+    return match.group(1), match.group(2)
+
+
+def _sts_client():
+    from src.clients import get_client  # the pool builds account clients from this registry
+    return get_client('sts', AWS_REGION)
+
+
+class AssumedRole:
+    """Credentials for one account, assumed through STS and cached until refresh_margin before expiry
+
+    get() returns botocore's credential metadata ({'access_key', 'secret_key', 'token',
+    'expiry_time'}), so it doubles as the refresh callback of RefreshableCredentials.
+    Concurrent callers share one AssumeRole call.
+    """
+
+    def __init__(self, role_arn, sts=_sts_client, session_name=AWS_ASSUME_ROLE_SESSION_NAME,
+                 external_id=AWS_ASSUME_ROLE_EXTERNAL_ID, duration=AWS_ASSUME_ROLE_DURATION,
+                 refresh_margin=AWS_CREDENTIAL_REFRESH_MARGIN, clock=time.time):
+        self.role_arn = role_arn
+        self.account_id, self.role_name = parse_role_arn(role_arn)
+        self.sts = sts
+        self.session_name = session_name
+        self.external_id = external_id
+        self.duration = duration
+        self.refresh_margin = refresh_margin
+        self.clock = clock
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._expires = 0.0
+
+    def get(self):
+        """Current credentials, assuming the role again when they are missing or about to expire"""
+        with self._lock:
+            if self._credentials is None or self._expires - self.refresh_margin <= self.clock():
+                self._assume()
+            return dict(self._credentials)
+
+    def _assume(self):
+        params = {'RoleArn': self.role_arn, 'RoleSessionName': self.session_name, 'DurationSeconds': self.duration}
+        if self.external_id:
+            params['ExternalId'] = self.external_id
+        credentials = self.sts().assume_role(**params)['Credentials']
+
+        expiration = credentials['Expiration']
+        if expiration.tzinfo is None:
+            expiration = expiration.replace(tzinfo=timezone.utc)
+        self._expires = expiration.timestamp()
+        self._credentials = {
+            'access_key': credentials['AccessKeyId'],
+            'secret_key': credentials['SecretAccessKey'],
+            'token': credentials['SessionToken'],
+            'expiry_time': expiration.astimezone(timezone.utc).isoformat(),
+        }
+        self.refreshes += 1
+
+
+class AccountRegistry:
+    """The accounts to scan and how to reach them
+
+    With no role ARNs configured, the only account is the ambient credentials' own
+    (ambient_account_id). Otherwise the accounts are exactly those of the roles; list the
+    ambient account's own role too if it should be scanned as well. role(account_id) is
+    None for the ambient account, whose clients use the default credential chain.
+    """
+
+    def __init__(self, role_arns=AWS_ASSUME_ROLE_ARNS, ambient_account_id=AWS_ACCOUNT_ID, **role_options):
+        self.ambient_account_id = ambient_account_id
+        self._roles = {}
+        for role_arn in role_arns:
+            role = AssumedRole(role_arn, **role_options)
+            self._roles.setdefault(role.account_id, role)
+
+    def accounts(self):
+        """Account ids to scan, in configuration order"""
+        return list(self._roles) or [self.ambient_account_id]
+
+    def is_ambient(self, account_id):
+        return account_id is None or (account_id == self.ambient_account_id and account_id not in self._roles)
+
+    def role(self, account_id):
+        """AssumedRole for account_id; None for the ambient account; KeyError for an unknown one"""
+        if self.is_ambient(account_id):
+            return None
+        try:
+            return self._roles[account_id]
+        except KeyError:
+            raise KeyError(f"No role configured for account {account_id}") from None
+
+    def role_arns(self):
+        return {account_id: role.role_arn for account_id, role in self._roles.items()}
+
+    def scope(self, account_id, region):
+        """Label for one (account, region) pair: the region alone for the ambient account"""
+        return region if self.is_ambient(account_id) else f"{account_id}/{region}"
+
+
+account_registry = AccountRegistry()
@@ -1,23 +1,64 @@
 import json
 from datetime import datetime, timedelta
-from config import EC2_HOURLY_COST, IDLE_CPU_THRESHOLD, IDLE_DAYS_THRESHOLD
+from src.columnar import ColumnTable
+from src.lazy import lazy_import
+from src.metrics import metrics
+from src.pricing import get_pricing_engine
+from config import (ANALYZER_COLUMNAR, IDLE_CPU_THRESHOLD, IDLE_DAYS_THRESHOLD, RIGHTSIZE_CPU_P95_TARGET,
+                    RIGHTSIZE_MEMORY_P95_TARGET, UTILIZATION_DAYS)
+
+np = lazy_import('numpy')
+
+# Instance size -> relative capacity (AWS's size normalization factors)
+SIZE_FACTORS = {
+    'nano': 0.25, 'micro': 0.5, 'small': 1, 'medium': 2, 'large': 4, 'xlarge': 8,
+    '2xlarge': 16, '3xlarge': 24, '4xlarge': 32, '6xlarge': 48, '8xlarge': 64, '9xlarge': 72,
+    '10xlarge': 80, '12xlarge': 96, '16xlarge': 128, '18xlarge': 144, '24xlarge': 192,
+    '32xlarge': 256, '48xlarge': 384,
+}
+
+
+def smaller_instance_types(instance_type):
+    """Smaller sizes of the same family, closest first, with capacity ratios
+
+    e.g. t3.medium -> [('t3.small', 2.0), ('t3.micro', 4.0), ('t3.nano', 8.0)]. Not every
+    family has every size; callers keep the first one that has a known price.
+    Metal and unrecognized types get an empty list.
+    """
+    family, _, size = instance_type.partition('.')
+    if size not in SIZE_FACTORS:
+        return []
+    return [
+        (f"{family}.{candidate}", SIZE_FACTORS[size] / factor)
+        for candidate, factor in reversed(SIZE_FACTORS.items()) if factor < SIZE_FACTORS[size]
+    ]
 
 
 class CostAnalyzer:
     """Analyzes costs and generates recommendations"""
 
-    def __init__(self, scan_data):
+    def __init__(self, scan_data, columnar=ANALYZER_COLUMNAR, pricing=None):
         self.scan_data = scan_data
+        self.columnar = columnar
+        self.pricing = pricing or get_pricing_engine()
         self.recommendations = []
         self.potential_savings = 0.0
 
+    @metrics.timed('stage', stage='analyze')
     def analyze(self):
         """Main analysis function"""
         print(" Starting cost analysis...")
 
         for region, data in self.scan_data['regions'].items():
-            self.analyze_ec2_instances(region, data['ec2_instances'])
-            self.analyze_ebs_volumes(region, data['ebs_volumes'])
+            if self.columnar:
+                instances = ColumnTable.of(data['ec2_instances'])
+                self.analyze_ec2_columnar(region, instances)
+                self.analyze_ebs_columnar(region, ColumnTable.of(data['ebs_volumes']))
+                self.analyze_rightsizing_columnar(region, instances)
+            else:
+                self.analyze_ec2_instances(region, data['ec2_instances'])
+                self.analyze_ebs_volumes(region, data['ebs_volumes'])
+                self.analyze_rightsizing(region, data['ec2_instances'])
 
         print(f" Analysis complete! Found {len(self.recommendations)} recommendations")
         print(f" Potential monthly savings: ${self.potential_savings:.2f}")
@@ -39,13 +80,15 @@ class CostAnalyzer:
 
             # Check if instance is idle
             if cpu_avg < IDLE_CPU_THRESHOLD:
-                hourly_cost = EC2_HOURLY_COST.get(instance_type, 0.05)  # Default $0.05/hr
+                hourly_cost = self.pricing.ec2_hourly(region, instance_type,
+                                                      instance.get('platform'), instance.get('tenancy'))
                 monthly_savings = hourly_cost * 24 * 30
 
                 self.recommendations.append({
                     'type': 'EC2_IDLE',
                     'severity': 'HIGH',
                     'region': region,
+                    'account_id': instance.get('account_id'),
                     'resource_id': instance['instance_id'],
                     'resource_type': instance_type,
                     'issue': f"Instance has {cpu_avg}% average CPU (last 7 days)",
@@ -63,13 +106,13 @@ class CostAnalyzer:
         """Analyze EBS volumes for cost optimization"""
         for volume in volumes:
             if not volume['attached'] and volume['state'] == 'available':
-                # Unattached volume costs ~$0.10/GB/month
-                monthly_cost = volume['size_gb'] * 0.10
+                monthly_cost = volume['size_gb'] * self.pricing.ebs_gb_month(region, volume['volume_type'])
 
                 self.recommendations.append({
                     'type': 'EBS_UNATTACHED',
                     'severity': 'MEDIUM',
                     'region': region,
+                    'account_id': volume.get('account_id'),
                     'resource_id': volume['volume_id'],
                     'resource_type': f"EBS {volume['volume_type']}",
                     'issue': f"Volume ({volume['size_gb']} GB) unattached since creation",
@@ -83,15 +126,175 @@ class CostAnalyzer:
 
         print(f"   Analyzed {len(volumes)} EBS volumes in {region}")
 
+    def analyze_rightsizing(self, region, instances):
+        """Recommend one size down for busy-enough instances whose p95 load fits the smaller size"""
+        for instance in instances:
+            if instance['state'] != 'running' or instance['cpu_avg_7d'] < IDLE_CPU_THRESHOLD:
+                continue  # stopped, or already recommended for stopping
+            if instance.get('cpu_p95') is None:
+                continue
+            self.add_rightsizing(region, instance)
+
+    def analyze_rightsizing_columnar(self, region, table):
+        """Vectorized analyze_rightsizing: each distinct (type, platform, tenancy) is priced once
+        and the p95 checks run as masks, so only the rows that fit build a recommendation"""
+        if not len(table):
+            return
+
+        cpu_p95 = table.array('cpu_p95')
+        candidates = np.flatnonzero(table.equals('state', 'running') &
+                                    (table.array('cpu_avg_7d') >= IDLE_CPU_THRESHOLD) &
+                                    ~np.isnan(cpu_p95) &
+                                    (cpu_p95 < RIGHTSIZE_CPU_P95_TARGET))  # any downsize raises it (ratio > 1)
+        keys, inverse = table.group(candidates, ('type', 'platform', 'tenancy'))
+        targets = [self.rightsizing_target(region, *key) for key in keys]
+
+        # No target: NaN ratio, which fails the CPU check
+        ratio = np.array([target[1] if target else np.nan for target in targets], dtype=float)[inverse]
+        memory_p95 = table.array('memory_p95')[candidates]
+        fits = (cpu_p95[candidates] * ratio < RIGHTSIZE_CPU_P95_TARGET) & \
+            (np.isnan(memory_p95) | (memory_p95 * ratio < RIGHTSIZE_MEMORY_P95_TARGET))
+        # The parts of a recommendation that depend only on the group, built once per group
+        grouped = [(target[0], target[2], round(target[2], 2), f"Downsize from {key[0]} → {target[0]}")
+                   if target else None for key, target in zip(keys, targets)]
+
+        rows = candidates[fits].tolist()
+        for instance, code in zip(table.records_at(rows), inverse[fits].tolist()):
+            target_type, monthly_savings, rounded, recommendation = grouped[code]
+            memory = instance.get('memory_p95')
+            memory_note = f", p95 memory {memory}%" if memory is not None else ""
+            self.recommendations.append({
+                'type': 'EC2_RIGHTSIZE',
+                'severity': 'MEDIUM',
+                'region': region,
+                'account_id': instance.get('account_id'),
+                'resource_id': instance['instance_id'],
+                'resource_type': instance['type'],
+                'target_type': target_type,
+                'issue': f"p95 CPU {instance['cpu_p95']}%{memory_note} over the last {UTILIZATION_DAYS} days",
+                'recommendation': recommendation,
+                'action': 'RESIZE',
+                'monthly_savings': rounded,
+                'details': instance
+            })
+
+            self.potential_savings += monthly_savings
+
+    def rightsizing_target(self, region, instance_type, platform=None, tenancy=None):
+        """(target type, capacity ratio, monthly savings) for the next priced size down, or None
+        if there is none or it is not cheaper"""
+        smaller = [(target_type, ratio) for target_type, ratio in smaller_instance_types(instance_type)
+                   if self.pricing.has_ec2_price(region, target_type, platform, tenancy)]
+        if not smaller:
+            return None
+        target_type, ratio = smaller[0]
+
+        current_cost = self.pricing.ec2_hourly(region, instance_type, platform, tenancy)
+        target_cost = self.pricing.ec2_hourly(region, target_type, platform, tenancy)
+        monthly_savings = (current_cost - target_cost) * 24 * 30
+        if monthly_savings <= 0:
+            return None
+        return target_type, ratio, monthly_savings
+
+    def add_rightsizing(self, region, instance):
+        """Append an EC2_RIGHTSIZE recommendation if the next size down fits and is cheaper"""
+        target = self.rightsizing_target(region, instance['type'], instance.get('platform'), instance.get('tenancy'))
+        if target is None:
+            return
+        target_type, ratio, monthly_savings = target
+
+        memory_p95 = instance.get('memory_p95')
+        if instance['cpu_p95'] * ratio >= RIGHTSIZE_CPU_P95_TARGET:
+            return
+        if memory_p95 is not None and memory_p95 * ratio >= RIGHTSIZE_MEMORY_P95_TARGET:
+            return
+
+        cpu_p95 = instance['cpu_p95']
+        memory_note = f", p95 memory {memory_p95}%" if memory_p95 is not None else ""
+        self.recommendations.append({
+            'type': 'EC2_RIGHTSIZE',
+            'severity': 'MEDIUM',
+            'region': region,
+            'account_id': instance.get('account_id'),
+            'resource_id': instance['instance_id'],
+            'resource_type': instance['type'],
+            'target_type': target_type,
+            'issue': f"p95 CPU {cpu_p95}%{memory_note} over the last {UTILIZATION_DAYS} days",
+            'recommendation': f"Downsize from {instance['type']} → {target_type}",
+            'action': 'RESIZE',
+            'monthly_savings': round(monthly_savings, 2),
+            'details': instance
+        })
+
+        self.potential_savings += monthly_savings
+
+    def analyze_ec2_columnar(self, region, table):
+        """Vectorized analyze_ec2_instances over a ColumnTable; same recommendations, same order"""
+        if len(table):
+            idle = np.flatnonzero(table.equals('state', 'running') &
+                                  (table.array('cpu_avg_7d') < IDLE_CPU_THRESHOLD))
+
+            # Price each distinct (type, platform, tenancy) among the idle rows once, then gather
+            keys, inverse = table.group(idle, ('type', 'platform', 'tenancy'))
+            hourly_cost = np.array([self.pricing.ec2_hourly(region, *key) for key in keys], dtype=float)
+            monthly_savings = hourly_cost * 24 * 30
+            rounded = [round(savings, 2) for savings in monthly_savings.tolist()]
+
+            rows = idle.tolist()
+            for instance, code, savings in zip(table.records_at(rows), inverse.tolist(), monthly_savings[inverse].tolist()):
+                self.recommendations.append({
+                    'type': 'EC2_IDLE',
+                    'severity': 'HIGH',
+                    'region': region,
+                    'account_id': instance.get('account_id'),
+                    'resource_id': instance['instance_id'],
+                    'resource_type': instance['type'],
+                    'issue': f"Instance has {instance['cpu_avg_7d']}% average CPU (last 7 days)",
+                    'recommendation': 'STOP instance during idle periods',
+                    'action': 'STOP',
+                    'monthly_savings': rounded[code],
+                    'details': instance
+                })
+
+                self.potential_savings += savings
+
+        print(f"   Analyzed {len(table)} EC2 instances in {region}")
+
+    def analyze_ebs_columnar(self, region, table):
+        """Vectorized analyze_ebs_volumes over a ColumnTable; same recommendations, same order"""
+        if len(table):
+            unattached = np.flatnonzero(~table.array('attached', dtype=bool) & table.equals('state', 'available'))
+
+            volume_codes, volume_types = table.codes('volume_type')
+            gb_month = np.array([self.pricing.ebs_gb_month(region, volume_type) for volume_type in volume_types])
+            monthly_cost = table.array('size_gb')[unattached] * gb_month[volume_codes[unattached]]
+
+            rows = unattached.tolist()
+            for volume, cost in zip(table.records_at(rows), monthly_cost.tolist()):
+                self.recommendations.append({
+                    'type': 'EBS_UNATTACHED',
+                    'severity': 'MEDIUM',
+                    'region': region,
+                    'account_id': volume.get('account_id'),
+                    'resource_id': volume['volume_id'],
+                    'resource_type': f"EBS {volume['volume_type']}",
+                    'issue': f"Volume ({volume['size_gb']} GB) unattached since creation",
+                    'recommendation': 'DELETE unattached volume or create snapshot',
+                    'action': 'SNAPSHOT_DELETE',
+                    'monthly_savings': round(cost, 2),
+                    'details': volume
+                })
+
+                self.potential_savings += cost
+
+        print(f"   Analyzed {len(table)} EBS volumes in {region}")
+
 
 if __name__ == '__main__':
     # Test with latest scan data
-    import glob
-
-    latest_scan = max(glob.glob('data/scans/*.json'), key=lambda x: x)
+    from src.storage import latest_scan_file, load_scan
 
-    with open(latest_scan, 'r') as f:
-        scan_data = json.load(f)
+    scan_data = load_scan(latest_scan_file())
 
     analyzer = CostAnalyzer(scan_data)
     results = analyzer.analyze()
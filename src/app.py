@@ -1,17 +1,50 @@
-from flask import Flask, render_template, jsonify, request
-import json
-import glob
+from flask import Flask, Response, render_template, jsonify, request
+import hashlib
 import os
 from datetime import datetime
-from src.scanner import AWSResourceScanner
-from src.analyzer import CostAnalyzer
-from src.recommender import MLRecommender
 from src.executor import RemediationExecutor
+from src.storage import load_scan
+from src.archive import get_archive, load_report
+from src.artifacts import LatestArtifact
+from src.history import get_history_store
+from src.jobs import SCAN_DEDUP_KEY, job_manager, scan_result
+from src.metrics import metrics
+from src.ratelimit import rate_limiter
+from src.shards import ShardRunner, plan_shards, shard_scopes
+from src.report_index import DEFAULT_LIMIT, FILTER_FIELDS, InvalidQuery, RecommendationIndex
 from config import FLASK_HOST, FLASK_PORT, SECRET_KEY, SCAN_DATA_DIR, RECOMMENDATIONS_DIR
 
 app = Flask(__name__, template_folder='../templates', static_folder='../static')
 app.secret_key = SECRET_KEY
 
+# Newest scan / report from the archive manifests, looked up again only when the data
+# directories change
+scan_archive = get_archive(SCAN_DATA_DIR, 'scan')
+report_archive = get_archive(RECOMMENDATIONS_DIR, 'report')
+latest_scans = LatestArtifact(SCAN_DATA_DIR, list_files=lambda: newest_file(scan_archive))
+latest_recommendations = LatestArtifact(RECOMMENDATIONS_DIR, list_files=lambda: newest_file(report_archive))
+
+
+def newest_file(archive):
+    path = archive.latest()
+    return [path] if path else []
+
+
+def as_of_param():
+    """?as_of= (ISO date or datetime) as a naive local ISO string, or None when absent"""
+    value = request.args.get('as_of')
+    if not value:
+        return None
+    try:
+        when = datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidQuery('as_of must be an ISO 8601 date or datetime')
+    if when.tzinfo is not None:
+        when = when.astimezone().replace(tzinfo=None)  # file names carry local time
+    elif len(value) == 10:
+        when = when.replace(hour=23, minute=59, second=59)  # a bare date means the end of that day
+    return when.isoformat()
+
 
 @app.route('/')
 def index():
@@ -19,70 +52,225 @@ def index():
     return render_template('index.html')
 
 
+def conditional_json(payload):
+    """JSON response from a cached payload; answers 304 when the client's validators still match"""
+    response = app.response_class(payload.body, mimetype='application/json')
+    response.set_etag(payload.etag)
+    response.last_modified = payload.last_modified
+    response.cache_control.no_cache = True  # clients must revalidate, which is a cheap 304
+    return response.make_conditional(request)
+
+
 @app.route('/api/latest-scan')
 def get_latest_scan():
-    """API: Get latest scan results"""
+    """API: Get latest scan results (or the scan current at ?as_of=)"""
     try:
-        scan_files = glob.glob(f'{SCAN_DATA_DIR}/*.json')
-        if not scan_files:
-            return jsonify({'error': 'No scan data available'}), 404
+        region = request.args.get('region')
+        resource_type = request.args.get('resource_type')
+
+        def render(path):
+            data = load_scan(path,
+                             regions=[region] if region else None,
+                             resource_types=[resource_type] if resource_type else None)
+            return app.json.dumps(data).encode('utf-8')
 
-        latest_scan = max(scan_files, key=os.path.getctime)
-        with open(latest_scan, 'r') as f:
-            data = json.load(f)
+        as_of = as_of_param()
+        if as_of:
+            path = scan_archive.as_of(as_of)
+            if path is None:
+                return jsonify({'error': f'No scan data as of {as_of}'}), 404
+            return app.response_class(render(path), mimetype='application/json')
 
-        return jsonify(data)
+        payload = latest_scans.get(render, variant=(region, resource_type))
+        if payload is None:
+            return jsonify({'error': 'No scan data available'}), 404
+
+        return conditional_json(payload)
+    except InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/latest-recommendations')
 def get_latest_recommendations():
-    """API: Get latest recommendations"""
+    """API: Get latest recommendations (or the report current at ?as_of=)"""
     try:
-        rec_files = glob.glob(f'{RECOMMENDATIONS_DIR}/*.json')
-        if not rec_files:
+        def render(path):
+            return app.json.dumps(load_report(path)).encode('utf-8')
+
+        as_of = as_of_param()
+        if as_of:
+            path = report_archive.as_of(as_of)
+            if path is None:
+                return jsonify({'error': f'No recommendations as of {as_of}'}), 404
+            return app.response_class(render(path), mimetype='application/json')
+
+        payload = latest_recommendations.get(render)
+        if payload is None:
+            return jsonify({'error': 'No recommendations available'}), 404
+
+        return conditional_json(payload)
+    except InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def build_recommendation_index(path):
+    """Parse a report once and index it for /api/recommendations"""
+    report = load_report(path)
+    stat = os.stat(path)
+    report_id = hashlib.sha1(f"{path}:{stat.st_mtime_ns}:{stat.st_size}".encode('utf-8')).hexdigest()[:16]
+    return RecommendationIndex(report, report_id)
+
+
+@app.route('/api/recommendations')
+def query_recommendations():
+    """API: Latest recommendations, filtered, sorted and paginated server-side
+
+    Query parameters: type, region, account_id, severity, action (comma-separated values),
+    sort (monthly_savings or -monthly_savings), limit, cursor (next_cursor of the
+    previous page) and fields (comma-separated; '*' includes the full 'details').
+    """
+    try:
+        _, index = latest_recommendations.get_object(build_recommendation_index)
+        if index is None:
             return jsonify({'error': 'No recommendations available'}), 404
 
-        latest_rec = max(rec_files, key=os.path.getctime)
-        with open(latest_rec, 'r') as f:
-            data = json.load(f)
+        filters = {
+            field: request.args[field].split(',')
+            for field in FILTER_FIELDS if request.args.get(field)
+        }
+        fields = request.args['fields'].split(',') if request.args.get('fields') else None
 
-        return jsonify(data)
+        return jsonify(index.query(
+            filters=filters,
+            sort=request.args.get('sort') or None,
+            cursor=request.args.get('cursor') or None,
+            limit=request.args.get('limit', DEFAULT_LIMIT, type=int),
+            fields=fields
+        ))
+    except InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def trend_days():
+    """?days= for the trend APIs (default 90, 1 to 3650)"""
+    days = request.args.get('days', 90, type=int)
+    if days is None or not 1 <= days <= 3650:
+        raise InvalidQuery('days must be an integer between 1 and 3650')
+    return days
+
+
+@app.route('/api/trends/cost')
+def cost_trend():
+    """API: Fleet size and estimated monthly cost per day/week/month (?days=, ?region=)"""
+    try:
+        return jsonify({'points': get_history_store().cost_trend(trend_days(), request.args.get('region') or None)})
+    except InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/trends/savings')
+def savings_trend():
+    """API: Recommendation count and potential savings per day/week/month (?days=, ?type=)"""
+    try:
+        return jsonify({'points': get_history_store().savings_trend(trend_days(), request.args.get('type') or '*')})
+    except InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/trends/resources/<resource_id>')
+def resource_trend(resource_id):
+    """API: History of one resource (running share, CPU, monthly cost) (?days=)"""
+    try:
+        return jsonify({'resource_id': resource_id,
+                        'points': get_history_store().resource_trend(resource_id, trend_days())})
+    except InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
+
+
+def run_manual_scan(job):
+    """Job body for /api/trigger-scan: scan and analyze all regions, shard by shard under the
+    same leases as the scheduled job so the two never scan a shard at once"""
+    job.set_stage('scan')
+    shards = plan_shards()
+    job.set_scopes(shard_scopes(shards))
+    sharded = ShardRunner(progress_callback=job.region_progress).run(shards)
+    analysis = sharded['analysis']
+
+    return scan_result(sharded['scan']['summary'], len(analysis['recommendations']),
+                       analysis['total_potential_savings'])
+
+
 @app.route('/api/trigger-scan', methods=['POST'])
 def trigger_scan():
-    """API: Trigger manual scan"""
+    """API: Trigger manual scan (runs in the background; poll /api/jobs/<job_id>)"""
     try:
         print(" Manual scan triggered via API")
-
-        scanner = AWSResourceScanner()
-        results = scanner.scan_all_regions()
-
-        analyzer = CostAnalyzer(results)
-        analysis = analyzer.analyze()
+        job, deduplicated = job_manager.submit('manual_scan', run_manual_scan, dedup_key=SCAN_DEDUP_KEY)
 
         return jsonify({
             'success': True,
-            'message': 'Scan completed',
-            'summary': results['summary'],
-            'recommendations_count': len(analysis['recommendations']),
-            'potential_savings': analysis['total_potential_savings']
-        })
+            'message': 'Scan already running' if deduplicated else 'Scan queued',
+            'job_id': job.id,
+            'status': job.status,
+            'deduplicated': deduplicated
+        }), 202
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/rate-limits')
+def get_rate_limits():
+    """API: AWS API pacing and retry counters per service/region/operation"""
+    return jsonify({'totals': rate_limiter.totals(), 'apis': rate_limiter.counters()})
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint: pipeline timers and counters plus the AWS rate limiter counters"""
+    limits = {}
+    for series, counters in rate_limiter.counters().items():
+        service, region, operation = series.split('/')
+        labels = {'service': service, 'region': region, 'operation': operation}
+        for field in ('throttled', 'retries', 'failed', 'budget_exhausted'):
+            limits.setdefault(f"aws_{field}_total", ('counter', []))[1].append((labels, counters[field]))
+        limits.setdefault('aws_rate_limit_wait_seconds_total', ('counter', []))[1].append(
+            (labels, counters['wait_seconds']))
+        limits.setdefault('aws_rate_limit_rate', ('gauge', []))[1].append((labels, counters['rate']))
+
+    extra = [(name, kind, samples) for name, (kind, samples) in limits.items()]
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/jobs')
+def list_jobs():
+    """API: Recent background jobs, newest first"""
+    return jsonify({'jobs': [job.to_dict() for job in job_manager.list()]})
+
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """API: Status and per-region progress of a background job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job {job_id}'}), 404
+    return jsonify(job.to_dict())
+
+
 @app.route('/api/execute-action', methods=['POST'])
 def execute_action():
     """API: Execute a specific recommendation"""
     try:
         rec = request.json
         executor = RemediationExecutor(dry_run=False)  # REAL execution
-        executor.execute_single_recommendation(rec)
+        entry = executor.execute_single_recommendation(rec)
+        if not entry['success']:
+            return jsonify({'success': False, 'error': entry['error']}), 500
 
         return jsonify({
             'success': True,
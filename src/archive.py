@@ -0,0 +1,259 @@
+import bisect
+import glob
+import gzip
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+from datetime import datetime, timedelta
+from src.artifacts import notify_written
+from src.metrics import metrics
+from src.storage import DELTA_EXTENSION, _decode, list_scan_files, load_scan, write_delta
+from config import ARCHIVE_FULL_DAYS, ARCHIVE_RETENTION_DAYS, RECOMMENDATIONS_DIR, SCAN_DATA_DIR
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+_NAME_TIME = re.compile(r'_(\d{8}_\d{6})')
+
+
+class Archive:
+    """Manifest, retention and compaction for one artifact directory ('scan' or 'report' files)
+
+    The manifest (manifest.json in the directory) lists every file with its timestamp,
+    oldest first, so the newest file and the file current as of a given time are found
+    without listing the directory. Writers register each new file; a missing manifest
+    is rebuilt from the file names. compact() then keeps the archive small:
+
+    - scans older than full_days become deltas (*.delta, see src/storage.py) against the
+      first scan of their calendar month, which stays a full file (the month's base)
+    - reports older than full_days are gzip-compressed (*.json.gz)
+    - beyond retention_days only each month's first file is kept, as its rollup
+
+    The newest file is never compacted.
+    """
+
+    def __init__(self, directory, kind, full_days=ARCHIVE_FULL_DAYS, retention_days=ARCHIVE_RETENTION_DAYS):
+        if kind not in ('scan', 'report'):
+            raise ValueError(f"Unknown archive kind: {kind}")
+        self.directory = directory
+        self.kind = kind
+        self.full_days = full_days
+        self.retention_days = retention_days
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        self._lock = threading.RLock()
+        self._entries = None
+        self._mtime = None
+
+    def _files(self):
+        if self.kind == 'scan':
+            return list_scan_files(self.directory)
+        return sorted(glob.glob(os.path.join(self.directory, 'report_*.json')) +
+                      glob.glob(os.path.join(self.directory, 'report_*.json.gz')))
+
+    def _entry(self, path):
+        name = os.path.basename(path)
+        entry = {'name': name, 'time': file_time(path), 'kind': 'full'}
+        if name.endswith(DELTA_EXTENSION):
+            with open(path, 'rb') as f:
+                entry.update(kind='delta', base=_decode(f.read())['base'])
+        elif name.endswith('.gz'):
+            entry['kind'] = 'compressed'
+        return entry
+
+    def entries(self):
+        """Manifest entries, oldest first (a copy)"""
+        with self._lock:
+            return [dict(entry) for entry in self._load()]
+
+    def paths(self):
+        """Paths of every archived file, oldest first"""
+        with self._lock:
+            return [os.path.join(self.directory, entry['name']) for entry in self._load()]
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        if self._entries is not None and mtime == self._mtime:
+            return self._entries
+        if mtime is None:
+            return self.rebuild()
+
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') != MANIFEST_VERSION:
+                raise ValueError(f"unsupported manifest version {data.get('version')}")
+        except (OSError, ValueError) as e:
+            print(f"  ️  Rebuilding unreadable manifest {self.path}: {e}")
+            return self.rebuild()
+
+        self._entries = data['entries']
+        self._mtime = mtime
+        return self._entries
+
+    def _save(self, entries):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'kind': self.kind, 'entries': entries}, f, indent=1)
+        os.replace(tmp_path, self.path)
+        self._entries = entries
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def rebuild(self):
+        """Recreate the manifest from the files in the directory"""
+        with self._lock:
+            entries = sorted((self._entry(path) for path in self._files()), key=lambda entry: entry['time'])
+            os.makedirs(self.directory, exist_ok=True)
+            self._save(entries)
+            return entries
+
+    def register(self, path):
+        """Add a newly written file to the manifest"""
+        with self._lock:
+            entries = [entry for entry in self._load() if entry['name'] != os.path.basename(path)]
+            entry = self._entry(path)
+            # bisect's key= needs Python 3.10; bisect the times instead
+            entries.insert(bisect.bisect_right([item['time'] for item in entries], entry['time']), entry)
+            self._save(entries)
+        return entry
+
+    def latest(self):
+        """Path of the newest file, or None"""
+        with self._lock:
+            entries = self._load()
+            if entries and not os.path.exists(os.path.join(self.directory, entries[-1]['name'])):
+                entries = self.rebuild()  # removed behind the manifest's back
+            return os.path.join(self.directory, entries[-1]['name']) if entries else None
+
+    def as_of(self, when):
+        """Path of the newest file written at or before `when` (datetime or ISO string), or None"""
+        when = when.isoformat() if isinstance(when, datetime) else when
+        with self._lock:
+            entries = self._load()
+            index = bisect.bisect_right([entry['time'] for entry in entries], when) - 1
+            return os.path.join(self.directory, entries[index]['name']) if index >= 0 else None
+
+    def compact(self, now=None):
+        """Apply the delta/compression and retention rules; returns counts of what changed"""
+        now = now or datetime.now()
+        full_cutoff = (now - timedelta(days=self.full_days)).isoformat()
+        retention_cutoff = (now - timedelta(days=self.retention_days)).isoformat()
+        stats = {'compacted': 0, 'removed': 0, 'bytes_before': 0, 'bytes_after': 0}
+
+        with self._lock:
+            entries = self._load()
+            if not entries:
+                return stats
+            newest = entries[-1]['name']
+            month_first = {}
+            for entry in entries:
+                month_first.setdefault(entry['time'][:7], entry['name'])
+
+            kept = []
+            for entry in entries:
+                path = os.path.join(self.directory, entry['name'])
+                is_base = month_first[entry['time'][:7]] == entry['name']
+                if entry['name'] == newest or entry['time'] >= full_cutoff:
+                    kept.append(entry)
+                elif entry['time'] < retention_cutoff and not is_base:
+                    stats['bytes_before'] += _size(path)
+                    if os.path.exists(path):
+                        os.remove(path)
+                    stats['removed'] += 1
+                elif entry['kind'] != 'full' or (is_base and self.kind == 'scan'):
+                    kept.append(entry)  # already compacted, or a scan other deltas are based on
+                else:
+                    stats['bytes_before'] += _size(path)
+                    entry = self._compact_file(entry, month_first[entry['time'][:7]])
+                    stats['bytes_after'] += _size(os.path.join(self.directory, entry['name']))
+                    stats['compacted'] += 1
+                    kept.append(entry)
+
+            # Deltas past retention are gone; their bases are kept as the month's rollup
+            for entry in kept:
+                if entry['time'] < retention_cutoff:
+                    entry['rollup'] = True
+            self._save(kept)
+
+        if stats['compacted'] or stats['removed']:
+            notify_written(self.directory)
+        metrics.inc('archive_files_compacted', stats['compacted'], kind=self.kind)
+        metrics.inc('archive_files_removed', stats['removed'], kind=self.kind)
+        return stats
+
+    def _compact_file(self, entry, base_name):
+        path = os.path.join(self.directory, entry['name'])
+        if self.kind == 'report':
+            out_path = f"{path}.gz"
+            with open(path, 'rb') as src, gzip.open(f"{out_path}.tmp", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(f"{out_path}.tmp", out_path)
+            os.remove(path)
+            return dict(entry, name=os.path.basename(out_path), kind='compressed')
+
+        base_path = os.path.join(self.directory, base_name)
+        stem = entry['name'].rsplit('.', 1)[0]
+        out_path = os.path.join(self.directory, f"{stem}{DELTA_EXTENSION}")
+        write_delta(load_scan(path), load_scan(base_path), base_name, out_path)
+        os.remove(path)
+        return dict(entry, name=os.path.basename(out_path), kind='delta', base=base_name)
+
+
+def file_time(path):
+    """ISO timestamp from a scan_/report_YYYYmmdd_HHMMSS file name (file mtime if it has none)"""
+    match = _NAME_TIME.search(os.path.basename(path))
+    if match:
+        return datetime.strptime(match.group(1), '%Y%m%d_%H%M%S').isoformat()
+    return datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+
+
+def load_report(path):
+    """Load a report file, plain or gzip-compressed by compaction"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt') as f:
+        return json.load(f)
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def get_archive(directory, kind):
+    """Shared Archive per directory"""
+    key = (os.path.abspath(directory), kind)
+    with _archives_lock:
+        if key not in _archives:
+            _archives[key] = Archive(directory, kind)
+        return _archives[key]
+
+
+def compact_all(now=None):
+    """Compact the scan and report archives; returns {kind: stats}"""
+    return {
+        'scan': get_archive(SCAN_DATA_DIR, 'scan').compact(now),
+        'report': get_archive(RECOMMENDATIONS_DIR, 'report').compact(now),
+    }
+
+
+if __name__ == '__main__':
+    # python -m src.archive compact | rebuild
+    if sys.argv[1:] == ['compact']:
+        print(json.dumps(compact_all(), indent=2))
+    elif sys.argv[1:] == ['rebuild']:
+        for directory, kind in ((SCAN_DATA_DIR, 'scan'), (RECOMMENDATIONS_DIR, 'report')):
+            print(f"  {kind}: {len(get_archive(directory, kind).rebuild())} files")
+    else:
+        print("Usage: python -m src.archive compact|rebuild")
+        sys.exit(2)
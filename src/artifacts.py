@@ -0,0 +1,131 @@
+import glob
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+_generations = {}
+_generations_lock = threading.Lock()
+
+
+def notify_written(directory):
+    """Tell in-process caches that a new artifact was written to directory"""
+    key = os.path.abspath(directory)
+    with _generations_lock:
+        _generations[key] = _generations.get(key, 0) + 1
+
+
+def _generation(directory):
+    return _generations.get(os.path.abspath(directory), 0)
+
+
+class Payload:
+    """Pre-serialized response body plus its validators"""
+
+    __slots__ = ('path', 'body', 'etag', 'last_modified')
+
+    def __init__(self, path, body, etag, last_modified):
+        self.path = path
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class LatestArtifact:
+    """In-process index of the newest file in a data directory, with rendered responses cached
+
+    The directory is only re-listed when its mtime or the in-process write generation
+    (see notify_written) changes, and the newest file is stat'ed on each request so an
+    in-place rewrite is noticed too. Rendered bodies are cached per variant (e.g. query
+    parameters), and one parsed object (see get_object) is kept, until the newest file changes.
+    """
+
+    def __init__(self, directory, pattern='*.json', list_files=None, max_variants=32):
+        self.directory = directory
+        self.list_files = list_files or (lambda: glob.glob(os.path.join(directory, pattern)))
+        self.max_variants = max_variants
+        self._lock = threading.Lock()
+        self._listing_key = None
+        self._latest = None
+        self._version = None
+        self._payloads = OrderedDict()
+        self._object = None
+
+    def invalidate(self):
+        """Forget the cached listing and every rendered body"""
+        with self._lock:
+            self._listing_key = None
+            self._latest = None
+            self._version = None
+            self._payloads.clear()
+            self._object = None
+
+    def latest_path(self):
+        """Newest file (by ctime, as the API always used), or None"""
+        try:
+            listing_key = (os.stat(self.directory).st_mtime_ns, _generation(self.directory))
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            if listing_key != self._listing_key:
+                files = self.list_files()
+                self._latest = max(files, key=os.path.getctime) if files else None
+                self._listing_key = listing_key
+            return self._latest
+
+    def get(self, render, variant=None):
+        """Payload for the newest file; render(path) -> bytes runs only on a cache miss"""
+        path = self.latest_path()
+        if path is None:
+            return None
+
+        stat = os.stat(path)
+        version = (path, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            if version != self._version:
+                self._reset(version)
+            payload = self._payloads.get(variant)
+            if payload is not None:
+                self._payloads.move_to_end(variant)
+                return payload
+
+        body = render(path)
+        etag = hashlib.sha1(repr((version, variant)).encode('utf-8')).hexdigest()
+        last_modified = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+        payload = Payload(path, body, etag, last_modified)
+
+        with self._lock:
+            if version == self._version:
+                self._payloads[variant] = payload
+                while len(self._payloads) > self.max_variants:
+                    self._payloads.popitem(last=False)
+        return payload
+
+    def get_object(self, build):
+        """(version, object) for the newest file; build(path) -> object runs once per file version"""
+        path = self.latest_path()
+        if path is None:
+            return None, None
+
+        stat = os.stat(path)
+        version = (path, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            if version != self._version:
+                self._reset(version)
+            if self._object is not None:
+                return version, self._object
+
+        built = build(path)
+        with self._lock:
+            if version == self._version:
+                self._object = built
+        return version, built
+
+    def _reset(self, version):
+        self._payloads.clear()
+        self._object = None
+        self._version = version
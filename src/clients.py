@@ -0,0 +1,116 @@
+import threading
+from config import AWS_MAX_POOL_CONNECTIONS, AWS_CONNECT_TIMEOUT, AWS_READ_TIMEOUT
+from src.accounts import account_registry
+from src.metrics import metrics
+from src.ratelimit import rate_limiter
+
+
+class ClientPool:
+    """Process-wide cache of boto3 clients keyed by (service, region, account)
+
+    Creating a client resolves endpoints, loads the service model and opens a new
+    connection pool, so each client is built once and shared. boto3 sessions are not
+    thread-safe, but the clients they create are: creation happens under a lock and
+    the cached client is then used freely from any thread.
+
+    Every client is paced and retried by the shared RateLimiter (botocore's own retries
+    are switched off for limited clients so attempts are not multiplied) and its calls
+    are timed into the shared metrics registry.
+
+    Clients for other accounts come from one session per account whose credentials are
+    the account's assumed role (see src/accounts.py), refreshed before they expire.
+
+    boto3 and botocore are imported with the first real client, so processes that only
+    serve stored scans never load them.
+    """
+
+    def __init__(self, max_pool_connections=AWS_MAX_POOL_CONNECTIONS, limiter=rate_limiter,
+                 accounts=account_registry):
+        self.max_pool_connections = max_pool_connections
+        self.limiter = limiter
+        self.accounts = accounts
+        self._lock = threading.RLock()  # reentrant: an account's first client assumes its role via STS
+        self._session = None
+        self._account_sessions = {}
+        self._clients = {}
+        self._factory = None
+
+    def get_client(self, service, region, account_id=None):
+        """Return the shared client for service/region in account_id (None or the ambient account:
+        ambient credentials; raises KeyError for an account without a configured role)"""
+        role = self.accounts.role(account_id)
+        key = (service, region, role.account_id if role else None)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = self._create_client(service, region, role)
+            return client
+
+    def use_factory(self, factory):
+        """Build clients with factory(service, region) instead of boto3 (None restores boto3)
+
+        Used to point every subsystem at a stand-in AWS, e.g. the benchmarks' FakeAWS;
+        cached clients are dropped so the switch applies everywhere at once. Clients for an
+        assumed-role account are built with factory(service, region, credentials=fn), fn
+        returning the account's current credentials.
+        """
+        with self._lock:
+            self._factory = factory
+            self._clients.clear()
+
+    def _create_client(self, service, region, role=None):
+        if self._factory is not None:
+            if role is None:
+                return self._factory(service, region)
+            return self._factory(service, region, credentials=role.get)
+
+        from botocore.config import Config
+
+        retries = {'mode': 'standard', 'total_max_attempts': 1} if self.limiter.enabled else None
+        client = self._session_for(role).client(service, region_name=region, config=Config(
+            max_pool_connections=self.max_pool_connections,
+            connect_timeout=AWS_CONNECT_TIMEOUT,
+            read_timeout=AWS_READ_TIMEOUT,
+            retries=retries
+        ))
+        metrics.attach(client, service, region)
+        return self.limiter.attach(client, service, region)
+
+    def _session_for(self, role):
+        import boto3
+
+        if role is None:
+            if self._session is None:
+                self._session = boto3.session.Session()
+            return self._session
+
+        session = self._account_sessions.get(role.account_id)
+        if session is None:
+            from botocore.credentials import RefreshableCredentials
+            from botocore.session import get_session
+
+            botocore_session = get_session()
+            botocore_session._credentials = RefreshableCredentials.create_from_metadata(
+                metadata=role.get(), refresh_using=role.get, method='sts-assume-role')
+            session = self._account_sessions[role.account_id] = boto3.session.Session(
+                botocore_session=botocore_session)
+        return session
+
+    def clear(self):
+        """Drop every cached client (e.g. after credentials change)"""
+        with self._lock:
+            self._clients.clear()
+            self._session = None
+            self._account_sessions.clear()
+
+
+client_pool = ClientPool()
+
+
+def get_client(service, region, account_id=None):
+    """Shortcut for client_pool.get_client"""
+    return client_pool.get_client(service, region, account_id)
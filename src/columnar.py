@@ -0,0 +1,151 @@
+from operator import attrgetter, itemgetter
+from src.lazy import lazy_import
+from src.resources import Resource, ResourceColumns
+
+np = lazy_import('numpy')
+
+
+class ColumnTable:
+    """Struct-of-arrays view of one region's resources of one type
+
+    Built on the scanner's ResourceColumns, whose float buffers and string codes become
+    NumPy arrays with one copy each; straight from a columnar segment of a compact scan
+    file (see src/storage.py) without materializing any dicts; or from a list of records
+    (Resource objects or dicts). Numeric columns become NumPy arrays and string columns
+    are dictionary-encoded into integer codes, both converted once on first use and
+    cached. record(i) gives back the resource record for the rows that end up in a
+    recommendation.
+    """
+
+    def __init__(self, records=None, segment=None, columns=None):
+        if sum(source is not None for source in (records, segment, columns)) != 1:
+            raise ValueError("ColumnTable needs one of records, a columnar segment or ResourceColumns")
+        self.records = records
+        self.segment = segment
+        self.columns = columns
+        self._absent = {key: set(rows) for key, rows in segment.get('absent', {}).items()} if segment else {}
+        self._arrays = {}
+        self._codes = {}
+        self._rows = {}
+
+    @classmethod
+    def of(cls, resources):
+        """Table for ResourceColumns, a list of dicts, a columnar segment dict, or an existing table"""
+        if isinstance(resources, cls):
+            return resources
+        if isinstance(resources, ResourceColumns):
+            return cls(columns=resources)
+        if isinstance(resources, dict) and 'columns' in resources:
+            return cls(segment=resources)
+        return cls(records=resources)
+
+    def __len__(self):
+        if self.columns is not None:
+            return len(self.columns)
+        return self.segment['count'] if self.segment is not None else len(self.records)
+
+    def values(self, field, rows=None):
+        """Plain list of one column, or of its entries at rows (a list of row indexes); a
+        column missing from older scans reads as all None"""
+        if self.segment is not None or self.columns is not None:
+            column = (self.segment['columns'].get(field) if self.columns is None else self.columns.column(field)) \
+                or [None] * len(self)
+            return column if rows is None else [column[row] for row in rows]
+        records = self.records if rows is None else list(map(self.records.__getitem__, rows))
+        getter = itemgetter(field)
+        if records and isinstance(records[0], Resource) and field in records[0].FIELDS and field != 'tags':
+            getter = attrgetter(field)  # straight from the slots
+        try:
+            return list(map(getter, records))
+        except (KeyError, AttributeError):
+            return [record.get(field) for record in records]
+
+    def array(self, field, dtype=float):
+        """Column as a cached NumPy array (None becomes NaN in float columns)"""
+        key = (field, np.dtype(dtype).str)
+        array = self._arrays.get(key)
+        if array is None:
+            numbers = self.columns.numbers(field) if self.columns is not None else None
+            if numbers is None:
+                array = np.array(self.values(field), dtype=dtype)
+            else:
+                array = np.frombuffer(numbers, dtype=np.float64).copy()
+                if np.dtype(dtype) == bool:
+                    array = ~np.isnan(array) & (array != 0)  # None reads as False, as np.array gives
+                elif np.dtype(dtype) != np.float64:
+                    array = array.astype(dtype)
+            self._arrays[key] = array
+        return array
+
+    def codes(self, field):
+        """Dictionary-encoded column: (int32 codes, list of distinct values)"""
+        encoded = self._codes.get(field)
+        if encoded is None and self.columns is not None and self.columns.codes(field) is not None:
+            codes, categories = self.columns.codes(field)
+            encoded = self._codes[field] = (np.frombuffer(codes, dtype=np.int32).copy(), categories)
+        if encoded is None:
+            values = self.values(field)
+            # Distinct values in first-seen order, then one C-level lookup per row
+            categories = {value: code for code, value in enumerate(dict.fromkeys(values))}
+            codes = np.fromiter(map(categories.__getitem__, values), dtype=np.int32, count=len(values))
+            encoded = self._codes[field] = (codes, list(categories))
+        return encoded
+
+    def equals(self, field, value):
+        """Boolean mask of rows where field == value"""
+        codes, categories = self.codes(field)
+        if value not in categories:
+            return np.zeros(len(self), dtype=bool)
+        return codes == categories.index(value)
+
+    def group(self, rows, fields):
+        """Distinct combinations of fields among rows: ([(value, ...) per combination], combination index per row)
+
+        Reads only the given rows, so grouping a few matches does not encode whole columns;
+        on ResourceColumns, whose codes are already built, the rows' codes are combined
+        into one integer per row and grouped with np.unique instead.
+        """
+        if self.columns is not None and all(self.columns.codes(field) is not None for field in fields):
+            encoded = [self.codes(field) for field in fields]
+            rows = np.asarray(rows, dtype=np.intp)
+            combined = np.zeros(len(rows), dtype=np.int64)
+            for codes, categories in encoded:
+                combined = combined * len(categories) + codes[rows]
+            unique, inverse = np.unique(combined, return_inverse=True)
+            keys = []
+            for value in unique.tolist():
+                combo = []
+                for codes, categories in reversed(encoded):
+                    value, code = divmod(value, len(categories))
+                    combo.append(categories[code])
+                keys.append(tuple(reversed(combo)))
+            return keys, inverse.astype(np.intp)
+        rows = rows.tolist() if hasattr(rows, 'tolist') else list(rows)
+        combos = list(zip(*(self.values(field, rows) for field in fields))) if rows else []
+        index = {combo: code for code, combo in enumerate(dict.fromkeys(combos))}
+        inverse = np.fromiter(map(index.__getitem__, combos), dtype=np.intp, count=len(combos))
+        return list(index), inverse
+
+    def record(self, index):
+        """Resource record for one row: the original object when built from records, otherwise
+        a dict built once per row, so every recommendation about the row shares it"""
+        if self.records is not None:
+            return self.records[index]
+        row = self._rows.get(index)
+        if row is None and self.columns is not None:
+            row = self._rows[index] = self.columns.row(index)
+        if row is None:
+            row = self._rows[index] = {
+                key: values[index] for key, values in self.segment['columns'].items()
+                if index not in self._absent.get(key, ())
+            }
+        return row
+
+    def records_at(self, rows):
+        """record(row) for each of a list of rows; on ResourceColumns the rows not built yet
+        are built together"""
+        if self.columns is not None:
+            missing = [row for row in rows if row not in self._rows]
+            self._rows.update(zip(missing, self.columns.rows(missing)))
+            return list(map(self._rows.__getitem__, rows))
+        return [self.record(row) for row in rows]
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import math
+from src.analyzer import CostAnalyzer
+from src.archive import get_archive, load_report
+from src.metrics import metrics
+from src.storage import ID_FIELDS, load_scan
+from config import (DIFF_METRIC_STEP, IDLE_CPU_THRESHOLD, RECOMMENDATIONS_DIR, SCAN_DATA_DIR,
+                    UTILIZATION_QUANTILES)
+
+_QUANTILE_SUFFIXES = [f"_p{round(quantile * 100)}" for quantile in UTILIZATION_QUANTILES]
+
+# Utilization percentages drift a little every day: they are compared in DIFF_METRIC_STEP
+# buckets, plus which side of its analyzer threshold a value is on. The p95s are compared
+# exactly: rightsizing scales them by the size ratio before its threshold, so no bucket
+# edge lines up with it. Network byte percentiles, which the analyzer does not read, are
+# not compared.
+PERCENT_METRICS = frozenset(['cpu_avg_7d'] + [f"{name}{suffix}" for name in ('cpu', 'memory')
+                                              for suffix in _QUANTILE_SUFFIXES if suffix != '_p95'])
+METRIC_THRESHOLDS = {'cpu_avg_7d': IDLE_CPU_THRESHOLD}
+UNCOMPARED_FIELDS = frozenset(f"{name}{suffix}" for name in ('network_in', 'network_out')
+                              for suffix in _QUANTILE_SUFFIXES)
+
+# Recommendation type -> the scan resource list its resource_id refers to
+RECOMMENDATION_RESOURCES = {
+    'EC2_IDLE': 'ec2_instances',
+    'EC2_RIGHTSIZE': 'ec2_instances',
+    'EBS_UNATTACHED': 'ebs_volumes',
+    'ML_UNDERUTILIZED': 'ec2_instances',
+}
+# The ones CostAnalyzer produces, which depend on nothing but their resource and prices
+ANALYZER_RECOMMENDATIONS = frozenset(['EC2_IDLE', 'EC2_RIGHTSIZE', 'EBS_UNATTACHED'])
+
+
+def _comparable(field, value, metric_step):
+    if field in PERCENT_METRICS and metric_step and isinstance(value, (int, float)) and not math.isnan(value):
+        bucket = math.floor(value / metric_step)
+        threshold = METRIC_THRESHOLDS.get(field)
+        return bucket if threshold is None else [bucket, value < threshold]
+    return value
+
+
+def fingerprint(record, metric_step=DIFF_METRIC_STEP):
+    """64-bit content hash of a resource record, with utilization metrics bucketed (hex string)"""
+    content = {field: _comparable(field, value, metric_step) for field, value in record.items()
+               if field not in UNCOMPARED_FIELDS}
+    encoded = json.dumps(content, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+
+def resource_key(resource_type, region, account_id, resource_id):
+    return resource_type, account_id, region, resource_id
+
+
+def recommendation_key(rec):
+    """Index key of the resource a recommendation is about, or None for an unknown type"""
+    resource_type = RECOMMENDATION_RESOURCES.get(rec.get('type'))
+    if resource_type is None:
+        return None
+    return resource_key(resource_type, rec.get('region'), rec.get('account_id'), rec.get('resource_id'))
+
+
+def action_key(rec):
+    """(recommendation_key, action): what executing a recommendation does, to match it across runs"""
+    return recommendation_key(rec), rec.get('action')
+
+
+def completed_actions(actions_taken):
+    """action_keys of a report's actions_taken entries that ran for real and succeeded
+
+    Failed, dry-run (also from reports older than the dry_run flag) and unknown-type
+    entries are left out, so those recommendations are executed again.
+    """
+    completed = set()
+    for entry in actions_taken:
+        dry_run = entry.get('dry_run', str(entry.get('result', '')).startswith('[DRY RUN]'))
+        key = action_key(entry.get('recommendation') or {})
+        if entry.get('success') and not dry_run and key[0] is not None:
+            completed.add(key)
+    return completed
+
+
+class ResourceIndex:
+    """Hash index of one scan: (resource_type, account_id, region, resource_id) -> (fingerprint, record)
+
+    Built in one pass over the scan; resource types without an id field (see
+    storage.ID_FIELDS) are not indexed. accounts limits the index to those accounts.
+    """
+
+    def __init__(self, scan, metric_step=DIFF_METRIC_STEP, accounts=None):
+        self.metric_step = metric_step
+        self.entries = {}
+        accounts = set(accounts) if accounts is not None else None
+        for region, region_data in scan.get('regions', {}).items():
+            for resource_type, records in region_data.items():
+                id_field = ID_FIELDS.get(resource_type)
+                if id_field is None:
+                    continue
+                for record in records:
+                    if accounts is not None and record.get('account_id') not in accounts:
+                        continue
+                    key = resource_key(resource_type, region, record.get('account_id'), record.get(id_field))
+                    self.entries[key] = (fingerprint(record, metric_step), record)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def record(self, key):
+        entry = self.entries.get(key)
+        return entry[1] if entry else None
+
+
+class ScanDiff:
+    """Resources added, removed and changed between two scans
+
+    added and changed map index keys to the new records, removed to the old ones, all in
+    scan order; fields holds, per changed resource, {field: [old, new]} for the fields
+    that differ. new is the newer scan's ResourceIndex.
+    """
+
+    def __init__(self, new=None):
+        self.new = new
+        self.added = {}
+        self.removed = {}
+        self.changed = {}
+        self.fields = {}
+        self.unchanged = 0
+
+    def changed_scan(self, scan, also=()):
+        """scan reduced to its added and changed resources and the index keys in also, in
+        scan order (the input for CostAnalyzer)"""
+        selected = set(self.added) | set(self.changed) | set(also)
+        reduced = {key: value for key, value in scan.items() if key != 'regions'}
+        reduced['regions'] = {}
+        for region, region_data in scan.get('regions', {}).items():
+            reduced_region = reduced['regions'][region] = {}
+            for resource_type, records in region_data.items():
+                id_field = ID_FIELDS.get(resource_type)
+                reduced_region[resource_type] = [] if id_field is None else [
+                    record for record in records
+                    if resource_key(resource_type, region, record.get('account_id'), record.get(id_field)) in selected
+                ]
+        return reduced
+
+    def merge(self, other):
+        """Fold in the diff of another, disjoint part of the fleet (e.g. another shard)"""
+        for name in ('added', 'removed', 'changed', 'fields'):
+            getattr(self, name).update(getattr(other, name))
+        self.unchanged += other.unchanged
+        if other.new is not None:
+            if self.new is None:
+                self.new = other.new
+            else:
+                self.new.entries.update(other.new.entries)
+        return self
+
+    def summary(self):
+        """Counts plus one entry per added, removed or changed resource, for reports"""
+        changes = []
+        for status, entries in (('added', self.added), ('removed', self.removed), ('changed', self.changed)):
+            for key in entries:
+                resource_type, account_id, region, resource_id = key
+                change = {'status': status, 'resource_type': resource_type, 'account_id': account_id,
+                          'region': region, 'resource_id': resource_id}
+                if status == 'changed':
+                    change['fields'] = self.fields[key]
+                changes.append(change)
+        return {
+            'added': len(self.added),
+            'removed': len(self.removed),
+            'changed': len(self.changed),
+            'unchanged': self.unchanged,
+            'changes': changes,
+        }
+
+
+def diff_indexes(old, new):
+    """ScanDiff between two ResourceIndexes, linear in the number of resources"""
+    diff = ScanDiff(new)
+    for key, (new_fingerprint, record) in new.entries.items():
+        previous = old.entries.get(key)
+        if previous is None:
+            diff.added[key] = record
+        elif previous[0] != new_fingerprint:
+            diff.changed[key] = record
+            diff.fields[key] = changed_fields(previous[1], record, new.metric_step)
+        else:
+            diff.unchanged += 1
+    for key, (_, record) in old.entries.items():
+        if key not in new.entries:
+            diff.removed[key] = record
+    return diff
+
+
+def diff_scans(old_scan, new_scan, metric_step=DIFF_METRIC_STEP, accounts=None):
+    """ScanDiff between two scans (accounts: compare only resources of these accounts)"""
+    with metrics.timer('scan_diff'):
+        diff = diff_indexes(ResourceIndex(old_scan, metric_step, accounts),
+                            ResourceIndex(new_scan, metric_step, accounts))
+    for status in ('added', 'removed', 'changed'):
+        metrics.inc('resources_diffed', len(getattr(diff, status)), status=status)
+    metrics.inc('resources_diffed', diff.unchanged, status='unchanged')
+    return diff
+
+
+def changed_fields(old, new, metric_step=DIFF_METRIC_STEP):
+    """{field: [old value, new value]} for the compared fields that differ"""
+    changes = {}
+    for field in sorted(set(old) | set(new)):
+        if field in UNCOMPARED_FIELDS:
+            continue
+        before, after = old.get(field), new.get(field)
+        if _comparable(field, before, metric_step) != _comparable(field, after, metric_step):
+            changes[field] = [before, after]
+    return changes
+
+
+def analyze_changes(scan, diff, previous_recommendations):
+    """CostAnalyzer output for scan, analyzing only resources that may have changed their recommendations
+
+    These are the resources diff marks added or changed, plus the unchanged ones the
+    previous run made an analyzer recommendation for, which are analyzed again so their
+    recommendations reflect the current records and prices. An unchanged resource
+    without a previous recommendation still has none: everything the analyzer's
+    thresholds read is compared exactly or on the threshold's side (see fingerprint).
+    So the result matches a full analysis, recommendations in the same order, except
+    that a price change alone does not give an unchanged resource a new recommendation.
+    """
+    rechecked = set()
+    for rec in previous_recommendations:
+        if rec.get('type') not in ANALYZER_RECOMMENDATIONS:
+            continue
+        key = recommendation_key(rec)
+        if key in diff.new and key not in diff.changed and key not in diff.added:
+            rechecked.add(key)
+
+    analysis = CostAnalyzer(diff.changed_scan(scan, also=rechecked)).analyze()
+    analysis['rechecked'] = len(rechecked)
+    print(f" Re-checked {len(rechecked)} unchanged resources with previous recommendations")
+    return analysis
+
+
+def load_baseline(scan_dir=SCAN_DATA_DIR, report_dir=RECOMMENDATIONS_DIR):
+    """{'scan_file', 'recommendations', 'actions_taken'} of the newest report, if it was made from the newest scan
+
+    Returns None when there is no such pair (first run, or a manual scan since the last
+    report), in which case the next analysis has to be a full one.
+    """
+    scan_file = get_archive(scan_dir, 'scan').latest()
+    report_file = get_archive(report_dir, 'report').latest()
+    if scan_file is None or report_file is None:
+        return None
+
+    report = load_report(report_file)
+    if report.get('scan_time') is None or report['scan_time'] != load_scan(scan_file, regions=[]).get('scan_time'):
+        return None
+    return {'scan_file': scan_file, 'recommendations': report.get('recommendations', []),
+            'actions_taken': report.get('actions_taken', [])}
@@ -1,82 +1,210 @@
-import boto3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from config import EXECUTOR_BATCH_SIZE, EXECUTOR_REGION_CONCURRENCY
+from src.accounts import account_registry
+from src.clients import get_client
+from src.metrics import metrics
+from src.pricing import get_pricing_engine
+from src.snapshots import SnapshotPipeline
+
+# StopInstances error codes (prefixes) caused by particular IDs in the call. Only these
+# are worth retrying per ID: throttling or auth errors would fail every single-ID call too
+PER_ID_ERROR_CODES = ('InvalidInstanceID.', 'IncorrectInstanceState', 'UnsupportedOperation')
+
+
+def error_code(error):
+    """AWS error code of a botocore ClientError ('' for anything else)"""
+    return (getattr(error, 'response', None) or {}).get('Error', {}).get('Code') or ''
 
 
 class RemediationExecutor:
     """Executes auto-remediation actions on AWS resources"""
 
-    def __init__(self, dry_run=True):
+    def __init__(self, dry_run=True, pricing=None, region_concurrency=EXECUTOR_REGION_CONCURRENCY,
+                 batch_size=EXECUTOR_BATCH_SIZE, snapshots=None):
         self.dry_run = dry_run
+        self.region_concurrency = max(1, region_concurrency)
+        self.batch_size = max(1, batch_size)
+        self.pricing = pricing or get_pricing_engine()
         self.actions_taken = []
+        self._snapshots = snapshots
+        self._lock = threading.Lock()
 
     def execute_recommendations(self, recommendations, auto_approve_threshold=20.0):
         """Execute recommendations automatically if savings < threshold"""
         print(f"  Executing recommendations (dry_run={self.dry_run})...")
 
-        for rec in recommendations:
-            if rec['monthly_savings'] < auto_approve_threshold:
-                self.execute_single_recommendation(rec)
+        approved = [rec for rec in recommendations
+                    if self.estimate_monthly_savings(rec) < auto_approve_threshold]
+        self.execute_batch(approved)
 
         print(f" Executed {len(self.actions_taken)} actions")
         return self.actions_taken
 
-    def execute_single_recommendation(self, rec):
-        """Execute a single recommendation"""
-        action = rec['action']
-        region = rec['region']
-        resource_id = rec['resource_id']
-
+    @metrics.timed('stage', stage='execute')
+    def execute_batch(self, recommendations):
+        """Execute recommendations grouped by (region, account) and action, groups in parallel
+
+        Each group's actions run in one worker, in the recommendation's account (its
+        account_id; the ambient account when absent); STOP actions are batched into
+        multi-ID StopInstances calls. Entries are appended to actions_taken in input
+        order, one per recommendation, whatever the group finishing order.
+        """
+        by_scope = OrderedDict()
+        for position, rec in enumerate(recommendations):
+            by_scope.setdefault((rec['region'], rec.get('account_id')), []).append((position, rec))
+
+        outcomes = {}
+        if len(by_scope) > 1 and self.region_concurrency > 1:
+            with ThreadPoolExecutor(max_workers=self.region_concurrency) as pool:
+                for scope_outcomes in pool.map(lambda item: self.execute_region(item[0][0], item[1], item[0][1]),
+                                               by_scope.items()):
+                    outcomes.update(scope_outcomes)
+        else:
+            for (region, account_id), items in by_scope.items():
+                outcomes.update(self.execute_region(region, items, account_id))
+
+        entries = []
+        for position, rec in enumerate(recommendations):
+            result, error = outcomes[position]
+            entry = {'timestamp': datetime.now().isoformat(), 'recommendation': rec, 'dry_run': self.dry_run}
+            if error is None:
+                entry.update(result=result, success=True)
+                print(f"   {rec['action']} on {rec['resource_id']}: {result}")
+            else:
+                entry.update(error=error, success=False)
+                print(f"   Failed to {rec['action']} on {rec['resource_id']}: {error}")
+            metrics.inc('actions', action=rec['action'], success=entry['success'], dry_run=self.dry_run)
+            entries.append(entry)
+        self.actions_taken.extend(entries)
+        return entries
+
+    def execute_region(self, region, items, account_id=None):
+        """Run one region's (position, rec) items in one account; returns {position: (result, error)}"""
         try:
+            account_registry.role(account_id)
+        except KeyError as e:
+            return {position: (None, e.args[0]) for position, _ in items}
+
+        by_action = OrderedDict()
+        for position, rec in items:
+            by_action.setdefault(rec['action'], []).append((position, rec))
+
+        outcomes = {}
+        for action, action_items in by_action.items():
+            ids = [rec['resource_id'] for _, rec in action_items]
             if action == 'STOP':
-                result = self.stop_ec2_instance(region, resource_id)
+                results = self.stop_ec2_instances(region, ids, account_id)
             elif action == 'SNAPSHOT_DELETE':
-                result = self.snapshot_and_delete_volume(region, resource_id)
+                results = self.snapshot_and_delete_volumes(region, ids, account_id)
             else:
-                result = f"Unknown action: {action}"
-
-            self.actions_taken.append({
-                'timestamp': datetime.now().isoformat(),
-                'recommendation': rec,
-                'result': result,
-                'success': True
-            })
-
-            print(f"   {action} on {resource_id}: {result}")
-
-        except Exception as e:
-            print(f"   Failed to {action} on {resource_id}: {e}")
-            self.actions_taken.append({
-                'timestamp': datetime.now().isoformat(),
-                'recommendation': rec,
-                'error': str(e),
-                'success': False
-            })
-
-    def stop_ec2_instance(self, region, instance_id):
-        """Stop an EC2 instance"""
-        if self.dry_run:
-            return f"[DRY RUN] Would stop instance {instance_id}"
-
-        ec2 = boto3.client('ec2', region_name=region)
-        response = ec2.stop_instances(InstanceIds=[instance_id])
-        return f"Stopped instance {instance_id}"
+                results = {resource_id: (f"Unknown action: {action}", None) for resource_id in ids}
+            for position, rec in action_items:
+                outcomes[position] = results[rec['resource_id']]
+        return outcomes
+
+    def estimate_monthly_savings(self, rec):
+        """Savings of a recommendation at current prices (reports may have been priced earlier)
+
+        Falls back to the recommendation's own monthly_savings (or 0) when the resource
+        details needed for pricing are missing.
+        """
+        details = rec.get('details') or {}
+        if rec.get('action') == 'STOP' and details.get('type'):
+            return self.pricing.ec2_hourly(rec['region'], details['type'], details.get('platform'),
+                                           details.get('tenancy')) * 24 * 30
+        if rec.get('action') == 'SNAPSHOT_DELETE' and details.get('size_gb') is not None:
+            return details['size_gb'] * self.pricing.ebs_gb_month(rec['region'], details.get('volume_type'))
+        return rec.get('monthly_savings', 0.0)
 
-    def snapshot_and_delete_volume(self, region, volume_id):
-        """Create snapshot then delete EBS volume"""
-        if self.dry_run:
-            return f"[DRY RUN] Would snapshot and delete volume {volume_id}"
+    def execute_single_recommendation(self, rec):
+        """Execute a single recommendation"""
+        return self.execute_batch([rec])[0]
 
-        ec2 = boto3.client('ec2', region_name=region)
+    def stop_ec2_instance(self, region, instance_id, account_id=None):
+        """Stop an EC2 instance"""
+        result, error = self.stop_ec2_instances(region, [instance_id], account_id)[instance_id]
+        if error is not None:
+            raise RuntimeError(error)
+        return result
+
+    def stop_ec2_instances(self, region, instance_ids, account_id=None):
+        """Stop EC2 instances with multi-ID calls; returns {instance_id: (result, error)}
+
+        A batch rejected because of particular IDs (PER_ID_ERROR_CODES, e.g. one unknown
+        ID) is retried one ID at a time so each instance gets its own outcome; any other
+        error (throttling, auth) fails the whole chunk without further calls. IDs missing
+        from StoppingInstances count as failures.
+        """
+        outcomes = {}
+        for start in range(0, len(instance_ids), self.batch_size):
+            chunk = list(dict.fromkeys(instance_ids[start:start + self.batch_size]))
+            if self.dry_run:
+                for instance_id in chunk:
+                    outcomes[instance_id] = (f"[DRY RUN] Would stop instance {instance_id}", None)
+                continue
+
+            ec2 = get_client('ec2', region, account_id)
+            try:
+                outcomes.update(self._stop_outcomes(chunk, ec2.stop_instances(InstanceIds=chunk)))
+            except Exception as batch_error:
+                if len(chunk) == 1 or not error_code(batch_error).startswith(PER_ID_ERROR_CODES):
+                    outcomes.update((instance_id, (None, str(batch_error))) for instance_id in chunk)
+                    continue
+                for instance_id in chunk:
+                    try:
+                        response = ec2.stop_instances(InstanceIds=[instance_id])
+                        outcomes.update(self._stop_outcomes([instance_id], response))
+                    except Exception as e:
+                        outcomes[instance_id] = (None, str(e))
+        return outcomes
+
+    @staticmethod
+    def _stop_outcomes(instance_ids, response):
+        """Per-ID outcome of a StopInstances response"""
+        stopping = {item['InstanceId']: item for item in response.get('StoppingInstances', [])}
+        outcomes = {}
+        for instance_id in instance_ids:
+            item = stopping.get(instance_id)
+            if item is None:
+                outcomes[instance_id] = (None, f"Instance {instance_id} missing from StopInstances response")
+            else:
+                state = item.get('CurrentState', {}).get('Name', 'stopping')
+                outcomes[instance_id] = (f"Stopped instance {instance_id} ({state})", None)
+        return outcomes
 
-        # Create snapshot
-        snapshot = ec2.create_snapshot(
-            VolumeId=volume_id,
-            Description=f"Auto-backup before deletion - {datetime.now().isoformat()}"
-        )
-        snapshot_id = snapshot['SnapshotId']
+    def snapshot_and_delete_volume(self, region, volume_id, account_id=None):
+        """Create snapshot then delete EBS volume"""
+        result, error = self.snapshot_and_delete_volumes(region, [volume_id], account_id)[volume_id]
+        if error is not None:
+            raise RuntimeError(error)
+        return result
 
+    def snapshot_and_delete_volumes(self, region, volume_ids, account_id=None):
+        """Snapshot EBS volumes and delete each once its snapshot completes
 
-        return f"Created snapshot {snapshot_id}, ready to delete {volume_id}"
+        Returns {volume_id: (result, error)}. Runs through the resumable SnapshotPipeline,
+        which also finishes snapshots an interrupted run left in flight in this region and account.
+        """
+        if self.dry_run:
+            return {volume_id: (f"[DRY RUN] Would snapshot and delete volume {volume_id}", None)
+                    for volume_id in volume_ids}
+
+        outcomes = self.snapshot_pipeline().run(region, volume_ids, account_id)
+        for volume_id in set(outcomes) - set(volume_ids):
+            result, error = outcomes[volume_id]
+            print(f"   Resumed SNAPSHOT_DELETE on {volume_id}: {result or error}")
+        return {volume_id: outcomes.get(volume_id, (None, f"No outcome for {volume_id}"))
+                for volume_id in volume_ids}
+
+    def snapshot_pipeline(self):
+        """Shared SnapshotPipeline (one state file across region workers)"""
+        with self._lock:
+            if self._snapshots is None:
+                self._snapshots = SnapshotPipeline()
+            return self._snapshots
 
 
 if __name__ == '__main__':
@@ -0,0 +1,255 @@
+import os
+import sqlite3
+import sys
+import threading
+from datetime import date, datetime, timedelta
+from src.pricing import get_pricing_engine
+from src.metrics import metrics
+from config import HISTORY_DB_FILE, HISTORY_DAILY_DAYS, HISTORY_WEEKLY_DAYS, IDLE_CPU_THRESHOLD
+
+# Averaged value columns per table; rollups keep sample-weighted means so that day, week
+# and month rows can be merged in any order
+REGION_COLUMNS = ('ec2_total', 'ec2_running', 'ec2_idle', 'ebs_total', 'ebs_unattached', 'ebs_gb',
+                  'rds_total', 'ec2_monthly_cost', 'ebs_monthly_cost')
+RESOURCE_COLUMNS = ('running', 'cpu_avg', 'cpu_p95', 'monthly_cost')
+SAVINGS_COLUMNS = ('recommendations', 'monthly_savings')
+
+TABLES = {
+    'region_stats': (('region',), REGION_COLUMNS),
+    'resource_stats': (('resource_id',), RESOURCE_COLUMNS),
+    'savings_stats': (('rec_type',), SAVINGS_COLUMNS),
+}
+
+# SQLite date expression for the bucket a finer row rolls up into
+BUCKET_SQL = {'week': "date(bucket, '-6 days', 'weekday 1')", 'month': "strftime('%Y-%m-01', bucket)"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS region_stats (
+    resolution TEXT NOT NULL, bucket TEXT NOT NULL, region TEXT NOT NULL, samples INTEGER NOT NULL,
+    ec2_total REAL, ec2_running REAL, ec2_idle REAL, ebs_total REAL, ebs_unattached REAL, ebs_gb REAL,
+    rds_total REAL, ec2_monthly_cost REAL, ebs_monthly_cost REAL,
+    PRIMARY KEY (resolution, bucket, region)
+);
+CREATE TABLE IF NOT EXISTS resource_stats (
+    resource_id TEXT NOT NULL, resolution TEXT NOT NULL, bucket TEXT NOT NULL, samples INTEGER NOT NULL,
+    region TEXT, resource_type TEXT, kind TEXT,
+    running REAL, cpu_avg REAL, cpu_p95 REAL, monthly_cost REAL,
+    PRIMARY KEY (resource_id, resolution, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS resource_stats_bucket ON resource_stats (resolution, bucket);
+CREATE TABLE IF NOT EXISTS savings_stats (
+    resolution TEXT NOT NULL, bucket TEXT NOT NULL, rec_type TEXT NOT NULL, samples INTEGER NOT NULL,
+    recommendations REAL, monthly_savings REAL,
+    PRIMARY KEY (resolution, bucket, rec_type)
+);
+"""
+
+
+class HistoryStore:
+    """SQLite time series of scan and report aggregates, for trend queries
+
+    Each scan adds one row per region (fleet counts and estimated monthly cost) and one
+    per resource (running, CPU, monthly cost) for its day; each report adds one row
+    per recommendation type (and '*' for all). A later scan on the same day replaces the
+    day's rows. downsample() rolls day rows older than HISTORY_DAILY_DAYS into weeks and
+    week rows older than HISTORY_WEEKLY_DAYS into months, as sample-weighted means, so a
+    trend over months reads a few hundred rows per region or resource.
+    """
+
+    def __init__(self, path=HISTORY_DB_FILE, daily_days=HISTORY_DAILY_DAYS, weekly_days=HISTORY_WEEKLY_DAYS,
+                 pricing=None):
+        self.path = path
+        self.daily_days = daily_days
+        self.weekly_days = weekly_days
+        self._pricing = pricing
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        if path != ':memory:':
+            self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+
+    @property
+    def pricing(self):
+        if self._pricing is None:
+            self._pricing = get_pricing_engine()
+        return self._pricing
+
+    def close(self):
+        self.db.close()
+
+    def record_scan(self, results):
+        """Store region and resource aggregates of one scan (records as written by the scanner)"""
+        day = _day(results.get('scan_time'))
+        region_rows = []
+        resource_rows = []
+
+        for region, data in results.get('regions', {}).items():
+            totals = dict.fromkeys(REGION_COLUMNS, 0.0)
+            for instance in data.get('ec2_instances', []):
+                running = instance.get('state') == 'running'
+                cost = self.pricing.ec2_hourly(region, instance.get('type'), instance.get('platform'),
+                                               instance.get('tenancy')) * 24 * 30 if running else 0.0
+                totals['ec2_total'] += 1
+                totals['ec2_running'] += running
+                totals['ec2_idle'] += running and (instance.get('cpu_avg_7d') or 0.0) < IDLE_CPU_THRESHOLD
+                totals['ec2_monthly_cost'] += cost
+                resource_rows.append((instance['instance_id'], day, region, 'ec2', instance.get('type'),
+                                      float(running), instance.get('cpu_avg_7d'), instance.get('cpu_p95'), cost))
+
+            for volume in data.get('ebs_volumes', []):
+                cost = (volume.get('size_gb') or 0) * self.pricing.ebs_gb_month(region, volume.get('volume_type'))
+                totals['ebs_total'] += 1
+                totals['ebs_unattached'] += not volume.get('attached')
+                totals['ebs_gb'] += volume.get('size_gb') or 0
+                totals['ebs_monthly_cost'] += cost
+                resource_rows.append((volume['volume_id'], day, region, 'ebs', volume.get('volume_type'),
+                                      float(volume.get('state') == 'in-use'), None, None, cost))
+
+            for db in data.get('rds_instances', []):
+                totals['rds_total'] += 1
+                resource_rows.append((db['db_identifier'], day, region, 'rds', db.get('db_class'),
+                                      float(db.get('status') == 'available'), None, None, None))
+
+            region_rows.append((day, region) + tuple(round(totals[column], 4) for column in REGION_COLUMNS))
+
+        with self._lock, self.db:
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO region_stats (resolution, bucket, region, samples, {', '.join(REGION_COLUMNS)}) "
+                f"VALUES ('day', ?, ?, 1, {', '.join('?' * len(REGION_COLUMNS))})", region_rows)
+            self.db.executemany(
+                "INSERT OR REPLACE INTO resource_stats (resource_id, resolution, bucket, samples, region, "
+                "resource_type, kind, running, cpu_avg, cpu_p95, monthly_cost) "
+                "VALUES (?, 'day', ?, 1, ?, ?, ?, ?, ?, ?, ?)", resource_rows)
+        metrics.inc('history_rows_written', len(region_rows) + len(resource_rows), table='scan')
+        self.downsample(day)
+        return day
+
+    def record_report(self, report):
+        """Store recommendation counts and savings of one report, per type and in total ('*')"""
+        day = _day(report.get('timestamp'))
+        by_type = {'*': [0, 0.0]}
+        for rec in report.get('recommendations', []):
+            for rec_type in ('*', rec.get('type', 'UNKNOWN')):
+                counts = by_type.setdefault(rec_type, [0, 0.0])
+                counts[0] += 1
+                counts[1] += rec.get('monthly_savings') or 0.0
+
+        with self._lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO savings_stats (resolution, bucket, rec_type, samples, recommendations, "
+                "monthly_savings) VALUES ('day', ?, ?, 1, ?, ?)",
+                [(day, rec_type, count, round(savings, 2)) for rec_type, (count, savings) in by_type.items()])
+        metrics.inc('history_rows_written', len(by_type), table='report')
+        self.downsample(day)
+        return day
+
+    def downsample(self, today=None):
+        """Roll day rows older than daily_days into weeks, and week rows older than weekly_days into months"""
+        today = date.fromisoformat(today) if isinstance(today, str) else (today or date.today())
+        steps = (('day', 'week', today - timedelta(days=self.daily_days)),
+                 ('week', 'month', today - timedelta(days=self.weekly_days)))
+
+        with self._lock, self.db:
+            for table, (keys, columns) in TABLES.items():
+                for finer, coarser, cutoff in steps:
+                    self._roll_up(table, keys, columns, finer, coarser, cutoff.isoformat())
+
+    def _roll_up(self, table, keys, columns, finer, coarser, cutoff):
+        extra = ('region', 'resource_type', 'kind') if table == 'resource_stats' else ()
+        key_list = ', '.join(keys)
+        select_extra = ''.join(f", MAX({column})" for column in extra)
+        means = ', '.join(f"SUM({column} * samples) / SUM(CASE WHEN {column} IS NOT NULL THEN samples END)"
+                          for column in columns)
+        # Weighted merge with an existing coarser row; a side without data (NULL) is ignored
+        merge = ', '.join(f"{column} = CASE WHEN {column} IS NULL THEN excluded.{column} "
+                          f"WHEN excluded.{column} IS NULL THEN {column} "
+                          f"ELSE ({column} * samples + excluded.{column} * excluded.samples) / "
+                          f"(samples + excluded.samples) END" for column in columns)
+        self.db.execute(
+            f"INSERT INTO {table} (resolution, bucket, {key_list}, samples{''.join(', ' + c for c in extra)}, "
+            f"{', '.join(columns)}) "
+            f"SELECT '{coarser}', {BUCKET_SQL[coarser]} AS rolled, {key_list}, SUM(samples){select_extra}, {means} "
+            f"FROM {table} WHERE resolution = '{finer}' AND bucket < ? GROUP BY rolled, {key_list} "
+            f"ON CONFLICT (resolution, bucket, {key_list}) DO UPDATE SET {merge}, samples = samples + excluded.samples",
+            (cutoff,))
+        self.db.execute(f"DELETE FROM {table} WHERE resolution = '{finer}' AND bucket < ?", (cutoff,))
+
+    def cost_trend(self, days=90, region=None, today=None):
+        """Per-bucket fleet aggregates since `days` ago, summed over regions (or for one region)
+
+        Rows are ordered by bucket; each says its resolution, so recent history is daily
+        and older history weekly or monthly.
+        """
+        since = _since(days, today)
+        sums = ', '.join(f"ROUND(SUM({column}), 2) AS {column}" for column in REGION_COLUMNS)
+        query = (f"SELECT bucket, resolution, COUNT(*) AS regions, {sums} FROM region_stats "
+                 f"WHERE bucket >= ? {'AND region = ?' if region else ''} "
+                 f"GROUP BY resolution, bucket ORDER BY bucket")
+        params = (since, region) if region else (since,)
+        with self._lock:
+            rows = [dict(row) for row in self.db.execute(query, params)]
+        for row in rows:
+            row['monthly_cost'] = round((row['ec2_monthly_cost'] or 0) + (row['ebs_monthly_cost'] or 0), 2)
+        return rows
+
+    def resource_trend(self, resource_id, days=90, today=None):
+        """Rows for one resource since `days` ago, ordered by bucket"""
+        with self._lock:
+            return [dict(row) for row in self.db.execute(
+                f"SELECT bucket, resolution, region, resource_type, kind, {', '.join(RESOURCE_COLUMNS)} "
+                f"FROM resource_stats WHERE resource_id = ? AND bucket >= ? ORDER BY bucket",
+                (resource_id, _since(days, today)))]
+
+    def savings_trend(self, days=90, rec_type='*', today=None):
+        """Recommendation count and potential savings per bucket for one type ('*' = all)"""
+        with self._lock:
+            return [dict(row) for row in self.db.execute(
+                "SELECT bucket, resolution, recommendations, monthly_savings FROM savings_stats "
+                "WHERE rec_type = ? AND bucket >= ? ORDER BY bucket",
+                (rec_type, _since(days, today)))]
+
+
+# Buckets and cutoffs use local days, the clock scan_time and report timestamps are written in
+def _day(timestamp):
+    """ISO day of a scan/report timestamp (today if missing)"""
+    if not timestamp:
+        return date.today().isoformat()
+    return datetime.fromisoformat(timestamp).date().isoformat()
+
+
+def _since(days, today=None):
+    today = date.fromisoformat(today) if isinstance(today, str) else (today or date.today())
+    return (today - timedelta(days=days)).isoformat()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """Process-wide HistoryStore on HISTORY_DB_FILE"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+        return _store
+
+
+if __name__ == '__main__':
+    # python -m src.history backfill: load every existing scan and report into the store
+    if sys.argv[1:] != ['backfill']:
+        print("Usage: python -m src.history backfill")
+        sys.exit(2)
+
+    from src.archive import get_archive, load_report
+    from src.storage import load_scan
+    from config import RECOMMENDATIONS_DIR, SCAN_DATA_DIR
+
+    store = get_history_store()
+    for path in get_archive(SCAN_DATA_DIR, 'scan').paths():
+        print(f"  scan {path}: {store.record_scan(load_scan(path))}")
+    for path in get_archive(RECOMMENDATIONS_DIR, 'report').paths():
+        print(f"  report {path}: {store.record_report(load_report(path))}")
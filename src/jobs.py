@@ -0,0 +1,149 @@
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from config import MAX_CONCURRENT_JOBS, JOB_HISTORY_SIZE
+
+# Dedup key shared by every job that scans the fleet (manual trigger, daily job)
+SCAN_DEDUP_KEY = 'scan'
+
+
+def scan_result(summary, recommendations_count, potential_savings, report_file=None):
+    """Result of a SCAN_DEDUP_KEY job; one shape for all of them, since a trigger may be handed another's job"""
+    result = {'summary': summary, 'recommendations_count': recommendations_count,
+              'potential_savings': potential_savings}
+    if report_file is not None:
+        result['report_file'] = report_file
+    return result
+
+
+class Job:
+    """One background pipeline run and its progress"""
+
+    def __init__(self, kind, dedup_key):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.dedup_key = dedup_key
+        self.status = 'queued'
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.stage = None
+        self.scopes = None
+        self.regions = {}
+        self.result = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    def set_stage(self, stage):
+        """Record the pipeline step being run (scan, analyze, ...)"""
+        with self._lock:
+            self.stage = stage
+
+    def set_scopes(self, scopes):
+        """Record the (account, region) scopes the job will scan, as labelled in region_progress"""
+        with self._lock:
+            self.scopes = list(scopes)
+
+    def region_progress(self, region, status, elapsed=None, error=None):
+        """Progress callback for AWSResourceScanner"""
+        with self._lock:
+            self.regions[region] = {'status': status, 'elapsed': elapsed, 'error': error}
+
+    def to_dict(self):
+        with self._lock:
+            done = sum(1 for region in self.regions.values() if region['status'] in ('done', 'failed'))
+            return {
+                'job_id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'stage': self.stage,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'progress': {
+                    'regions_total': len(self.scopes) if self.scopes is not None else None,
+                    'regions_done': done,
+                    'regions': dict(self.regions)
+                },
+                'result': self.result,
+                'error': self.error
+            }
+
+
+class JobManager:
+    """Runs pipeline jobs on a bounded worker pool
+
+    At most max_concurrent jobs run at once; the rest wait in the pool's queue.
+    Submitting while a job with the same dedup key is queued or running returns that
+    job instead of starting another, so overlapping triggers share one scan. Finished
+    jobs are kept for status lookups up to history_size.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_JOBS, history_size=JOB_HISTORY_SIZE):
+        self.history_size = history_size
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_concurrent), thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._active = {}
+
+    def submit(self, kind, fn, dedup_key=None):
+        """Queue fn(job); returns (job, deduplicated)"""
+        dedup_key = dedup_key or kind
+        with self._lock:
+            running = self._active.get(dedup_key)
+            if running is not None and running.active:
+                return running, True
+
+            job = Job(kind, dedup_key)
+            self._active[dedup_key] = job
+            self._jobs[job.id] = job
+            self._trim()
+
+        self._pool.submit(self._run, job, fn)
+        return job, False
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        """Jobs, newest first"""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def _run(self, job, fn):
+        job.status = 'running'
+        job.started_at = datetime.now().isoformat()
+        try:
+            job.result = fn(job)
+            job.status = 'succeeded'
+        except Exception as e:
+            print(f" Job {job.id} ({job.kind}) failed: {e}")
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = datetime.now().isoformat()
+            with self._lock:
+                if self._active.get(job.dedup_key) is job:
+                    del self._active[job.dedup_key]
+
+    def _trim(self):
+        while len(self._jobs) > self.history_size:
+            oldest_id = next(iter(self._jobs))
+            if self._jobs[oldest_id].active:
+                break
+            del self._jobs[oldest_id]
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+job_manager = JobManager()
@@ -0,0 +1,23 @@
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Placeholder for a module that is imported on its first attribute access
+
+    Bound at module level like a normal import (np = lazy_import('numpy')), so code keeps
+    writing np.array(...), but the import cost is only paid by processes that actually
+    use the module. After the first access the real module's namespace is copied in and
+    later lookups are plain attribute reads.
+    """
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name):
+    """The module itself if it is already imported, otherwise a LazyModule for it"""
+    return sys.modules.get(name) or LazyModule(name)
@@ -0,0 +1,168 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from config import LEASE_DIR, LEASE_TTL, LEASE_WAIT
+
+
+class LeaseHeld(Exception):
+    """The lease is owned by another runner"""
+
+
+class FileLease:
+    """Expiring, exclusive ownership of a named piece of work, shared through a directory
+
+    The lease is a JSON file <directory>/<name>.lease holding the owner, a random token
+    and an expiry time. It is taken by creating the file with O_EXCL, so exactly one
+    runner wins across threads, processes and app instances on the same filesystem.
+    The holder renews it from a background thread every ttl/3 seconds (see hold());
+    a lease whose holder died expires after ttl and is then broken by the next
+    acquirer. Breaking renames the file aside and checks the token before deleting it,
+    so a lease that was just renewed or re-taken is never removed by mistake.
+    """
+
+    def __init__(self, name, directory=LEASE_DIR, ttl=LEASE_TTL, owner=None, clock=time.time):
+        self.name = name
+        self.path = os.path.join(directory, f"{name}.lease")
+        self.ttl = ttl
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.clock = clock
+        self.token = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _record(self):
+        now = self.clock()
+        return {'owner': self.owner, 'token': self.token, 'acquired': now, 'expires': now + self.ttl}
+
+    def _read(self, path=None):
+        try:
+            with open(path or self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            return {}  # being written right now, or torn: judged by its mtime
+
+    def _expired(self, current):
+        if current.get('expires') is not None:
+            return current['expires'] <= self.clock()
+        try:
+            return os.path.getmtime(self.path) + self.ttl <= time.time()
+        except FileNotFoundError:
+            return True
+
+    def acquire(self):
+        """Take the lease if it is free or expired; returns True on success"""
+        for _ in range(3):
+            self.token = uuid.uuid4().hex
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                current = self._read()
+                if current is not None and not self._expired(current):
+                    self.token = None
+                    return False
+                if current is not None and not self._break(current):
+                    self.token = None
+                    return False
+                continue
+
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._record(), f)
+            return True
+
+        self.token = None
+        return False
+
+    def _break(self, expired):
+        aside = f"{self.path}.{uuid.uuid4().hex}.expired"
+        try:
+            os.rename(self.path, aside)
+        except FileNotFoundError:
+            return True  # someone else broke or released it already
+
+        moved = self._read(aside)
+        if moved is not None and moved.get('token') != expired.get('token'):
+            # Renewed or re-taken between our read and the rename: put it back
+            try:
+                os.link(aside, self.path)
+            except FileExistsError:
+                pass
+            os.remove(aside)
+            return False
+        os.remove(aside)
+        return True
+
+    def wait(self, timeout=LEASE_WAIT, interval=5.0, sleep=time.sleep):
+        """acquire(), retrying every `interval` seconds for up to `timeout`; returns True on success"""
+        deadline = time.monotonic() + timeout
+        while not self.acquire():
+            if time.monotonic() >= deadline:
+                return False
+            sleep(min(interval, max(0.0, deadline - time.monotonic())))
+        return True
+
+    def renew(self):
+        """Push the expiry out by ttl; returns False if the lease was lost meanwhile"""
+        current = self._read()
+        if self.token is None or not current or current.get('token') != self.token:
+            return False
+        tmp_path = f"{self.path}.{self.token}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(self._record(), acquired=current['acquired']), f)
+        os.replace(tmp_path, self.path)
+        return True
+
+    def release(self):
+        """Give the lease up (only if it is still ours)"""
+        current = self._read()
+        if self.token is not None and current and current.get('token') == self.token:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        self.token = None
+
+    def holder(self):
+        """The current lease record ({'owner', 'expires', ...}) or None when free"""
+        current = self._read()
+        return current if current and not self._expired(current) else None
+
+    def hold(self, timeout=0):
+        """Context manager: acquire (waiting up to timeout seconds), renew while inside, release after
+
+        Raises LeaseHeld when the lease could not be taken in time.
+        """
+        return _Held(self, timeout)
+
+
+class _Held:
+
+    def __init__(self, lease, timeout):
+        self.lease = lease
+        self.timeout = timeout
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        acquired = self.lease.wait(self.timeout) if self.timeout else self.lease.acquire()
+        if not acquired:
+            holder = self.lease.holder() or {}
+            raise LeaseHeld(f"{self.lease.name} is held by {holder.get('owner', 'another runner')}")
+        self._thread = threading.Thread(target=self._renew, name=f"lease-{self.lease.name}", daemon=True)
+        self._thread.start()
+        return self.lease
+
+    def _renew(self):
+        while not self._stop.wait(self.lease.ttl / 3):
+            if not self.lease.renew():
+                print(f"  ️  Lost lease {self.lease.name}")
+                return
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.lease.release()
+        return False
@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from src.metrics import metrics
+from config import METRIC_CACHE_FILE, METRIC_CACHE_TTL_DAYS, METRIC_CACHE_MAX_RESOURCES
+
+
+class MetricCache:
+    """Local cache of per-resource daily metric datapoints for incremental scans
+
+    Layout on disk (JSON):
+        {'version': 1, 'resources': {resource_id: {'touched': 'YYYY-MM-DD',
+                                                   'metrics': {field: {'YYYY-MM-DD': value or None}}}}}
+
+    A None value records a day CloudWatch had no datapoint for, so that day is not
+    fetched again. The scanner's 'utilization' field holds {day computed: percentiles}. Datapoints older than the TTL are evicted, resources not seen for
+    the TTL are dropped, and beyond max_resources the least recently touched go first.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path=METRIC_CACHE_FILE, ttl_days=METRIC_CACHE_TTL_DAYS,
+                 max_resources=METRIC_CACHE_MAX_RESOURCES):
+        self.path = path
+        self.ttl_days = ttl_days
+        self.max_resources = max_resources
+        self._lock = threading.Lock()
+        self.resources = {}
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        """Load the cache file; a missing or unreadable file starts an empty cache"""
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.resources = data.get('resources', {})
+        except (OSError, ValueError) as e:
+            if os.path.exists(self.path):
+                print(f"  ️  Ignoring unreadable metric cache {self.path}: {e}")
+            self.resources = {}
+
+    def get_days(self, resource_id, field):
+        """Cached {day: value} for one resource metric (a copy)"""
+        with self._lock:
+            entry = self.resources.get(resource_id)
+            days = dict(entry['metrics'].get(field, {})) if entry else {}
+            if days:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return days
+
+    def update(self, resource_id, field, days):
+        """Merge {day: value} datapoints into the cache and mark the resource as seen today"""
+        with self._lock:
+            entry = self.resources.setdefault(resource_id, {'touched': None, 'metrics': {}})
+            entry['touched'] = datetime.utcnow().date().isoformat()
+            entry['metrics'].setdefault(field, {}).update(days)
+
+    def invalidate(self, resource_id):
+        """Forget everything cached for a resource (it changed since the last scan)"""
+        with self._lock:
+            self.resources.pop(resource_id, None)
+
+    def evict(self):
+        """Drop expired datapoints and resources, then trim to max_resources"""
+        cutoff = (datetime.utcnow().date() - timedelta(days=self.ttl_days)).isoformat()
+
+        with self._lock:
+            for resource_id in list(self.resources):
+                entry = self.resources[resource_id]
+                if not entry.get('touched') or entry['touched'] < cutoff:
+                    del self.resources[resource_id]
+                    continue
+                for field, days in entry['metrics'].items():
+                    entry['metrics'][field] = {day: value for day, value in days.items() if day >= cutoff}
+
+            overflow = len(self.resources) - self.max_resources
+            if overflow > 0:
+                oldest = sorted(self.resources, key=lambda rid: self.resources[rid]['touched'])[:overflow]
+                for resource_id in oldest:
+                    del self.resources[resource_id]
+
+    def save(self):
+        """Evict, then write the cache atomically"""
+        self.evict()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+
+        with self._lock:
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': self.VERSION, 'resources': self.resources}, f, separators=(',', ':'))
+        metrics.inc('bytes_written', os.path.getsize(tmp_path), artifact='metric_cache')
+        os.replace(tmp_path, self.path)
+        return self.path
@@ -0,0 +1,290 @@
+import functools
+import sys
+import threading
+import time
+import tracemalloc
+from config import METRICS_ENABLED, METRICS_TRACE_MEMORY
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+PREFIX = 'costopt_'
+
+
+class _NullTimer:
+    """Shared no-op timer handed out while metrics are disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'labels', 'started')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, **self.labels)
+        if exc_type is not None:
+            self.metrics.inc(f"{self.name}_errors", **self.labels)
+        return False
+
+
+class Run:
+    """One pipeline run (a scan, a scheduled job); report holds its metrics once it exits
+
+    Counters and timings in the report are deltas of the process-wide registry over the
+    run, so runs that overlap in time also see each other's activity.
+    """
+
+    def __init__(self, metrics, kind):
+        self.metrics = metrics
+        self.kind = kind
+        self.report = None
+
+    def __enter__(self):
+        self.before = self.metrics.snapshot()
+        self.started = time.perf_counter()
+        self.owns_tracing = self.metrics.trace_memory and not tracemalloc.is_tracing()
+        if self.owns_tracing:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        peak_traced = None
+        if tracemalloc.is_tracing():
+            peak_traced = tracemalloc.get_traced_memory()[1]
+            if self.owns_tracing:
+                tracemalloc.stop()
+
+        after = self.metrics.snapshot()
+        max_rss = max_rss_bytes()
+        self.report = {
+            'kind': self.kind,
+            'seconds': round(seconds, 4),
+            'max_rss_bytes': max_rss,
+            'peak_traced_bytes': peak_traced,
+            'counters': _delta(self.before['counters'], after['counters']),
+            'timings': {
+                series: {'count': timing['count'] - self.before['timings'].get(series, {}).get('count', 0),
+                         'seconds': round(timing['sum'] - self.before['timings'].get(series, {}).get('sum', 0.0), 4)}
+                for series, timing in after['timings'].items()
+                if timing['count'] != self.before['timings'].get(series, {}).get('count', 0)
+            },
+        }
+
+        self.metrics.observe('run', seconds, kind=self.kind)
+        if exc_type is not None:
+            self.metrics.inc('run_errors', kind=self.kind)
+        self.metrics.set_gauge('last_run_timestamp_seconds', time.time(), kind=self.kind)
+        if peak_traced is not None:
+            self.metrics.set_gauge('last_run_peak_traced_bytes', peak_traced, kind=self.kind)
+        return False
+
+
+class _NullRun:
+    __slots__ = ()
+    report = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_RUN = _NullRun()
+
+
+class Metrics:
+    """Process-wide counters, timers and gauges, rendered in the Prometheus text format
+
+    Series are identified by a name plus keyword labels:
+
+        with metrics.timer('stage', stage='analyze'): ...
+        metrics.inc('bytes_written', 1024, artifact='scan')
+
+    Timers become summaries (<name>_seconds_count/_sum, plus _seconds_max), counters get a
+    _total suffix, and everything is prefixed with costopt_. When disabled, timer() and
+    run() return shared no-op objects and inc/observe/set_gauge return at once.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED, trace_memory=METRICS_TRACE_MEMORY):
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timings = {}
+        self._gauges = {}
+
+    def timer(self, name, **labels):
+        """Context manager timing a block into <name>_seconds (errors also count <name>_errors)"""
+        return _Timer(self, name, labels) if self.enabled else NULL_TIMER
+
+    def timed(self, name, **labels):
+        """Decorator form of timer(); checks enabled on every call"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with _Timer(self, name, labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def run(self, kind):
+        """Context manager for a whole pipeline run; its .report is embedded in output files"""
+        return Run(self, kind) if self.enabled else NULL_RUN
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            timing = self._timings.get(key)
+            if timing is None:
+                self._timings[key] = [1, seconds, seconds]
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+                timing[2] = max(timing[2], seconds)
+
+    def set_gauge(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[name, tuple(sorted(labels.items()))] = value
+
+    def attach(self, client, service, region):
+        """Time every API call of a botocore client into aws_api_call, counting failures in aws_api_errors"""
+        if not self.enabled:
+            return client
+
+        def before_call(context=None, **kwargs):
+            context['metrics_started'] = time.perf_counter()
+
+        def after_call(http_response=None, parsed=None, model=None, context=None, **kwargs):
+            self._api_done(service, region, model.name, context, http_response.status_code < 300,
+                           (parsed or {}).get('Error', {}).get('Code'))
+
+        def after_call_error(event_name=None, exception=None, context=None, **kwargs):
+            self._api_done(service, region, event_name.rsplit('.', 1)[-1], context, False,
+                           type(exception).__name__)
+
+        client.meta.events.register('before-call', before_call)
+        client.meta.events.register('after-call', after_call)
+        client.meta.events.register('after-call-error', after_call_error)
+        return client
+
+    def _api_done(self, service, region, operation, context, ok, error_code):
+        started = (context or {}).get('metrics_started')
+        if started is not None:
+            self.observe('aws_api_call', time.perf_counter() - started, service=service, region=region,
+                         operation=operation)
+        if not ok:
+            self.inc('aws_api_errors', service=service, region=region, operation=operation, code=error_code)
+
+    def snapshot(self):
+        """{'counters': {series: value}, 'timings': {series: {count, sum, max}}, 'gauges': {series: value}}"""
+        with self._lock:
+            return {
+                'counters': {_series(key): value for key, value in self._counters.items()},
+                'timings': {_series(key): {'count': count, 'sum': total, 'max': peak}
+                            for key, (count, total, peak) in self._timings.items()},
+                'gauges': {_series(key): value for key, value in self._gauges.items()},
+            }
+
+    def render(self, extra=()):
+        """Prometheus text exposition; extra is an iterable of (name, type, [(labels, value)])"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            timings = sorted(self._timings.items())
+            gauges = sorted(self._gauges.items())
+
+        families = {}
+        for (name, labels), value in counters:
+            families.setdefault((f"{name}_total", 'counter'), []).append((labels, value))
+        for (name, labels), (count, total, peak) in timings:
+            families.setdefault((f"{name}_seconds", 'summary'), []).append((labels, (count, total)))
+            families.setdefault((f"{name}_seconds_max", 'gauge'), []).append((labels, peak))
+        for (name, labels), value in gauges:
+            families.setdefault((name, 'gauge'), []).append((labels, value))
+        rss = max_rss_bytes()
+        if rss is not None:
+            families[('process_max_rss_bytes', 'gauge')] = [((), rss)]
+        for name, kind, samples in extra:
+            families.setdefault((name, kind), []).extend(
+                (tuple(sorted(labels.items())), value) for labels, value in samples)
+
+        lines = []
+        for (name, kind), samples in sorted(families.items()):
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            for labels, value in samples:
+                if kind == 'summary':
+                    lines.append(f"{PREFIX}{name}_count{_labels(labels)} {value[0]}")
+                    lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {value[1]:.6f}")
+                else:
+                    lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+            self._gauges.clear()
+
+
+def max_rss_bytes():
+    """Peak resident set size of this process, or None where unavailable"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024  # kilobytes elsewhere
+
+
+def _series(key):
+    name, labels = key
+    return f"{name}{_labels(labels)}"
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _delta(before, after):
+    return {series: value - before.get(series, 0) for series, value in after.items()
+            if value != before.get(series, 0)}
+
+
+metrics = Metrics()
@@ -0,0 +1,221 @@
+import csv
+import mmap
+import os
+import struct
+import sys
+import threading
+from config import (EBS_DEFAULT_GB_MONTH_COST, EBS_GB_MONTH_COST, EC2_DEFAULT_HOURLY_COST, EC2_HOURLY_COST,
+                    PRICING_INDEX_FILE)
+
+# Compiled index layout: header, then `count` fixed-width records sorted by key.
+#   header: magic (8 bytes) | key width (uint32) | record count (uint64)
+#   record: key (ASCII, NUL-padded to key width) | price (float64)
+# Keys are 'ec2|<region>|<instance type>|<os>|<tenancy>' (USD per hour) and
+# 'ebs|<region>|<volume api name>' (USD per GB-month). The file is memory-mapped and
+# searched with a binary search, so only the pages touched by a lookup are read.
+MAGIC = b'AWSPRIX1'
+_HEADER = struct.Struct('<8sIQ')
+_PRICE = struct.Struct('<d')
+
+# EC2 PlatformDetails / Placement.Tenancy (as scanned) -> Price List attribute values
+PLATFORM_OS = {
+    'Linux/UNIX': 'Linux',
+    'Windows': 'Windows',
+    'Red Hat Enterprise Linux': 'RHEL',
+    'SUSE Linux': 'SUSE',
+}
+TENANCY = {'default': 'Shared', 'dedicated': 'Dedicated', 'host': 'Host'}
+
+
+def ec2_key(region, instance_type, os_name='Linux', tenancy='Shared'):
+    return f"ec2|{region}|{instance_type}|{os_name}|{tenancy}"
+
+
+def ebs_key(region, volume_type):
+    return f"ebs|{region}|{volume_type}"
+
+
+def iter_offer_prices(path):
+    """Stream (key, price) pairs out of one Price List bulk offer file in CSV format
+
+    The CSV starts with a few metadata rows before the 'SKU' header row. Only
+    on-demand rows are used: compute instances billed per hour without extra
+    licensed software, and EBS storage billed per GB-month.
+    """
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        for header in reader:
+            if header and header[0] == 'SKU':
+                break
+        else:
+            raise ValueError(f"{path} is not a Price List CSV offer file (no SKU header row)")
+
+        column = {name: position for position, name in enumerate(header)}
+        missing = {'TermType', 'Unit', 'PricePerUnit', 'Product Family', 'Region Code'} - set(column)
+        if missing:
+            raise ValueError(f"{path} lacks Price List columns: {', '.join(sorted(missing))}")
+
+        def field(row, name, default=''):
+            position = column.get(name)
+            return row[position] if position is not None and position < len(row) else default
+
+        for row in reader:
+            if field(row, 'TermType') != 'OnDemand':
+                continue
+            try:
+                price = float(field(row, 'PricePerUnit'))
+            except ValueError:
+                continue
+
+            family = field(row, 'Product Family')
+            region = field(row, 'Region Code')
+            unit = field(row, 'Unit')
+
+            if family == 'Compute Instance' and unit == 'Hrs':
+                if field(row, 'CapacityStatus', 'Used') != 'Used' or field(row, 'Pre Installed S/W', 'NA') != 'NA':
+                    continue
+                if field(row, 'License Model', 'No License required') != 'No License required':
+                    continue
+                yield ec2_key(region, field(row, 'Instance Type'), field(row, 'Operating System'),
+                              field(row, 'Tenancy')), price
+            elif family == 'Storage' and unit == 'GB-Mo' and field(row, 'Volume API Name'):
+                yield ebs_key(region, field(row, 'Volume API Name')), price
+
+
+def compile_index(offer_files, out_path=PRICING_INDEX_FILE):
+    """Compile bulk offer files into the memory-mappable index; returns the record count"""
+    prices = {}
+    for path in offer_files:
+        print(f" Reading offer file {path}...")
+        for key, price in iter_offer_prices(path):
+            # Several SKUs can map to one key (e.g. reserved host variants); keep the cheapest
+            if key not in prices or price < prices[key]:
+                prices[key] = price
+
+    encoded = sorted((key.encode('ascii'), price) for key, price in prices.items())
+    key_width = max((len(key) for key, _ in encoded), default=1)
+    record = struct.Struct(f'<{key_width}sd')
+
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, key_width, len(encoded)))
+        for key, price in encoded:
+            f.write(record.pack(key, price))
+    os.replace(tmp_path, out_path)
+
+    print(f" Compiled {len(encoded)} prices into {out_path}")
+    return len(encoded)
+
+
+class PriceIndex:
+    """Read-only, memory-mapped view of a compiled price index"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.key_width, self.count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled price index")
+        self._record_size = self.key_width + _PRICE.size
+
+    def _key_at(self, position):
+        offset = _HEADER.size + position * self._record_size
+        return self._mmap[offset:offset + self.key_width].rstrip(b'\0')
+
+    def get(self, key):
+        """Price for key, or None"""
+        target = key.encode('ascii')
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < self.count and self._key_at(low) == target:
+            return _PRICE.unpack_from(self._mmap, _HEADER.size + low * self._record_size + self.key_width)[0]
+        return None
+
+    def close(self):
+        self._mmap.close()
+
+
+class PricingEngine:
+    """On-demand prices from the compiled index, falling back to the config tables
+
+    Lookups are memoized per key, so repeated types in a fleet cost a dict lookup.
+    Without an index file the engine prices exactly as before: EC2_HOURLY_COST with a
+    flat default, and a flat per-GB EBS rate.
+    """
+
+    def __init__(self, index_path=PRICING_INDEX_FILE):
+        self.index = PriceIndex(index_path) if index_path and os.path.exists(index_path) else None
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        if self.index is None:
+            return None
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+        price = self.index.get(key)
+        with self._lock:
+            self._memo[key] = price
+        return price
+
+    def ec2_hourly(self, region, instance_type, platform=None, tenancy=None):
+        """USD per hour for an on-demand instance (platform/tenancy as scanned from EC2)"""
+        price = self._lookup(ec2_key(region, instance_type,
+                                     PLATFORM_OS.get(platform, 'Linux'), TENANCY.get(tenancy, 'Shared')))
+        if price is None:
+            price = EC2_HOURLY_COST.get(instance_type, EC2_DEFAULT_HOURLY_COST)
+        return price
+
+    def has_ec2_price(self, region, instance_type, platform=None, tenancy=None):
+        """Whether ec2_hourly would use a real price rather than the flat default"""
+        return instance_type in EC2_HOURLY_COST or self._lookup(
+            ec2_key(region, instance_type, PLATFORM_OS.get(platform, 'Linux'), TENANCY.get(tenancy, 'Shared'))
+        ) is not None
+
+    def ebs_gb_month(self, region, volume_type):
+        """USD per GB-month for an EBS volume type"""
+        price = self._lookup(ebs_key(region, volume_type))
+        if price is None:
+            price = EBS_GB_MONTH_COST.get(volume_type, EBS_DEFAULT_GB_MONTH_COST)
+        return price
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_pricing_engine():
+    """Process-wide PricingEngine over PRICING_INDEX_FILE"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = PricingEngine()
+    return _engine
+
+
+if __name__ == '__main__':
+    # python -m src.pricing compile offers/AmazonEC2.csv [more.csv ...]
+    # python -m src.pricing ec2 us-east-1 t3.medium [Linux/UNIX] [default]
+    # python -m src.pricing ebs us-east-1 gp3
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else (None, [])
+    if command == 'compile' and args:
+        compile_index(args)
+    elif command == 'ec2' and len(args) >= 2:
+        print(f" ${get_pricing_engine().ec2_hourly(*args[:4])}/hr")
+    elif command == 'ebs' and len(args) == 2:
+        print(f" ${get_pricing_engine().ebs_gb_month(*args)}/GB-month")
+    else:
+        print("Usage: python -m src.pricing compile <offer.csv>... | ec2 <region> <type> [platform] [tenancy]"
+              " | ebs <region> <volume type>")
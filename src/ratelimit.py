@@ -0,0 +1,209 @@
+import random
+import threading
+import time
+from config import (AWS_RATE_LIMIT_ENABLED, AWS_API_RATE, AWS_API_BURST, AWS_API_MIN_RATE, AWS_API_MAX_RATE,
+                    AWS_MAX_ATTEMPTS, AWS_RETRY_BUDGET, AWS_BACKOFF_BASE, AWS_BACKOFF_CAP)
+
+# Error codes AWS services use for request-rate throttling
+THROTTLE_CODES = frozenset({
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottledException',
+    'TooManyRequestsException', 'RequestLimitExceeded', 'RequestThrottled', 'BandwidthLimitExceeded',
+    'EC2ThrottledException', 'SlowDown', 'LimitExceededException', 'PriorRequestNotComplete',
+})
+# Errors worth retrying that are not throttling
+TRANSIENT_CODES = frozenset({
+    'RequestTimeout', 'RequestTimeoutException', 'InternalError', 'InternalFailure', 'ServiceUnavailable',
+})
+TRANSIENT_STATUS = frozenset({500, 502, 503, 504})
+
+COUNTER_FIELDS = ('attempts', 'throttled', 'retries', 'failed', 'budget_exhausted')
+
+
+class TokenBucket:
+    """Token bucket whose fill rate adapts to throttling (additive increase, multiplicative decrease)
+
+    acquire() reserves a token and returns how long the caller must wait for it; the
+    balance may go negative, so concurrent callers queue up fairly behind each other.
+    """
+
+    def __init__(self, rate, burst, min_rate, max_rate, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Reserve one token; returns seconds to wait before using it"""
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + 1.0 / max(self.rate, 1.0))
+
+    def on_throttle(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+
+class RateLimiter:
+    """Shared AWS request pacing and retry policy, per (service, region, API)
+
+    Attached to every pooled client (src/clients.py) through botocore events, so the
+    scanner, executor and snapshot pipeline all draw from the same buckets:
+
+    - before-send: each attempt takes a token from its (service, region, operation) bucket
+    - needs-retry: successes raise the bucket's rate, throttling halves it; throttled and
+      transient failures are retried with full-jitter exponential backoff while attempts
+      remain and the (service, region) retry budget has tokens. Budget tokens are spent
+      on retries and slowly earned back by successes, so a struggling endpoint cannot
+      turn every call into max_attempts calls.
+
+    When retries run out the botocore error propagates to the caller as usual.
+    """
+
+    def __init__(self, enabled=AWS_RATE_LIMIT_ENABLED, rate=AWS_API_RATE, burst=AWS_API_BURST,
+                 min_rate=AWS_API_MIN_RATE, max_rate=AWS_API_MAX_RATE, max_attempts=AWS_MAX_ATTEMPTS,
+                 retry_budget=AWS_RETRY_BUDGET, backoff_base=AWS_BACKOFF_BASE, backoff_cap=AWS_BACKOFF_CAP,
+                 sleep=time.sleep, rng=random.random):
+        self.enabled = enabled
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_attempts = max_attempts
+        self.retry_budget = retry_budget
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.sleep = sleep
+        self.rng = rng
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._budgets = {}
+        self._counters = {}
+
+    def bucket(self, service, region, operation):
+        key = (service, region, operation)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, self.min_rate, self.max_rate)
+                    self._counters[key] = dict.fromkeys(COUNTER_FIELDS, 0)
+                    self._counters[key]['wait_seconds'] = 0.0
+        return bucket
+
+    def _count(self, key, field, amount=1):
+        with self._lock:
+            self._counters[key][field] += amount
+
+    def acquire(self, service, region, operation):
+        """Wait for a token before one attempt of an API call"""
+        wait = self.bucket(service, region, operation).acquire()
+        self._count((service, region, operation), 'attempts')
+        if wait > 0:
+            self._count((service, region, operation), 'wait_seconds', wait)
+            self.sleep(wait)
+
+    def retry_delay(self, service, region, operation, attempts, throttled=False, retryable=False):
+        """Record the outcome of attempt number `attempts`; returns backoff seconds, or None for no retry"""
+        key = (service, region, operation)
+        bucket = self.bucket(service, region, operation)
+        budget_key = (service, region)
+
+        if not (throttled or retryable):
+            bucket.on_success()
+            with self._lock:
+                self._budgets[budget_key] = min(self.retry_budget,
+                                                self._budgets.get(budget_key, self.retry_budget) + 0.1)
+            return None
+
+        if throttled:
+            bucket.on_throttle()
+            self._count(key, 'throttled')
+
+        if attempts >= self.max_attempts:
+            self._count(key, 'failed')
+            return None
+
+        with self._lock:
+            tokens = self._budgets.get(budget_key, self.retry_budget)
+            if tokens < 1:
+                self._counters[key]['budget_exhausted'] += 1
+                self._counters[key]['failed'] += 1
+                return None
+            self._budgets[budget_key] = tokens - 1
+            self._counters[key]['retries'] += 1
+
+        return self.rng() * min(self.backoff_cap, self.backoff_base * 2 ** attempts)
+
+    def attach(self, client, service, region):
+        """Register this limiter on a botocore client's before-send and needs-retry events"""
+        if not self.enabled:
+            return client
+
+        def before_send(event_name=None, **kwargs):
+            self.acquire(service, region, event_name.rsplit('.', 1)[-1])
+
+        def needs_retry(event_name=None, response=None, attempts=1, caught_exception=None, **kwargs):
+            operation = event_name.rsplit('.', 1)[-1]
+            throttled, retryable = classify(response, caught_exception)
+            return self.retry_delay(service, region, operation, attempts, throttled, retryable)
+
+        client.meta.events.register('before-send', before_send)
+        client.meta.events.register('needs-retry', needs_retry)
+        return client
+
+    def counters(self):
+        """{'service/region/Operation': {attempts, throttled, retries, failed, budget_exhausted, wait_seconds, rate}}"""
+        with self._lock:
+            return {
+                '/'.join(key): dict(counters, wait_seconds=round(counters['wait_seconds'], 3),
+                                    rate=round(self._buckets[key].rate, 2))
+                for key, counters in sorted(self._counters.items())
+            }
+
+    def totals(self):
+        """Counters summed over every bucket"""
+        totals = dict.fromkeys(COUNTER_FIELDS, 0)
+        totals['wait_seconds'] = 0.0
+        for counters in self.counters().values():
+            for field in totals:
+                totals[field] += counters[field]
+        totals['wait_seconds'] = round(totals['wait_seconds'], 3)
+        return totals
+
+    def reset(self):
+        """Forget all buckets, budgets and counters"""
+        with self._lock:
+            self._buckets.clear()
+            self._budgets.clear()
+            self._counters.clear()
+
+
+def classify(response, caught_exception):
+    """(throttled, retryable) for one botocore attempt outcome"""
+    if caught_exception is not None:
+        # Connection errors and read timeouts never reached a service decision
+        return False, True
+    if not response:
+        return False, False
+
+    http_response, parsed = response
+    code = (parsed or {}).get('Error', {}).get('Code')
+    if code in THROTTLE_CODES or http_response.status_code == 429:
+        return True, True
+    return False, code in TRANSIENT_CODES or http_response.status_code in TRANSIENT_STATUS
+
+
+rate_limiter = RateLimiter()
@@ -1,87 +1,204 @@
-import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
 import json
+import os
+import pickle
+from src.analyzer import smaller_instance_types
+from src.columnar import ColumnTable
+from src.lazy import lazy_import
+from src.metrics import metrics
+from src.pricing import get_pricing_engine
+from config import ML_MODEL_FILE, ML_N_CLUSTERS, ML_PARTIAL_FIT_SAMPLES
+
+# Imported on first use: the dashboard and CLI entry points load this module without training
+np = lazy_import('numpy')
+sklearn = lazy_import('sklearn')
+
+# Bump when features or model type change; older artifacts are then retrained from scratch
+MODEL_VERSION = 1
 
 
 class MLRecommender:
-    """ML-powered recommendation engine using sklearn"""
+    """ML-powered recommendation engine using sklearn
+
+    The clustering model is persisted to ML_MODEL_FILE and updated incrementally: each
+    run makes one MiniBatchKMeans.partial_fit over at most ML_PARTIAL_FIT_SAMPLES
+    instances, so cluster centers (and cluster ids) drift slowly from day to day instead
+    of being refit from scratch. The feature scaler is fitted on the first run and then
+    frozen, keeping the stored centers in a consistent feature space.
+    """
+
+    def __init__(self, model_path=ML_MODEL_FILE, n_clusters=ML_N_CLUSTERS,
+                 partial_fit_samples=ML_PARTIAL_FIT_SAMPLES):
+        self.model_path = model_path
+        self.n_clusters = n_clusters
+        self.partial_fit_samples = partial_fit_samples
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.preprocessing import StandardScaler
 
-    def __init__(self):
         self.scaler = StandardScaler()
-        self.model = KMeans(n_clusters=3, random_state=42)
+        self.model = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init=3)
+        self.runs = 0
+        self.samples_seen = 0
+        self.load_model()
+
+    @property
+    def trained(self):
+        return self.runs > 0
+
+    def load_model(self):
+        """Load the persisted model if it matches MODEL_VERSION and settings"""
+        if not self.model_path or not os.path.exists(self.model_path):
+            return False
+
+        try:
+            with open(self.model_path, 'rb') as f:
+                artifact = pickle.load(f)
+        except Exception as e:
+            print(f"️  Ignoring unreadable ML model {self.model_path}: {e}")
+            return False
+
+        if artifact.get('version') != MODEL_VERSION or artifact.get('n_clusters') != self.n_clusters or \
+                artifact.get('sklearn_version') != sklearn.__version__:
+            print("️  Persisted ML model is outdated, training a new one")
+            return False
+
+        self.scaler = artifact['scaler']
+        self.model = artifact['model']
+        self.runs = artifact['runs']
+        self.samples_seen = artifact['samples_seen']
+        return True
+
+    def save_model(self):
+        """Write the model artifact atomically"""
+        os.makedirs(os.path.dirname(self.model_path) or '.', exist_ok=True)
+        tmp_path = f"{self.model_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({
+                'version': MODEL_VERSION,
+                'sklearn_version': sklearn.__version__,
+                'n_clusters': self.n_clusters,
+                'runs': self.runs,
+                'samples_seen': self.samples_seen,
+                'scaler': self.scaler,
+                'model': self.model
+            }, f)
+        os.replace(tmp_path, self.model_path)
+
+    def extract_features(self, scan_data, now=None):
+        """Features of running EC2 instances, straight from column arrays
+
+        Returns (features [n x 2]: CPU avg, days running; rows: list of (region, table, row index)).
+        """
+        now = np.datetime64((now or datetime.now()).replace(microsecond=0), 's')
+        feature_blocks = []
+        rows = []
 
+        for region, data in scan_data['regions'].items():
+            table = ColumnTable.of(data['ec2_instances'])
+            if not len(table):
+                continue
+
+            running = np.flatnonzero(table.equals('state', 'running'))
+            if not running.size:
+                continue
+
+            cpu = table.array('cpu_avg_7d')[running]
+            # ISO timestamps: the first 19 characters are the UTC wall-clock time
+            launch_times = table.values('launch_time')
+            launched = np.array([launch_times[i][:19] if launch_times[i] else 'NaT' for i in running.tolist()],
+                                dtype='datetime64[s]')
+            launched[np.isnat(launched)] = now
+            days_running = ((now - launched) // np.timedelta64(1, 'D')).astype(float)
+
+            feature_blocks.append(np.column_stack([cpu, days_running]))
+            rows.extend((region, table, index) for index in running.tolist())
+
+        features = np.vstack(feature_blocks) if feature_blocks else np.empty((0, 2))
+        return features, rows
+
+    def update_model(self, features):
+        """One incremental training step on (a sample of) this run's features"""
+        if len(features) > self.partial_fit_samples:
+            rng = np.random.default_rng(self.runs)
+            features = features[rng.choice(len(features), self.partial_fit_samples, replace=False)]
+
+        if not self.trained:
+            self.scaler.fit(features)
+        self.model.partial_fit(self.scaler.transform(features))
+        self.runs += 1
+        self.samples_seen += len(features)
+
+    @metrics.timed('stage', stage='ml_recommend')
     def generate_ml_recommendations(self, scan_data):
         """Generate ML-based recommendations from usage patterns"""
         print(" Running ML analysis...")
 
-        # Extract features from EC2 instances
-        features = []
-        instances = []
+        features, rows = self.extract_features(scan_data)
 
-        for region, data in scan_data['regions'].items():
-            for instance in data['ec2_instances']:
-                if instance['state'] == 'running':
-                    # Features: CPU avg, days running
-                    launch_time = datetime.fromisoformat(instance['launch_time']) if instance[
-                        'launch_time'] else datetime.now()
-                    days_running = (datetime.now() - launch_time.replace(tzinfo=None)).days
-
-                    features.append([
-                        instance['cpu_avg_7d'],
-                        days_running
-                    ])
-                    instances.append({
-                        'region': region,
-                        'instance_id': instance['instance_id'],
-                        'type': instance['type'],
-                        'cpu': instance['cpu_avg_7d'],
-                        'days': days_running
-                    })
-
-        if len(features) < 3:
+        if len(features) < self.n_clusters and not self.trained:
             print("️  Not enough data for ML clustering")
             return []
+        if not len(features):
+            return []
 
-        # Normalize features
-        features_scaled = self.scaler.fit_transform(features)
+        if len(features) >= self.n_clusters:
+            self.update_model(features)
+            if self.model_path:
+                self.save_model()
 
-        # Cluster instances
-        clusters = self.model.fit_predict(features_scaled)
+        # Assign every instance in one vectorized call
+        clusters = self.model.predict(self.scaler.transform(features))
+        cpu = features[:, 0]
+        counts = np.bincount(clusters, minlength=self.n_clusters)
+        cpu_sums = np.bincount(clusters, weights=cpu, minlength=self.n_clusters)
+        avg_cpu = np.divide(cpu_sums, counts, out=np.zeros(self.n_clusters), where=counts > 0)
 
         # Analyze clusters
         recommendations = []
-        for cluster_id in range(3):
-            cluster_instances = [instances[i] for i in range(len(instances)) if clusters[i] == cluster_id]
-
-            if cluster_instances:
-                avg_cpu = np.mean([inst['cpu'] for inst in cluster_instances])
-
-                if avg_cpu < 10:
-                    for inst in cluster_instances:
-                        recommendations.append({
-                            'type': 'ML_UNDERUTILIZED',
-                            'severity': 'MEDIUM',
-                            'region': inst['region'],
-                            'resource_id': inst['instance_id'],
-                            'cluster': f"Cluster {cluster_id}",
-                            'recommendation': f"Instance in low-utilization cluster (avg {avg_cpu:.1f}% CPU)",
-                            'action': 'CONSIDER_DOWNSIZING'
-                        })
-
-        print(f" ML generated {len(recommendations)} recommendations")
+        targets = {}
+        for cluster_id in range(self.n_clusters):
+            if not counts[cluster_id] or avg_cpu[cluster_id] >= 10:
+                continue
+
+            for position in np.flatnonzero(clusters == cluster_id).tolist():
+                region, table, index = rows[position]
+                instance = table.record(index)
+                rec = {
+                    'type': 'ML_UNDERUTILIZED',
+                    'severity': 'MEDIUM',
+                    'region': region,
+                    'account_id': instance.get('account_id'),
+                    'resource_id': instance['instance_id'],
+                    'cluster': f"Cluster {cluster_id}",
+                    'recommendation': f"Instance in low-utilization cluster (avg {avg_cpu[cluster_id]:.1f}% CPU)",
+                    'action': 'CONSIDER_DOWNSIZING'
+                }
+
+                key = (region, instance['type'])
+                if key not in targets:
+                    targets[key] = self.downsize_target(region, instance['type'])
+                if targets[key]:
+                    rec['target_type'] = targets[key]
+                    rec['recommendation'] += f"; downsize from {instance['type']} → {targets[key]}"
+                recommendations.append(rec)
+
+        print(f" ML generated {len(recommendations)} recommendations (model run {self.runs})")
         return recommendations
 
+    def downsize_target(self, region, instance_type):
+        """Closest smaller size of the same family with a known price, or None"""
+        pricing = get_pricing_engine()
+        for target_type, _ in smaller_instance_types(instance_type):
+            if pricing.has_ec2_price(region, target_type):
+                return target_type
+        return None
+
 
 from datetime import datetime
 
 if __name__ == '__main__':
-    import glob
-
-    latest_scan = max(glob.glob('data/scans/*.json'), key=lambda x: x)
+    from src.storage import latest_scan_file, load_scan
 
-    with open(latest_scan, 'r') as f:
-        scan_data = json.load(f)
+    scan_data = load_scan(latest_scan_file())
 
     recommender = MLRecommender()
     ml_recs = recommender.generate_ml_recommendations(scan_data)
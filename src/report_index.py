@@ -0,0 +1,158 @@
+import base64
+import bisect
+import itertools
+import json
+import threading
+from collections import OrderedDict
+
+FILTER_FIELDS = ('type', 'region', 'account_id', 'severity', 'action')
+SORT_FIELDS = ('monthly_savings',)
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+# Multi-filter match lists kept per index, so paging through one query intersects once
+MATCH_CACHE_SIZE = 32
+
+
+class InvalidQuery(ValueError):
+    """Bad filter, sort, cursor or limit in a recommendations query"""
+
+
+class RecommendationIndex:
+    """Query index over one report's recommendations, built once and shared by every request
+
+    Holds the positions sorted by each sort order and, per order, a posting list for
+    each value of each filterable field: the ranks (indexes into that order) of the
+    matching recommendations, ascending. A single-value filter pages by bisecting its
+    list at the cursor rank; other filters merge (OR within a field) and intersect
+    (AND across fields) the sorted lists, so no request walks or rescans the report.
+    The last MATCH_CACHE_SIZE merged lists are kept for the following pages.
+    """
+
+    def __init__(self, report, report_id):
+        self.report_id = report_id
+        self.recommendations = report.get('recommendations', [])
+        self.meta = {key: value for key, value in report.items() if key not in ('recommendations', 'actions_taken')}
+
+        natural = list(range(len(self.recommendations)))
+        self.orders = {None: natural}
+        for field in SORT_FIELDS:
+            ascending = sorted(natural, key=lambda position: self.recommendations[position].get(field) or 0)
+            self.orders[field] = ascending
+            self.orders[f'-{field}'] = ascending[::-1]
+
+        self.postings = {}
+        for sort, order in self.orders.items():
+            postings = self.postings[sort] = {field: {} for field in FILTER_FIELDS}
+            for rank, position in enumerate(order):
+                rec = self.recommendations[position]
+                for field in FILTER_FIELDS:
+                    postings[field].setdefault(rec.get(field), []).append(rank)
+
+        self._matches = OrderedDict()
+        self._matches_lock = threading.Lock()
+
+    def facets(self):
+        """{field: {value: count}} for building filter controls"""
+        return {
+            field: {value: len(ranks) for value, ranks in values.items() if value is not None}
+            for field, values in self.postings[None].items()
+        }
+
+    def matching(self, filters, sort=None):
+        """Ascending ranks in the sort order matching every filter (values within one field are
+        OR-ed), or None for all"""
+        postings = self.postings[sort]
+        for field in filters:
+            if field not in postings:
+                raise InvalidQuery(f"Cannot filter on '{field}'")
+        if not filters:
+            return None
+        if len(filters) == 1:
+            (field, values), = filters.items()
+            if len(values) == 1:
+                return postings[field].get(values[0], [])
+
+        key = (sort, tuple(sorted((field, tuple(sorted(set(values), key=str))) for field, values in filters.items())))
+        with self._matches_lock:
+            if key in self._matches:
+                self._matches.move_to_end(key)
+                return self._matches[key]
+
+        lists = []
+        for field, values in filters.items():
+            ranks = [postings[field].get(value, []) for value in dict.fromkeys(values)]
+            # The runs are disjoint and each sorted, which sorted() merges in linear time
+            lists.append(ranks[0] if len(ranks) == 1 else sorted(itertools.chain(*ranks)))
+        lists.sort(key=len)
+        matched = lists[0]
+        for ranks in lists[1:]:
+            matched = intersect(matched, ranks)
+
+        with self._matches_lock:
+            self._matches[key] = matched
+            while len(self._matches) > MATCH_CACHE_SIZE:
+                self._matches.popitem(last=False)
+        return matched
+
+    def query(self, filters=None, sort=None, cursor=None, limit=DEFAULT_LIMIT, fields=None):
+        """One page of recommendations: {'items', 'next_cursor', 'total', 'report'}"""
+        if sort not in self.orders:
+            raise InvalidQuery(f"Cannot sort by '{sort}'")
+        if not 1 <= limit <= MAX_LIMIT:
+            raise InvalidQuery(f"limit must be between 1 and {MAX_LIMIT}")
+
+        matched = self.matching(filters or {}, sort)
+        order = self.orders[sort]
+        start = self.decode_cursor(cursor, sort) if cursor else 0
+
+        # The page plus one more rank, which becomes the next cursor
+        if matched is None:
+            ranks = range(start, min(start + limit + 1, len(order)))
+        else:
+            first = bisect.bisect_left(matched, start)
+            ranks = matched[first:first + limit + 1]
+
+        return {
+            'items': [self.project(self.recommendations[order[rank]], fields) for rank in ranks[:limit]],
+            'next_cursor': self.encode_cursor(ranks[limit], sort) if len(ranks) > limit else None,
+            'total': len(order) if matched is None else len(matched),
+            'report': self.meta
+        }
+
+    @staticmethod
+    def project(rec, fields):
+        if fields is None:
+            return {key: value for key, value in rec.items() if key != 'details'}
+        if '*' in fields:
+            return rec
+        return {key: rec[key] for key in fields if key in rec}
+
+    def encode_cursor(self, rank, sort):
+        raw = json.dumps([self.report_id, sort, rank], separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    def decode_cursor(self, cursor, sort):
+        try:
+            report_id, cursor_sort, rank = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except (ValueError, TypeError) as e:
+            raise InvalidQuery(f"Malformed cursor: {e}")
+        if report_id != self.report_id:
+            raise InvalidQuery("Cursor belongs to an older report, restart from the first page")
+        if cursor_sort != sort:
+            raise InvalidQuery("Cursor was issued for a different sort order")
+        if type(rank) is not int or rank < 0:
+            raise InvalidQuery("Malformed cursor: bad position")
+        return rank
+
+
+def intersect(shorter, longer):
+    """Sorted values present in both sorted lists, bisecting the longer one"""
+    common = []
+    low = 0
+    for value in shorter:
+        low = bisect.bisect_left(longer, value, low)
+        if low == len(longer):
+            break
+        if longer[low] == value:
+            common.append(value)
+    return common
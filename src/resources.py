@@ -0,0 +1,360 @@
+import itertools
+import sys
+from array import array
+from operator import itemgetter
+from collections.abc import MutableMapping, Sequence
+from config import UTILIZATION_FIELDS
+
+_MISSING = object()
+NAN = float('nan')
+# Records converted to columns at once when ResourceColumns consumes an iterator
+EXTEND_CHUNK = 1000
+_NUMBER_TYPES = (int, float, bool)
+
+
+class Resource(MutableMapping):
+    """Compact record for one scanned resource, usable wherever the resource dict was
+
+    Subclasses list the fields of their resource type (in the order the scanner writes
+    them) as __slots__, so a record costs one pointer per field instead of a hash table
+    with its own copy of every key. Low-cardinality strings (types, states, tag keys) are
+    interned and shared by all records, and tags are kept as a tuple of (key, value)
+    pairs; record['tags'] builds the dict on access, so changes to it are not kept.
+    Fields outside the schema go to a per-record dict, so nothing is dropped: to_dict()
+    gives back exactly the dict the record was built from (same keys, same order when
+    they follow the schema) and records compare equal to that dict.
+    """
+
+    __slots__ = ('_extra',)
+    FIELDS = ()
+    INTERNED = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_set = frozenset(cls.FIELDS)
+
+    def __init__(self, *args, **fields):
+        self._extra = None
+        self.update(*args, **fields)
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            try:
+                value = getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+            return dict(value) if key == 'tags' and type(value) is tuple else value
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._field_set:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+            return
+        if key == 'tags' and type(value) is dict:
+            value = tuple((sys.intern(k) if type(k) is str else k, sys.intern(v) if type(v) is str else v)
+                          for k, v in value.items())
+        elif key in self.INTERNED and type(value) is str:
+            value = sys.intern(value)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        if key in self._field_set:
+            try:
+                delattr(self, key)
+                return
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None or key not in self._extra:
+            raise KeyError(key)
+        del self._extra[key]
+
+    def __iter__(self):
+        for field in self.FIELDS:
+            if hasattr(self, field):
+                yield field
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for field in self.FIELDS if hasattr(self, field)) + len(self._extra or ())
+
+    def __contains__(self, key):
+        if key in self._field_set:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __reduce__(self):
+        return type(self), (self.to_dict(),)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def to_dict(self):
+        """The plain resource dict, as stored in scan and report files"""
+        return {key: self[key] for key in self}
+
+
+class EC2Instance(Resource):
+    __slots__ = FIELDS = ('instance_id', 'type', 'state', 'launch_time', 'cpu_avg_7d', 'tags', 'platform',
+                          'tenancy', 'image_id') + UTILIZATION_FIELDS + ('account_id',)
+    INTERNED = frozenset(['type', 'state', 'launch_time', 'platform', 'tenancy', 'image_id', 'account_id'])
+
+
+class EBSVolume(Resource):
+    __slots__ = FIELDS = ('volume_id', 'size_gb', 'state', 'attached', 'create_time', 'volume_type', 'account_id')
+    INTERNED = frozenset(['state', 'create_time', 'volume_type', 'account_id'])
+
+
+class RDSInstance(Resource):
+    __slots__ = FIELDS = ('db_identifier', 'db_class', 'engine', 'status', 'allocated_storage', 'multi_az',
+                          'account_id')
+    INTERNED = frozenset(['db_class', 'engine', 'status', 'account_id'])
+
+
+RESOURCE_CLASSES = {'ec2_instances': EC2Instance, 'ebs_volumes': EBSVolume, 'rds_instances': RDSInstance}
+
+
+def compact_records(resource_type, records):
+    """Records of one scan resource list as Resource objects (unknown types are left as they are)"""
+    cls = RESOURCE_CLASSES.get(resource_type)
+    if cls is None:
+        return records
+    return [record if isinstance(record, cls) else cls(record) for record in records]
+
+
+def compact_scan(scan):
+    """Convert every resource list of a scan dict to Resource objects, in place; returns the scan"""
+    for region_data in scan.get('regions', {}).values():
+        for resource_type, records in region_data.items():
+            if isinstance(records, list):
+                region_data[resource_type] = compact_records(resource_type, records)
+    return scan
+
+
+class ResourceColumns(Sequence):
+    """Resources of one type stored column by column, as the scanner streams them in
+
+    Each field is a list of values, in the resource class's FIELDS order and then other
+    keys in first-seen order, with None (and an entry in absent) where a record lacks
+    the field; no per-record object is kept. As records are appended, the class's
+    INTERNED fields are also dictionary-encoded into int32 codes and each numeric field
+    is kept as a float64 buffer (None is NaN), so ColumnTable hands them to NumPy
+    without another pass over the records. Tags are held as tuples of (key, value) pairs.
+
+    Indexing and iteration give plain dicts equal to the appended records, so code that
+    reads a resource list works unchanged; segment() is the storage segment layout.
+
+    All rows stay in memory until the object is dropped, so a region's footprint is still
+    proportional to its resource count; what streaming into columns saves is the
+    per-record dict and its keys.
+    """
+
+    def __init__(self, resource_type, records=()):
+        cls = RESOURCE_CLASSES[resource_type]
+        self.resource_type = resource_type
+        self._order = {field: position for position, field in enumerate(cls.FIELDS)}
+        self._interned = cls.INTERNED
+        self._count = 0
+        self._columns = {}
+        self._absent = {}
+        self._codes = {}
+        self._categories = {}
+        self._numbers = {}
+        self.extend(records)
+
+    def append(self, record):
+        self.extend([record])
+
+    def extend(self, records):
+        """Append records (dicts or other mappings), one column at a time; an iterator is
+        consumed EXTEND_CHUNK records at a time, so its records need not all exist at once"""
+        if not isinstance(records, list):
+            records = iter(records)
+            chunk = list(itertools.islice(records, EXTEND_CHUNK))
+            while chunk:
+                self.extend(chunk)
+                chunk = list(itertools.islice(records, EXTEND_CHUNK))
+            return
+        if not records:
+            return
+        start = self._count
+        new_fields = [field for field in dict.fromkeys(itertools.chain.from_iterable(records))
+                      if field not in self._columns]
+        if new_fields:
+            self._add_columns(new_fields)
+
+        for field, column in self._columns.items():
+            try:
+                values = list(map(itemgetter(field), records))
+            except KeyError:
+                values = [record.get(field, _MISSING) for record in records]
+                missing = [index for index, value in enumerate(values) if value is _MISSING]
+                self._absent.setdefault(field, set()).update(start + index for index in missing)
+                for index in missing:
+                    values[index] = None
+
+            if field in self._codes:
+                categories = self._categories[field]
+                for value in dict.fromkeys(values):
+                    if value not in categories:
+                        categories[sys.intern(value) if type(value) is str else value] = len(categories)
+                codes = list(map(categories.__getitem__, values))
+                self._codes[field].extend(codes)
+                shared = list(categories)
+                values = list(map(shared.__getitem__, codes))
+            elif field == 'tags':
+                values = [tuple(value.items()) if type(value) is dict else value for value in values]
+            elif field in self._numbers:
+                try:
+                    self._numbers[field].extend([NAN if value is None else value for value in values]
+                                                if None in values else values)
+                except TypeError:
+                    del self._numbers[field]
+            column.extend(values)
+        self._count += len(records)
+
+    def _add_columns(self, fields):
+        """Columns for fields first seen now (records so far lack them), schema fields in FIELDS order"""
+        start = self._count
+        for field in fields:
+            self._columns[field] = [None] * start
+            if start:
+                self._absent[field] = set(range(start))
+            if field in self._interned:
+                self._codes[field] = array('i')
+                self._categories[field] = {}
+                if start:
+                    self._categories[field][None] = 0
+                    self._codes[field] = array('i', [0]) * start
+            elif field != 'tags':
+                self._numbers[field] = array('d', [NAN]) * start
+        last = len(self._order)
+        self._columns = dict(sorted(self._columns.items(), key=lambda item: self._order.get(item[0], last)))
+
+    def fill(self, field, value):
+        """Set field to value on every record (e.g. the account a region's resources belong to)"""
+        if field not in self._columns:
+            self._add_columns([field])
+        count = self._count
+        self._absent.pop(field, None)
+        if field in self._codes:
+            if type(value) is str:
+                value = sys.intern(value)
+            self._categories[field] = {value: 0}
+            self._codes[field] = array('i', [0]) * count
+        elif field != 'tags' and (value is None or type(value) in _NUMBER_TYPES):
+            self._numbers[field] = array('d', [NAN if value is None else value]) * count
+        else:
+            self._numbers.pop(field, None)
+        self._columns[field] = [value] * count
+
+    def column(self, field):
+        """Values of one field, None where a record lacks it (None for an unknown field)"""
+        column = self._columns.get(field)
+        if field == 'tags' and column is not None:
+            return [dict(value) if type(value) is tuple else value for value in column]
+        return column
+
+    def codes(self, field):
+        """(int32 codes, distinct values by code) of an INTERNED field, else None"""
+        codes = self._codes.get(field)
+        return None if codes is None else (codes, list(self._categories[field]))
+
+    def numbers(self, field):
+        """float64 buffer of a field whose values are all numbers or None, else None"""
+        return self._numbers.get(field)
+
+    def row(self, index):
+        """Record at index, as a new dict"""
+        record = {}
+        for field, column in self._columns.items():
+            absent = self._absent.get(field)
+            if absent is not None and index in absent:
+                continue
+            value = column[index]
+            record[field] = dict(value) if field == 'tags' and type(value) is tuple else value
+        return record
+
+    def rows(self, indexes):
+        """Records at a list of indexes, as new dicts; one pass per column instead of one per record"""
+        if len(indexes) < 2:
+            return [self.row(index) for index in indexes]
+        pick = itemgetter(*indexes)
+        fields = list(self._columns)
+        picked = [pick(self._columns[field]) for field in fields]
+        if 'tags' in self._columns:
+            position = fields.index('tags')
+            picked[position] = [dict(value) if type(value) is tuple else value for value in picked[position]]
+        records = list(map(dict, map(zip, itertools.repeat(fields), zip(*picked))))
+        for field, absent in self._absent.items():
+            for position, index in enumerate(indexes):
+                if index in absent:
+                    del records[position][field]
+        return records
+
+    def segment(self):
+        """Columnar segment as src/storage.py writes it; columns no record has are left out"""
+        columns = {}
+        absent = {}
+        for field in self._columns:
+            rows = self._absent.get(field, ())
+            if self._count and len(rows) == self._count:
+                continue
+            columns[field] = self.column(field)
+            if rows:
+                absent[field] = sorted(rows)
+        return {'count': self._count, 'columns': columns, 'absent': absent}
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(i) for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('resource index out of range')
+        return self.row(index)
+
+    def __iter__(self):
+        fields = list(self._columns)
+        partial = set().union(*self._absent.values())
+        for index, values in enumerate(zip(*(self.column(field) for field in fields))):
+            yield self.row(index) if index in partial else dict(zip(fields, values))
+
+    def __eq__(self, other):
+        if not isinstance(other, (ResourceColumns, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return type(self), (self.resource_type, list(self))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.resource_type!r}, {len(self)} records)"
+
+
+def add_resources(region_data, resource_type, resources):
+    """Merge one scan's resources of a type into region_data, keeping a ResourceColumns a ResourceColumns"""
+    merged = region_data.get(resource_type)
+    if merged is None:
+        region_data[resource_type] = resources
+    else:
+        merged.extend(resources)
+    return region_data[resource_type]
+
+
+def to_json(obj):
+    """json.dump(default=...) hook writing Resource objects as their dicts and ResourceColumns as lists"""
+    if isinstance(obj, Resource):
+        return obj.to_dict()
+    if isinstance(obj, ResourceColumns):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
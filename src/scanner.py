@@ -1,157 +1,593 @@
-import boto3
 import json
-from datetime import datetime, timedelta
-from config import AWS_REGIONS, SCAN_DATA_DIR, get_timestamp
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from src.accounts import account_registry
+from src.archive import get_archive
+from src.artifacts import notify_written
+from src.clients import get_client
+from src.history import get_history_store
+from src.metric_cache import MetricCache
+from src.metrics import metrics
+from src.ratelimit import rate_limiter
+from src.columnar import ColumnTable
+from src.resources import ResourceColumns, add_resources, to_json
+from src.sketch import QuantileSketch
+from src.storage import COMPACT_EXTENSION, latest_scan_file, load_scan, write_scan
+from config import (AWS_REGIONS, CLOUDWATCH_MAX_QUERIES, CWAGENT_DIMENSIONS, HISTORY_ENABLED, SCAN_DATA_DIR, SCAN_INCREMENTAL,
+                    SCAN_PARALLEL, SCAN_REGION_CONCURRENCY, SCAN_SERVICE_CONCURRENCY, SCAN_STORAGE_FORMAT,
+                    SKETCH_MAX_BINS, SKETCH_RELATIVE_ACCURACY, UTILIZATION_DAYS, UTILIZATION_PERIOD,
+                    UTILIZATION_FIELDS, UTILIZATION_METRICS, UTILIZATION_QUANTILES, UTILIZATION_REFRESH_DAYS,
+                    UTILIZATION_SKETCHES, get_timestamp)
+
+# Instance dict field -> (namespace, metric name, statistic), averaged over the daily datapoints
+EC2_METRICS = {
+    'cpu_avg_7d': ('AWS/EC2', 'CPUUtilization', 'Average'),
+}
+
+# CloudWatch instance dimension -> instance record field
+DIMENSION_FIELDS = {'InstanceId': 'instance_id', 'ImageId': 'image_id', 'InstanceType': 'type'}
+
+
+def metric_dimensions(namespace, instance):
+    """Dimensions of an instance's series: InstanceId for AWS/EC2, CWAGENT_DIMENSIONS for the agent's metrics"""
+    names = CWAGENT_DIMENSIONS if namespace == 'CWAgent' else ('InstanceId',)
+    return [{'Name': name, 'Value': instance.get(DIMENSION_FIELDS[name])} for name in names]
+
+
+def utilization_due(instance_id, computed, today=None, refresh_days=UTILIZATION_REFRESH_DAYS):
+    """Whether percentiles computed on day `computed` (ISO date) need recomputing
+
+    Each instance has a refresh day every refresh_days days, offset by a hash of its id,
+    so a daily run recomputes about 1/refresh_days of the fleet instead of all of it.
+    The percentiles are due once such a day has come since they were computed.
+    """
+    day = (today or datetime.utcnow().date()).toordinal()
+    last_refresh = day - (day - zlib.crc32(instance_id.encode('utf-8'))) % max(1, refresh_days)
+    return date.fromisoformat(computed).toordinal() < last_refresh
 
 
 class AWSResourceScanner:
     """Scans AWS resources across all regions"""
 
-    def __init__(self):
+    def __init__(self, parallel=SCAN_PARALLEL, region_concurrency=SCAN_REGION_CONCURRENCY,
+                 service_concurrency=SCAN_SERVICE_CONCURRENCY, incremental=SCAN_INCREMENTAL, metric_cache=None,
+                 progress_callback=None, utilization_sketches=UTILIZATION_SKETCHES, regions=None, accounts=None):
+        self.parallel = parallel
+        self.regions = list(AWS_REGIONS if regions is None else regions)
+        self.accounts = list(account_registry.accounts() if accounts is None else accounts)
+        self.region_concurrency = max(1, region_concurrency)
+        self.service_concurrency = max(1, service_concurrency)
+        self.incremental = incremental
+        self.metric_cache = metric_cache if metric_cache is not None else (MetricCache() if incremental else None)
+        self.previous_ec2 = {}
+        # progress_callback(scope, status, elapsed=None, error=None); status is running, done or failed.
+        # A scope is the region, prefixed with "<account id>/" for assumed-role accounts
+        self.progress_callback = progress_callback
+        self.utilization_sketches = utilization_sketches
         self.results = {
             'scan_time': datetime.now().isoformat(),
             'regions': {},
+            'region_timings': {},
+            'region_errors': {},
+            'scan_errors': {},
             'summary': {}
         }
-
-    def scan_all_regions(self):
-        """Scan EC2, EBS, RDS in all regions"""
-        print(f" Starting multi-region AWS scan...")
-
-        for region in AWS_REGIONS:
-            print(f" Scanning region: {region}")
-            self.results['regions'][region] = {
-                'ec2_instances': self.scan_ec2_instances(region),
-                'ebs_volumes': self.scan_ebs_volumes(region),
-                'rds_instances': self.scan_rds_instances(region),
-            }
+        self._errors_lock = threading.Lock()
+
+    def scan_all_regions(self, save=True):
+        """Scan EC2, EBS, RDS in every (account, region) pair (self.accounts x self.regions)
+
+        Pairs run region_concurrency at a time across all accounts. Resources are tagged
+        with their account_id and merged into results['regions'] per region, accounts in
+        order; timings and errors are keyed by scope (see progress_callback).
+
+        With save=False the scan file and metric cache are left for the caller to write,
+        as the sharded daily job does once for all shards.
+        """
+        mode = f"parallel, {self.region_concurrency} regions at once" if self.parallel else "sequential"
+        if len(self.accounts) > 1:
+            mode += f", {len(self.accounts)} accounts"
+        if self.incremental:
+            mode += ", incremental"
+            self.previous_ec2 = self.load_previous_ec2()
+        print(f" Starting multi-region AWS scan ({mode})...")
+        api_before = rate_limiter.totals()
+
+        pairs = [(region, account_id) for account_id in self.accounts for region in self.regions]
+        with metrics.run('scan') as run:
+            if self.parallel:
+                with ThreadPoolExecutor(max_workers=self.region_concurrency) as pool:
+                    scanned = list(pool.map(lambda pair: self.scan_region(*pair), pairs))
+            else:
+                scanned = [self.scan_region(region, account_id) for region, account_id in pairs]
+
+        # Merge in (account, region) order so the output layout does not depend on thread timing
+        for (region, account_id), (scope, region_data, elapsed, error) in zip(pairs, scanned):
+            merged = self.results['regions'].setdefault(region, {})
+            for resource_type, resources in region_data.items():
+                add_resources(merged, resource_type, resources)
+            self.results['region_timings'][scope] = elapsed
+            if error:
+                self.results['region_errors'][scope] = error
+
+        api_after = rate_limiter.totals()
+        self.results['api_calls'] = {field: round(api_after[field] - api_before[field], 3) for field in api_after}
+        if self.results['scan_errors']:
+            print(f"  ️  Incomplete data in {len(self.results['scan_errors'])} region(s), see scan_errors")
+
+        if self.metric_cache is not None:
+            self.results['metric_cache'] = {'hits': self.metric_cache.hits, 'misses': self.metric_cache.misses}
+            if save:
+                self.metric_cache.save()
 
         self.calculate_summary()
-        self.save_results()
+        if run.report is not None:
+            self.results['metrics'] = run.report
+        if save:
+            self.save_results()
         return self.results
 
-    def scan_ec2_instances(self, region):
-        """Scan EC2 instances with CPU metrics"""
-        try:
-            ec2 = boto3.client('ec2', region_name=region)
-            cloudwatch = boto3.client('cloudwatch', region_name=region)
+    def load_previous_ec2(self):
+        """{instance_id: (type, state)} from the newest scan file, used to spot changed instances"""
+        scan_file = latest_scan_file(SCAN_DATA_DIR)
+        if not scan_file:
+            return {}
 
-            response = ec2.describe_instances()
-            instances = []
+        try:
+            previous = load_scan(scan_file, resource_types=['ec2_instances'])
+        except (OSError, ValueError) as e:
+            print(f"  ️  Could not read previous scan: {e}")
+            return {}
+
+        return {
+            instance['instance_id']: (instance['type'], instance['state'])
+            for region_data in previous.get('regions', {}).values()
+            for instance in region_data.get('ec2_instances', [])
+        }
 
-            for reservation in response['Reservations']:
-                for instance in reservation['Instances']:
-                    instance_id = instance['InstanceId']
-                    state = instance['State']['Name']
+    def scan_region(self, region, account_id=None):
+        """Scan one region of one account (None: the ambient account)
+
+        Returns (scope, data, elapsed seconds, error or None).
+        """
+        account_id = account_id or account_registry.ambient_account_id
+        scope = account_registry.scope(account_id, region)
+        print(f" Scanning region: {scope}")
+        if self.progress_callback:
+            self.progress_callback(scope, 'running')
+        started = time.perf_counter()
+        error = None
+        scans = {
+            'ec2_instances': self.scan_ec2_instances,
+            'ebs_volumes': self.scan_ebs_volumes,
+            'rds_instances': self.scan_rds_instances,
+        }
 
-                    # Get CPU utilization from CloudWatch
-                    cpu_avg = self.get_cpu_utilization(cloudwatch, instance_id)
+        try:
+            with metrics.timer('scan_region', region=region):
+                if self.parallel and self.service_concurrency > 1:
+                    with ThreadPoolExecutor(max_workers=self.service_concurrency) as pool:
+                        futures = {key: pool.submit(self.scan_resources, key, scan, region, account_id)
+                                   for key, scan in scans.items()}
+                        region_data = {key: future.result() for key, future in futures.items()}
+                else:
+                    region_data = {key: self.scan_resources(key, scan, region, account_id)
+                                   for key, scan in scans.items()}
+        except Exception as e:
+            # One broken region must not take the rest of the scan down with it
+            print(f"   Region {scope} failed: {e}")
+            region_data = {key: ResourceColumns(key) for key in scans}
+            error = str(e)
+
+        elapsed = round(time.perf_counter() - started, 3)
+        print(f"   Finished {scope} in {elapsed:.2f}s")
+        if self.progress_callback:
+            self.progress_callback(scope, 'failed' if error else 'done', elapsed, error)
+        return scope, region_data, elapsed, error
+
+    def scan_resources(self, resource_type, scan, region, account_id=None):
+        """Run one resource scan under a timer, counting what it found and tagging it with its account"""
+        account_id = account_id or account_registry.ambient_account_id
+        with metrics.timer('scan_resources', region=region, resource_type=resource_type):
+            resources = scan(region, account_id)
+        if isinstance(resources, ResourceColumns):
+            resources.fill('account_id', account_id)
+        else:
+            for resource in resources:
+                resource['account_id'] = account_id
+        metrics.inc('resources_scanned', len(resources), region=region, resource_type=resource_type)
+        return resources
+
+    def record_error(self, region, source, error):
+        """Keep a per-scope error (source: resource type or 'cloudwatch') in results['scan_errors']
+
+        Failures that leave a resource list empty or metrics unset are recorded here rather
+        than only printed, so an incomplete scan is distinguishable from an empty region.
+        """
+        with self._errors_lock:
+            self.results['scan_errors'].setdefault(str(region), {})[source] = str(error)
+        metrics.inc('scan_errors', region=str(region), source=source)
+
+    def _client(self, service, region, account_id=None):
+        """Shared boto3 client from the process-wide pool"""
+        return get_client(service, region, account_id)
+
+    def scan_ec2_instances(self, region, account_id=None):
+        """Scan EC2 instances with CPU metrics
+
+        The iter_* generators below read one page at a time and fill metrics one batch at
+        a time, and ResourceColumns takes their records in chunks, so no list of per-record
+        objects is built. The region's columns themselves are kept until the scan is written
+        and analyzed: memory still grows with the fleet, only by far less per resource.
+        """
+        scope = account_registry.scope(account_id, region)
+        try:
+            instances = ResourceColumns('ec2_instances', self.iter_ec2_instances(region, account_id))
+            print(f"   Found {len(instances)} EC2 instances in {scope}")
+            return instances
 
-                    instances.append({
-                        'instance_id': instance_id,
+        except Exception as e:
+            print(f"   Error scanning EC2 in {scope}: {e}")
+            self.record_error(scope, 'ec2_instances', e)
+            return ResourceColumns('ec2_instances')
+
+    def iter_ec2_instances(self, region, account_id=None):
+        """Yield EC2 instance records with metrics, one describe_instances page at a time"""
+        ec2 = self._client('ec2', region, account_id)
+        cloudwatch = self._client('cloudwatch', region, account_id)
+        scope = account_registry.scope(account_id, region)
+
+        # Group pages so each GetMetricData call carries a full batch of queries
+        batch_size = max(1, CLOUDWATCH_MAX_QUERIES // len(EC2_METRICS))
+        batch = []
+
+        for page in ec2.get_paginator('describe_instances').paginate():
+            for reservation in page['Reservations']:
+                for instance in reservation['Instances']:
+                    batch.append({
+                        'instance_id': instance['InstanceId'],
                         'type': instance.get('InstanceType', 'unknown'),
-                        'state': state,
+                        'state': instance['State']['Name'],
                         'launch_time': instance.get('LaunchTime').isoformat() if instance.get('LaunchTime') else None,
-                        'cpu_avg_7d': cpu_avg,
-                        'tags': {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+                        'cpu_avg_7d': 0.0,
+                        'tags': {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])},
+                        'platform': instance.get('PlatformDetails', 'Linux/UNIX'),
+                        'tenancy': instance.get('Placement', {}).get('Tenancy', 'default'),
+                        'image_id': instance.get('ImageId')
                     })
 
-            print(f"   Found {len(instances)} EC2 instances in {region}")
+                    if len(batch) >= batch_size:
+                        yield from self.fill_batch_metrics(cloudwatch, batch, scope)
+                        batch = []
+
+        if batch:
+            yield from self.fill_batch_metrics(cloudwatch, batch, scope)
+
+    def fill_batch_metrics(self, cloudwatch, instances, scope=None):
+        """Averages (fill_ec2_metrics) plus, if enabled, utilization percentiles for one batch"""
+        self.fill_ec2_metrics(cloudwatch, instances, scope=scope)
+        if self.utilization_sketches:
+            self.fill_utilization_sketches(cloudwatch, instances, scope=scope)
+        return instances
+
+    def fill_ec2_metrics(self, cloudwatch, instances, days=7, scope=None):
+        """Set every EC2_METRICS field on each instance dict from batched GetMetricData calls
+
+        scope labels fetch errors in scan_errors (default: the client's region).
+        """
+        if not instances:
+            return instances
+
+        if self.metric_cache is not None:
+            return self.fill_ec2_metrics_incremental(cloudwatch, instances, days, scope)
+
+        end_time = datetime.utcnow()
+        start_time = end_time - timedelta(days=days)
+        series = self.fetch_ec2_metrics(cloudwatch, instances, start_time, end_time, scope) or {}
+
+        for (index, field), datapoints in series.items():
+            values = [value for _, value in datapoints]
+            instances[index][field] = round(sum(values) / len(values), 2) if values else 0.0
+
+        return instances
+
+    def fill_ec2_metrics_incremental(self, cloudwatch, instances, days=7, scope=None):
+        """Like fill_ec2_metrics, but over whole UTC days and only fetching days missing from the cache.
+
+        Instances are grouped by their oldest missing day, so on a daily run the bulk of the
+        fleet needs just yesterday's datapoint; new instances, and instances whose type or
+        state changed since the previous scan, get the full window.
+        """
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        window = [(today - timedelta(days=offset)).date().isoformat() for offset in range(days, 0, -1)]
+
+        cached = {}
+        groups = {}
+        for index, instance in enumerate(instances):
+            instance_id = instance['instance_id']
+            previous = self.previous_ec2.get(instance_id)
+            if previous is not None and previous != (instance['type'], instance['state']):
+                self.metric_cache.invalidate(instance_id)
+
+            first_missing = None
+            for field in EC2_METRICS:
+                cached[index, field] = self.metric_cache.get_days(instance_id, field)
+                missing = [day for day in window if day not in cached[index, field]]
+                if missing and (first_missing is None or missing[0] < first_missing):
+                    first_missing = missing[0]
+
+            if first_missing is not None:
+                groups.setdefault(first_missing, []).append(index)
+
+        for first_missing, indexes in groups.items():
+            start_time = datetime.fromisoformat(first_missing)
+            fetched_days = [day for day in window if day >= first_missing]
+            series = self.fetch_ec2_metrics(cloudwatch, [instances[i] for i in indexes], start_time, today, scope)
+            if series is None:
+                continue  # nothing is cached, so the next run retries these days
+
+            for (position, field), datapoints in series.items():
+                index = indexes[position]
+                # Days without a datapoint are cached as None so they are not fetched again
+                fresh = dict.fromkeys(fetched_days)
+                fresh.update((timestamp.date().isoformat(), value) for timestamp, value in datapoints)
+                cached[index, field].update(fresh)
+                self.metric_cache.update(instances[index]['instance_id'], field, fresh)
+
+        for (index, field), days_cached in cached.items():
+            values = [days_cached[day] for day in window if days_cached.get(day) is not None]
+            instances[index][field] = round(sum(values) / len(values), 2) if values else 0.0
+            # Keep fully-cached instances from expiring out of the cache
+            self.metric_cache.update(instances[index]['instance_id'], field, {})
+
+        return instances
+
+    def fetch_ec2_metrics(self, cloudwatch, instances, start_time, end_time, scope=None):
+        """Daily EC2_METRICS datapoints for instances: {(instance index, field): [(timestamp, value)]}
+
+        A failed fetch is reported and returns None.
+        """
+        queries = []
+        for index, instance in enumerate(instances):
+            for metric_index, (field, (namespace, metric_name, stat)) in enumerate(EC2_METRICS.items()):
+                queries.append({
+                    'Id': f"m{index}_{metric_index}",
+                    'Label': field,
+                    'MetricStat': {
+                        'Metric': {
+                            'Namespace': namespace,
+                            'MetricName': metric_name,
+                            'Dimensions': [{'Name': 'InstanceId', 'Value': instance['instance_id']}]
+                        },
+                        'Period': 86400,  # 1 day
+                        'Stat': stat
+                    },
+                    'ReturnData': True
+                })
+
+        try:
+            datapoints = self.get_metric_data(cloudwatch, queries, start_time, end_time)
+        except Exception as e:
+            print(f"    ️  Could not get CloudWatch metrics: {e}")
+            self.record_error(scope or cloudwatch.meta.region_name, 'cloudwatch', e)
+            return None
+
+        return {
+            (int(query['Id'][1:].split('_')[0]), query['Label']): datapoints.get(query['Id'], [])
+            for query in queries
+        }
+
+    def get_metric_data(self, cloudwatch, queries, start_time, end_time):
+        """Run metric queries through GetMetricData, packing the API maximum per call and following NextToken.
+
+        Returns {query Id: [(timestamp, value)]}; results for one Id may be split across pages and are concatenated.
+        """
+        values = {}
+        for result in self.iter_metric_data(cloudwatch, queries, start_time, end_time):
+            values.setdefault(result['Id'], []).extend(zip(result.get('Timestamps', []), result.get('Values', [])))
+        return values
+
+    def iter_metric_data(self, cloudwatch, queries, start_time, end_time):
+        """Yield GetMetricData results page by page (an Id can appear on several pages)"""
+        for offset in range(0, len(queries), CLOUDWATCH_MAX_QUERIES):
+            batch = queries[offset:offset + CLOUDWATCH_MAX_QUERIES]
+            kwargs = {
+                'MetricDataQueries': batch,
+                'StartTime': start_time,
+                'EndTime': end_time,
+                'ScanBy': 'TimestampAscending'
+            }
+
+            while True:
+                response = cloudwatch.get_metric_data(**kwargs)
+                yield from response.get('MetricDataResults', [])
+
+                next_token = response.get('NextToken')
+                if not next_token:
+                    break
+                kwargs['NextToken'] = next_token
+
+    def fill_utilization_sketches(self, cloudwatch, instances, days=UTILIZATION_DAYS, scope=None):
+        """Set <metric>_p50/_p95/_p99 on each instance from hourly UTILIZATION_METRICS series.
+
+        Datapoints are streamed page by page into one QuantileSketch per instance and
+        metric, and the sketches are dropped once the percentiles are read, so memory is
+        bounded by the batch size and SKETCH_MAX_BINS, not by fleet size or history length.
+        Metrics without datapoints (e.g. memory without the CloudWatch agent) are None.
+
+        With a metric cache, percentiles are cached per instance and only instances due
+        for a refresh (see utilization_due) are fetched; the rest are filled from the cache.
+        """
+        if not instances:
             return instances
 
+        pending = instances
+        if self.metric_cache is not None:
+            pending = [instance for instance in instances if not self.fill_cached_utilization(instance)]
+            if not pending:
+                return instances
+
+        end_time = datetime.utcnow()
+        start_time = end_time - timedelta(days=days)
+        metric_names = list(UTILIZATION_METRICS)
+
+        queries = []
+        for index, instance in enumerate(pending):
+            for metric_index, (namespace, metric_name, stat) in enumerate(UTILIZATION_METRICS.values()):
+                queries.append({
+                    'Id': f"u{index}_{metric_index}",
+                    'MetricStat': {
+                        'Metric': {
+                            'Namespace': namespace,
+                            'MetricName': metric_name,
+                            'Dimensions': metric_dimensions(namespace, instance)
+                        },
+                        'Period': UTILIZATION_PERIOD,
+                        'Stat': stat
+                    },
+                    'ReturnData': True
+                })
+
+        sketches = {}
+        fetched = True
+        try:
+            for result in self.iter_metric_data(cloudwatch, queries, start_time, end_time):
+                sketch = sketches.get(result['Id'])
+                if sketch is None:
+                    sketch = sketches[result['Id']] = QuantileSketch(SKETCH_RELATIVE_ACCURACY, SKETCH_MAX_BINS)
+                sketch.extend(result.get('Values', []))
         except Exception as e:
-            print(f"   Error scanning EC2 in {region}: {e}")
-            return []
+            print(f"    ️  Could not get utilization series: {e}")
+            self.record_error(scope or cloudwatch.meta.region_name, 'cloudwatch', e)
+            sketches = {}
+            fetched = False
+
+        for query in queries:
+            index, metric_index = (int(part) for part in query['Id'][1:].split('_'))
+            sketch = sketches.get(query['Id'])
+            for quantile in UTILIZATION_QUANTILES:
+                value = sketch.quantile(quantile) if sketch else None
+                pending[index][f"{metric_names[metric_index]}_p{round(quantile * 100)}"] = \
+                    round(value, 2) if value is not None else None
+
+        if self.metric_cache is not None and fetched:
+            # Cached as {day computed: {field: value}}; a failed fetch caches nothing, so it is retried
+            today = end_time.date().isoformat()
+            for instance in pending:
+                self.metric_cache.update(instance['instance_id'], 'utilization',
+                                         {today: {field: instance[field] for field in UTILIZATION_FIELDS}})
+
+        return instances
+
+    def fill_cached_utilization(self, instance):
+        """Set the cached percentiles on instance unless they are due for a refresh; returns whether it did"""
+        cached = self.metric_cache.get_days(instance['instance_id'], 'utilization')
+        if not cached:
+            return False
+        computed = max(cached)
+        if utilization_due(instance['instance_id'], computed):
+            return False
+        instance.update(cached[computed])
+        self.metric_cache.update(instance['instance_id'], 'utilization', {})  # keep it from expiring
+        return True
 
     def get_cpu_utilization(self, cloudwatch, instance_id):
         """Get average CPU utilization for last 7 days"""
+        instance = {'instance_id': instance_id}
+        self.fill_ec2_metrics(cloudwatch, [instance])
+        return instance['cpu_avg_7d']
+
+    def scan_ebs_volumes(self, region, account_id=None):
+        """Scan EBS volumes (especially unattached ones)"""
+        scope = account_registry.scope(account_id, region)
         try:
-            end_time = datetime.utcnow()
-            start_time = end_time - timedelta(days=7)
-
-            response = cloudwatch.get_metric_statistics(
-                Namespace='AWS/EC2',
-                MetricName='CPUUtilization',
-                Dimensions=[{'Name': 'InstanceId', 'Value': instance_id}],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=86400,  # 1 day
-                Statistics=['Average']
-            )
-
-            if response['Datapoints']:
-                avg_cpu = sum(dp['Average'] for dp in response['Datapoints']) / len(response['Datapoints'])
-                return round(avg_cpu, 2)
-            return 0.0
+            volumes = ResourceColumns('ebs_volumes', self.iter_ebs_volumes(region, account_id))
+            print(f"   Found {len(volumes)} EBS volumes in {scope}")
+            return volumes
 
         except Exception as e:
-            print(f"    ️  Could not get CPU for {instance_id}: {e}")
-            return 0.0
+            print(f"   Error scanning EBS in {scope}: {e}")
+            self.record_error(scope, 'ebs_volumes', e)
+            return ResourceColumns('ebs_volumes')
 
-    def scan_ebs_volumes(self, region):
-        """Scan EBS volumes (especially unattached ones)"""
-        try:
-            ec2 = boto3.client('ec2', region_name=region)
-            response = ec2.describe_volumes()
+    def iter_ebs_volumes(self, region, account_id=None):
+        """Yield EBS volume records, one describe_volumes page at a time"""
+        ec2 = self._client('ec2', region, account_id)
 
-            volumes = []
-            for volume in response['Volumes']:
-                volumes.append({
+        for page in ec2.get_paginator('describe_volumes').paginate():
+            for volume in page['Volumes']:
+                yield {
                     'volume_id': volume['VolumeId'],
                     'size_gb': volume['Size'],
                     'state': volume['State'],
                     'attached': len(volume.get('Attachments', [])) > 0,
                     'create_time': volume['CreateTime'].isoformat(),
                     'volume_type': volume.get('VolumeType', 'unknown')
-                })
+                }
 
-            print(f"   Found {len(volumes)} EBS volumes in {region}")
-            return volumes
+    def scan_rds_instances(self, region, account_id=None):
+        """Scan RDS instances"""
+        scope = account_registry.scope(account_id, region)
+        try:
+            instances = ResourceColumns('rds_instances', self.iter_rds_instances(region, account_id))
+            print(f"   Found {len(instances)} RDS instances in {scope}")
+            return instances
 
         except Exception as e:
-            print(f"   Error scanning EBS in {region}: {e}")
-            return []
+            print(f"   Error scanning RDS in {scope}: {e}")
+            self.record_error(scope, 'rds_instances', e)
+            return ResourceColumns('rds_instances')
 
-    def scan_rds_instances(self, region):
-        """Scan RDS instances"""
-        try:
-            rds = boto3.client('rds', region_name=region)
-            response = rds.describe_db_instances()
+    def iter_rds_instances(self, region, account_id=None):
+        """Yield RDS instance records, one describe_db_instances page at a time"""
+        rds = self._client('rds', region, account_id)
 
-            instances = []
-            for db in response['DBInstances']:
-                instances.append({
+        for page in rds.get_paginator('describe_db_instances').paginate():
+            for db in page['DBInstances']:
+                yield {
                     'db_identifier': db['DBInstanceIdentifier'],
                     'db_class': db['DBInstanceClass'],
                     'engine': db['Engine'],
                     'status': db['DBInstanceStatus'],
                     'allocated_storage': db.get('AllocatedStorage', 0),
                     'multi_az': db.get('MultiAZ', False)
-                })
-
-            print(f"   Found {len(instances)} RDS instances in {region}")
-            return instances
-
-        except Exception as e:
-            print(f"   Error scanning RDS in {region}: {e}")
-            return []
+                }
 
     def calculate_summary(self):
-        """Calculate summary statistics"""
+        """Calculate summary statistics, overall and per account (results['accounts'])"""
         total_ec2 = 0
         total_ebs = 0
         total_rds = 0
         idle_ec2 = 0
         unattached_ebs = 0
 
-        for region_data in self.results['regions'].values():
-            ec2_list = region_data['ec2_instances']
-            total_ec2 += len(ec2_list)
-            idle_ec2 += sum(1 for inst in ec2_list if inst['cpu_avg_7d'] < 5.0 and inst['state'] == 'running')
-
-            ebs_list = region_data['ebs_volumes']
-            total_ebs += len(ebs_list)
-            unattached_ebs += sum(1 for vol in ebs_list if not vol['attached'])
+        role_arns = account_registry.role_arns()
+        accounts = {}
+        for region, region_data in self.results['regions'].items():
+            for resource_type, resources in region_data.items():
+                # Read as columns: a ResourceColumns is not expanded into per-resource dicts
+                for account_id, count in Counter(ColumnTable.of(resources).values('account_id')).items():
+                    account = accounts.get(account_id)
+                    if account is None:
+                        account = accounts[account_id] = {'role_arn': role_arns.get(account_id), 'regions': [],
+                                                          'ec2_instances': 0, 'ebs_volumes': 0, 'rds_instances': 0}
+                    account[resource_type] = account.get(resource_type, 0) + count
+                    if region not in account['regions']:
+                        account['regions'].append(region)
+
+            ec2 = ColumnTable.of(region_data['ec2_instances'])
+            total_ec2 += len(ec2)
+            idle_ec2 += sum(1 for cpu, state in zip(ec2.values('cpu_avg_7d'), ec2.values('state'))
+                            if cpu < 5.0 and state == 'running')
+
+            ebs = ColumnTable.of(region_data['ebs_volumes'])
+            total_ebs += len(ebs)
+            unattached_ebs += sum(1 for attached in ebs.values('attached') if not attached)
 
             total_rds += len(region_data['rds_instances'])
 
@@ -160,14 +596,25 @@ class AWSResourceScanner:
             'idle_ec2_instances': idle_ec2,
             'total_ebs_volumes': total_ebs,
             'unattached_ebs_volumes': unattached_ebs,
-            'total_rds_instances': total_rds
+            'total_rds_instances': total_rds,
+            'regions_with_errors': len(self.results['scan_errors']),
+            'total_accounts': len(accounts)
         }
+        self.results['accounts'] = {str(account_id): account for account_id, account in accounts.items()}
 
     def save_results(self):
-        """Save scan results to JSON file"""
-        filename = f"{SCAN_DATA_DIR}/scan_{get_timestamp()}.json"
-        with open(filename, 'w') as f:
-            json.dump(self.results, f, indent=2)
+        """Save scan results (compact indexed file by default, JSON if SCAN_STORAGE_FORMAT='json')"""
+        if SCAN_STORAGE_FORMAT == 'json':
+            filename = f"{SCAN_DATA_DIR}/scan_{get_timestamp()}.json"
+            with open(filename, 'w') as f:
+                json.dump(self.results, f, indent=2, default=to_json)
+        else:
+            filename = write_scan(self.results, f"{SCAN_DATA_DIR}/scan_{get_timestamp()}{COMPACT_EXTENSION}")
+        metrics.inc('bytes_written', os.path.getsize(filename), artifact='scan')
+        get_archive(SCAN_DATA_DIR, 'scan').register(filename)
+        notify_written(SCAN_DATA_DIR)
+        if HISTORY_ENABLED:
+            get_history_store().record_scan(self.results)
         print(f"\n Scan results saved to: {filename}")
         return filename
 
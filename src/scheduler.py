@@ -1,11 +1,19 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime
-from src.scanner import AWSResourceScanner
-from src.analyzer import CostAnalyzer
 from src.recommender import MLRecommender
 from src.executor import RemediationExecutor
+from src.archive import compact_all, get_archive
+from src.artifacts import notify_written
+from src.diff import action_key, completed_actions
+from src.history import get_history_store
+from src.jobs import SCAN_DEDUP_KEY, job_manager, scan_result
+from src.leases import FileLease
+from src.metrics import metrics
+from src.resources import to_json
+from src.shards import ShardRunner, plan_shards, shard_scopes
 import json
-from config import SCAN_SCHEDULE_HOUR, RECOMMENDATIONS_DIR, get_timestamp
+import os
+from config import ARCHIVE_COMPACT_HOUR, HISTORY_ENABLED, LEASE_WAIT, SCAN_SCHEDULE_HOUR, RECOMMENDATIONS_DIR, get_timestamp
 
 
 class CostOptimizerScheduler:
@@ -19,61 +27,120 @@ class CostOptimizerScheduler:
         """Setup scheduled jobs"""
         # Daily scan at 2 AM
         self.scheduler.add_job(
-            self.daily_scan_and_optimize,
+            self.enqueue_daily_scan,
             'cron',
             hour=SCAN_SCHEDULE_HOUR,
             minute=0,
             id='daily_scan'
         )
 
-        print(f" Scheduled daily scan at {SCAN_SCHEDULE_HOUR}:00")
+        # Daily archive compaction, after the scan has had time to finish
+        self.scheduler.add_job(
+            self.enqueue_archive_compaction,
+            'cron',
+            hour=ARCHIVE_COMPACT_HOUR,
+            minute=0,
+            id='archive_compaction'
+        )
 
-    def daily_scan_and_optimize(self):
-        """Main scheduled job - scan, analyze, recommend, execute"""
+        print(f" Scheduled daily scan at {SCAN_SCHEDULE_HOUR}:00")
+        print(f" Scheduled archive compaction at {ARCHIVE_COMPACT_HOUR}:00")
+
+    def enqueue_daily_scan(self):
+        """Cron entry point: run the daily job through the shared background job queue
+
+        It shares its dedup key with the manual trigger, so while either scan is queued or
+        running the other joins it instead of scanning the fleet a second time.
+        """
+        job, deduplicated = job_manager.submit('daily_scan', self.daily_scan_and_optimize, dedup_key=SCAN_DEDUP_KEY)
+        if deduplicated:
+            print(f" Scan job {job.id} ({job.kind}) is still {job.status}, not starting another")
+        return job
+
+    def enqueue_archive_compaction(self):
+        """Cron entry point: compact the scan and report archives as a background job"""
+        job, deduplicated = job_manager.submit('archive_compaction', lambda job: compact_all())
+        if deduplicated:
+            print(f" Archive compaction {job.id} is still {job.status}, not starting another")
+        return job
+
+    def daily_scan_and_optimize(self, job=None):
+        """Main scheduled job - scan and analyze (sharded), recommend, execute; writes one report"""
+        stage = job.set_stage if job else (lambda name: None)
         print(f"\n{'=' * 60}")
         print(f" Starting scheduled AWS optimization job")
         print(f"{'=' * 60}\n")
 
         try:
-            # Step 1: Scan resources
-            scanner = AWSResourceScanner()
-            scan_results = scanner.scan_all_regions()
-
-            # Step 2: Analyze costs
-            analyzer = CostAnalyzer(scan_results)
-            analysis = analyzer.analyze()
-
-            # Step 3: ML recommendations
-            ml_recommender = MLRecommender()
-            ml_recs = ml_recommender.generate_ml_recommendations(scan_results)
-
-            # Combine recommendations
-            all_recommendations = analysis['recommendations'] + ml_recs
-
-            # Step 4: Execute safe actions (dry_run=False in production)
-            executor = RemediationExecutor(dry_run=True)
-            actions = executor.execute_recommendations(all_recommendations)
+            with metrics.run('daily_job') as run:
+                # Steps 1-2: Scan and analyze each shard under its lease (incremental: only new
+                # metric days are fetched, and only resources changed since the last report are
+                # analyzed), merged into one scan file and analysis
+                stage('scan')
+                shards = plan_shards()
+                if job:
+                    job.set_scopes(shard_scopes(shards))
+                sharded = ShardRunner(incremental=True, incremental_analysis=True,
+                                      progress_callback=job.region_progress if job else None).run(shards)
+                scan_results = sharded['scan']
+                analysis = sharded['analysis']
+                diff = sharded['diff']
+
+                # Step 3: ML recommendations
+                stage('recommend')
+                ml_recommender = MLRecommender()
+                ml_recs = ml_recommender.generate_ml_recommendations(scan_results)
+
+                # Combine recommendations
+                all_recommendations = analysis['recommendations'] + ml_recs
+
+                # Step 4: Execute safe actions (dry_run=False in production), one runner at a time;
+                # actions that succeeded in the baseline report's run are not repeated, while
+                # failed, dry-run and unapproved ones are tried again
+                stage('execute')
+                baseline = sharded.get('baseline')
+                completed = completed_actions(baseline['actions_taken']) if baseline else set()
+                actionable = [rec for rec in all_recommendations if action_key(rec) not in completed]
+                with FileLease('remediation').hold(timeout=LEASE_WAIT):
+                    executor = RemediationExecutor(dry_run=True)
+                    actions = executor.execute_recommendations(actionable)
 
             # Save report
             report = {
                 'timestamp': datetime.now().isoformat(),
+                'scan_time': scan_results['scan_time'],
                 'scan_summary': scan_results['summary'],
+                'shards': sharded['shards'],
                 'total_recommendations': len(all_recommendations),
                 'potential_savings': analysis['total_potential_savings'],
                 'recommendations': all_recommendations,
                 'actions_taken': actions
             }
+            if diff is not None:
+                report['diff'] = diff.summary()
+            if run.report is not None:
+                report['metrics'] = run.report
 
             report_file = f"{RECOMMENDATIONS_DIR}/report_{get_timestamp()}.json"
             with open(report_file, 'w') as f:
-                json.dump(report, f, indent=2)
+                json.dump(report, f, indent=2, default=to_json)
+            metrics.inc('bytes_written', os.path.getsize(report_file), artifact='report')
+            get_archive(RECOMMENDATIONS_DIR, 'report').register(report_file)
+            notify_written(RECOMMENDATIONS_DIR)
+            if HISTORY_ENABLED:
+                get_history_store().record_report(report)
 
             print(f"\n Optimization job complete!")
             print(f" Report saved: {report_file}")
             print(f" Potential savings: ${analysis['total_potential_savings']:.2f}/month")
 
+            return scan_result(scan_results['summary'], len(all_recommendations),
+                               analysis['total_potential_savings'], report_file)
+
         except Exception as e:
             print(f" Error in scheduled job: {e}")
+            if job:
+                raise  # let the job record the failure
 
     def start(self):
         """Start the scheduler"""
@@ -0,0 +1,163 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from src.accounts import account_registry
+from src.analyzer import CostAnalyzer
+from src.diff import ScanDiff, analyze_changes, diff_scans, load_baseline
+from src.leases import FileLease, LeaseHeld
+from src.metric_cache import MetricCache
+from src.ratelimit import rate_limiter
+from src.resources import add_resources
+from src.scanner import AWSResourceScanner
+from src.storage import load_scan
+from config import (ANALYSIS_INCREMENTAL, AWS_REGIONS, LEASE_WAIT, SCAN_INCREMENTAL, SCHEDULER_SHARD_BY,
+                    SCHEDULER_SHARD_STAGGER, SCHEDULER_SHARD_WORKERS)
+
+
+def plan_shards(by=SCHEDULER_SHARD_BY, regions=None, accounts=None):
+    """[{'name', 'regions', 'accounts'}]: one shard per region (every account), or (by='account')
+    one per account (every region)"""
+    regions = list(AWS_REGIONS if regions is None else regions)
+    accounts = list(account_registry.accounts() if accounts is None else accounts)
+    if by == 'region':
+        return [{'name': region, 'regions': [region], 'accounts': accounts} for region in regions]
+    if by == 'account':
+        return [{'name': account_id, 'regions': regions, 'accounts': [account_id]} for account_id in accounts]
+    raise ValueError(f"Unknown shard key: {by}")
+
+
+def shard_scopes(shards):
+    """Scope labels (see AccountRegistry.scope) of every (account, region) pair the shards scan"""
+    return [account_registry.scope(account_id, region) for shard in shards
+            for account_id in shard.get('accounts') or [None] for region in shard['regions']]
+
+
+class ShardRunner:
+    """Scans and analyzes shards on a worker pool and merges them into one scan and analysis
+
+    Shard i starts stagger * i seconds after the first, so the shards do not all hit the
+    AWS APIs in the same second. Each shard runs under the file lease shard-<name>; a
+    shard whose lease another runner (a manual scan, a second app instance) holds waits up
+    to lease_wait seconds and is then skipped, its regions listed in region_errors. One
+    metric cache is shared by all shards and, like the merged scan file, written once.
+
+    With incremental_analysis, each shard diffs its scan against the same slice of the
+    previous scan and analyzes only what changed (see src/diff.py); the merged ScanDiff is
+    returned as 'diff', and the baseline (see load_baseline) as 'baseline'. Without a
+    usable baseline the run falls back to full analysis.
+    """
+
+    def __init__(self, workers=SCHEDULER_SHARD_WORKERS, stagger=SCHEDULER_SHARD_STAGGER, lease_wait=LEASE_WAIT,
+                 incremental=SCAN_INCREMENTAL, progress_callback=None, lease_factory=FileLease, sleep=time.sleep,
+                 incremental_analysis=ANALYSIS_INCREMENTAL):
+        self.workers = max(1, workers)
+        self.stagger = stagger
+        self.lease_wait = lease_wait
+        self.incremental = incremental
+        self.progress_callback = progress_callback
+        self.lease_factory = lease_factory
+        self.sleep = sleep
+        self.incremental_analysis = incremental_analysis
+
+    def run(self, shards=None):
+        """Run every shard; returns {'scan', 'analysis', 'shards', 'diff', 'baseline'} (diff: ScanDiff or None)"""
+        shards = plan_shards() if shards is None else shards
+        metric_cache = MetricCache() if self.incremental else None
+        baseline = load_baseline() if self.incremental_analysis else None
+        if self.incremental_analysis and baseline is None:
+            print("️  No baseline report for the latest scan, analyzing the full fleet")
+        print(f" Running {len(shards)} shard(s) on {min(self.workers, len(shards))} worker(s)")
+
+        api_before = rate_limiter.totals()
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='shard') as pool:
+            outcomes = list(pool.map(
+                lambda item: self.run_shard(item[1], started + item[0] * self.stagger, metric_cache, baseline),
+                enumerate(shards)))
+        # One delta around the whole pool: the shards' own deltas overlap each other
+        api_after = rate_limiter.totals()
+        api_calls = {field: round(api_after[field] - api_before[field], 3) for field in api_after}
+        return dict(self.combine(outcomes, metric_cache, api_calls), baseline=baseline)
+
+    def run_shard(self, shard, start_at, metric_cache=None, baseline=None):
+        """Scan and analyze one shard under its lease; returns the shard's outcome"""
+        delay = start_at - time.monotonic()
+        if delay > 0:
+            self.sleep(delay)
+
+        outcome = {'shard': shard['name'], 'regions': shard['regions'], 'accounts': shard.get('accounts'),
+                   'status': 'done', 'error': None}
+        began = time.perf_counter()
+        try:
+            with self.lease_factory(f"shard-{shard['name']}").hold(timeout=self.lease_wait):
+                scanner = AWSResourceScanner(incremental=self.incremental, metric_cache=metric_cache,
+                                             progress_callback=self.progress_callback, regions=shard['regions'],
+                                             accounts=shard.get('accounts'))
+                outcome['scan'] = scanner.scan_all_regions(save=False)
+                if baseline is None:
+                    outcome['analysis'] = CostAnalyzer(outcome['scan']).analyze()
+                else:
+                    previous = load_scan(baseline['scan_file'], regions=shard['regions'])
+                    outcome['diff'] = diff_scans(previous, outcome['scan'], accounts=shard.get('accounts'))
+                    outcome['analysis'] = analyze_changes(outcome['scan'], outcome['diff'],
+                                                          baseline['recommendations'])
+        except LeaseHeld as e:
+            print(f"  ️  Skipping shard {shard['name']}: {e}")
+            outcome.update(status='skipped', error=str(e))
+        except Exception as e:
+            print(f"   Shard {shard['name']} failed: {e}")
+            outcome.update(status='failed', error=str(e))
+        outcome['seconds'] = round(time.perf_counter() - began, 3)
+        return outcome
+
+    def combine(self, outcomes, metric_cache=None, api_calls=None):
+        """Merge shard outcomes (in shard order) and write the one scan file
+
+        api_calls is the rate limiter delta over all shards, recorded as the scan's api_calls.
+        """
+        writer = AWSResourceScanner(incremental=False, regions=[])
+        results = writer.results
+        recommendations = []
+        savings = 0.0
+        diff = None
+
+        for outcome in outcomes:
+            if outcome['status'] != 'done':
+                for account_id in outcome.get('accounts') or [None]:
+                    for region in outcome['regions']:
+                        scope = account_registry.scope(account_id, region)
+                        results['region_errors'][scope] = f"shard {outcome['status']}: {outcome['error']}"
+                continue
+            scan = outcome['scan']
+            results['scan_time'] = min(results['scan_time'], scan['scan_time'])
+            for region, region_data in scan['regions'].items():
+                merged = results['regions'].setdefault(region, {})
+                for resource_type, resources in region_data.items():
+                    add_resources(merged, resource_type, resources)
+            for key in ('region_timings', 'region_errors', 'scan_errors'):
+                results[key].update(scan.get(key, {}))
+            recommendations.extend(outcome['analysis']['recommendations'])
+            if 'diff' in outcome:
+                diff = (diff or ScanDiff()).merge(outcome['diff'])
+            savings += outcome['analysis']['total_potential_savings']
+
+        results['api_calls'] = api_calls or {}
+        if metric_cache is not None:
+            results['metric_cache'] = {'hits': metric_cache.hits, 'misses': metric_cache.misses}
+            metric_cache.save()
+        summaries = [{key: outcome[key] for key in ('shard', 'regions', 'accounts', 'status', 'error', 'seconds')}
+                     for outcome in outcomes]
+        results['shards'] = summaries
+        writer.calculate_summary()
+        writer.save_results()
+
+        return {
+            'scan': results,
+            'analysis': {
+                'timestamp': datetime.now().isoformat(),
+                'recommendations': recommendations,
+                'total_potential_savings': round(savings, 2),
+            },
+            'shards': summaries,
+            'diff': diff,
+        }
@@ -0,0 +1,76 @@
+import math
+
+
+class QuantileSketch:
+    """Streaming quantile sketch with relative-error guarantees (DDSketch-style)
+
+    Values land in logarithmic buckets: with relative_accuracy a, any quantile is
+    returned within a factor (1 ± a) of the true value. The number of buckets is
+    capped at max_bins by folding the lowest buckets together, so memory stays fixed
+    however many values are added (only the lowest quantiles lose accuracy once that
+    happens, which rightsizing does not use). Values at or below min_value are counted
+    as zero.
+    """
+
+    __slots__ = ('gamma', 'log_gamma', 'min_value', 'max_bins', 'bins', 'zero_count', 'count', 'max')
+
+    def __init__(self, relative_accuracy=0.01, max_bins=256, min_value=1e-6):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.max_bins = max_bins
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        if self.max is None or value > self.max:
+            self.max = value
+
+        if value <= self.min_value:
+            self.zero_count += 1
+            return
+
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.bins[key] = self.bins.get(key, 0) + 1
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def extend(self, values):
+        for value in values:
+            self.add(value)
+
+    def _collapse(self):
+        """Fold the two lowest buckets into one"""
+        lowest, second = sorted(self.bins)[:2]
+        self.bins[second] += self.bins.pop(lowest)
+
+    def merge(self, other):
+        """Add another sketch's values (same accuracy settings)"""
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        while len(self.bins) > self.max_bins:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def quantile(self, q):
+        """Approximate q-quantile (0 <= q <= 1), or None for an empty sketch"""
+        if not self.count:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                # Bucket midpoint; never report above the largest value seen
+                return min(2 * self.gamma ** key / (self.gamma + 1), self.max)
+        return self.max
@@ -0,0 +1,198 @@
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from config import (SNAPSHOT_MAX_IN_FLIGHT, SNAPSHOT_POLL_INTERVAL, SNAPSHOT_STATE_FILE, SNAPSHOT_TIMEOUT,
+                    SNAPSHOT_DESCRIBE_BATCH)
+from src.accounts import account_registry
+from src.clients import get_client
+
+SNAPSHOTTING = 'snapshotting'
+DELETED = 'deleted'
+FAILED = 'failed'
+
+
+class SnapshotPipeline:
+    """Snapshot-then-delete for many EBS volumes, with a resumable state file
+
+    Per region and account, up to max_in_flight snapshots run at once. Their progress is polled with
+    one DescribeSnapshots call per describe_batch snapshots, and each volume is deleted
+    as soon as its snapshot completes, while the queue refills the freed slots.
+
+    Layout on disk (JSON):
+        {'version': 1, 'volumes': {volume_id: {'region', 'account_id', 'status', 'snapshot_id', 'started', 'error'}}}
+
+    account_id is None for the ambient account.
+
+    Every transition is written before the next AWS call. A crashed run therefore leaves
+    its in-flight snapshots behind, and the next run() for that region and account (or resume())
+    waits on those snapshots instead of taking new ones. Finished volumes are dropped
+    from the file once reported.
+    """
+
+    VERSION = 1
+
+    def __init__(self, state_path=SNAPSHOT_STATE_FILE, max_in_flight=SNAPSHOT_MAX_IN_FLIGHT,
+                 poll_interval=SNAPSHOT_POLL_INTERVAL, timeout=SNAPSHOT_TIMEOUT,
+                 describe_batch=SNAPSHOT_DESCRIBE_BATCH, sleep=time.sleep):
+        self.state_path = state_path
+        self.max_in_flight = max(1, max_in_flight)
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.describe_batch = max(1, describe_batch)
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self.volumes = {}
+        self.load()
+
+    def load(self):
+        """Load the state file; a missing or unreadable file starts empty"""
+        try:
+            with open(self.state_path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.volumes = data.get('volumes', {})
+        except (OSError, ValueError) as e:
+            if os.path.exists(self.state_path):
+                print(f"  ️  Ignoring unreadable snapshot state {self.state_path}: {e}")
+            self.volumes = {}
+
+    def save(self):
+        """Write the state file atomically"""
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = f"{self.state_path}.{threading.get_ident()}.tmp"
+
+        with self._lock:
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': self.VERSION, 'volumes': self.volumes}, f, separators=(',', ':'))
+            os.replace(tmp_path, self.state_path)
+
+    def _set(self, volume_id, **fields):
+        with self._lock:
+            self.volumes.setdefault(volume_id, {}).update(fields)
+        self.save()
+
+    def pending_scopes(self):
+        """(region, account_id) pairs with snapshots left in flight by an earlier run"""
+        with self._lock:
+            return sorted({(entry['region'], entry.get('account_id')) for entry in self.volumes.values()
+                           if entry.get('status') == SNAPSHOTTING}, key=lambda scope: (scope[0], scope[1] or ''))
+
+    def pending_regions(self):
+        """Regions with snapshots left in flight by an earlier run"""
+        return sorted({region for region, _ in self.pending_scopes()})
+
+    def resume(self):
+        """Finish every snapshot left in flight; returns {volume_id: (result, error)}"""
+        outcomes = {}
+        for region, account_id in self.pending_scopes():
+            outcomes.update(self.run(region, [], account_id))
+        return outcomes
+
+    def run(self, region, volume_ids, account_id=None):
+        """Snapshot and delete volumes in one region of one account; returns {volume_id: (result, error)}
+
+        Volumes still in flight from an earlier run in this region and account are
+        finished too and included in the result.
+        """
+        account_id = None if account_registry.is_ambient(account_id) else account_id
+        ec2 = get_client('ec2', region, account_id)
+        outcomes = {}
+        in_flight = {}
+
+        with self._lock:
+            for volume_id, entry in self.volumes.items():
+                if (entry.get('region') == region and entry.get('account_id') == account_id and
+                        entry.get('status') == SNAPSHOTTING):
+                    in_flight[entry['snapshot_id']] = volume_id
+        queue = [v for v in dict.fromkeys(volume_ids) if v not in in_flight.values()]
+
+        while queue or in_flight:
+            while queue and len(in_flight) < self.max_in_flight:
+                volume_id = queue.pop(0)
+                try:
+                    snapshot = ec2.create_snapshot(
+                        VolumeId=volume_id,
+                        Description=f"Auto-backup before deletion - {datetime.now().isoformat()}"
+                    )
+                except Exception as e:
+                    outcomes[volume_id] = (None, f"Snapshot of {volume_id} failed: {e}")
+                    continue
+                in_flight[snapshot['SnapshotId']] = volume_id
+                self._set(volume_id, region=region, account_id=account_id, status=SNAPSHOTTING,
+                          snapshot_id=snapshot['SnapshotId'], started=time.time(), error=None)
+
+            finished = self._poll(ec2, in_flight, outcomes)
+            if in_flight and not finished:
+                self._expire(in_flight, outcomes)
+                if in_flight:
+                    self.sleep(self.poll_interval)
+
+        with self._lock:
+            for volume_id in outcomes:
+                if self.volumes.get(volume_id, {}).get('status') in (DELETED, FAILED):
+                    del self.volumes[volume_id]
+        self.save()
+        return outcomes
+
+    def _poll(self, ec2, in_flight, outcomes):
+        """One round of batched DescribeSnapshots; deletes volumes whose snapshot completed"""
+        finished = 0
+        snapshot_ids = list(in_flight)
+        for start in range(0, len(snapshot_ids), self.describe_batch):
+            chunk = snapshot_ids[start:start + self.describe_batch]
+            try:
+                response = ec2.describe_snapshots(SnapshotIds=chunk)
+            except Exception as e:
+                print(f"  ️  DescribeSnapshots failed, retrying next poll: {e}")
+                continue
+
+            for snapshot in response.get('Snapshots', []):
+                snapshot_id = snapshot['SnapshotId']
+                volume_id = in_flight.get(snapshot_id)
+                if volume_id is None:
+                    continue
+                state = snapshot.get('State')
+                if state == 'completed':
+                    del in_flight[snapshot_id]
+                    outcomes[volume_id] = self._delete(ec2, volume_id, snapshot_id)
+                    finished += 1
+                elif state == 'error':
+                    del in_flight[snapshot_id]
+                    error = f"Snapshot {snapshot_id} of {volume_id} failed: {snapshot.get('StateMessage', 'error')}"
+                    self._set(volume_id, status=FAILED, error=error)
+                    outcomes[volume_id] = (None, error)
+                    finished += 1
+        return finished
+
+    def _delete(self, ec2, volume_id, snapshot_id):
+        try:
+            ec2.delete_volume(VolumeId=volume_id)
+        except Exception as e:
+            error = f"Created snapshot {snapshot_id}, but deleting {volume_id} failed: {e}"
+            self._set(volume_id, status=FAILED, error=error)
+            return None, error
+        self._set(volume_id, status=DELETED)
+        return f"Created snapshot {snapshot_id}, deleted volume {volume_id}", None
+
+    def _expire(self, in_flight, outcomes):
+        """Give up waiting on snapshots older than the timeout; they stay in the state file"""
+        now = time.time()
+        for snapshot_id, volume_id in list(in_flight.items()):
+            with self._lock:
+                started = self.volumes.get(volume_id, {}).get('started') or now
+            if now - started > self.timeout:
+                del in_flight[snapshot_id]
+                outcomes[volume_id] = (None, f"Snapshot {snapshot_id} of {volume_id} still pending after "
+                                             f"{self.timeout}s; will resume on the next run")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['resume']:
+        print("Usage: python -m src.snapshots resume")
+        sys.exit(2)
+
+    for volume_id, (result, error) in SnapshotPipeline().resume().items():
+        print(f"   {volume_id}: {result or error}")
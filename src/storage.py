@@ -0,0 +1,272 @@
+import glob
+import gzip
+import json
+import os
+import struct
+import sys
+from src.resources import ResourceColumns
+from config import SCAN_DATA_DIR
+
+# Compact scan file (*.scan) layout:
+#   [gzip member per (region, resource type) segment] ... [gzip member: index] [8-byte footer]
+# The footer is the big-endian byte offset of the index member. The index holds the
+# top-level scan fields (scan_time, summary, ...) and, per segment, its region,
+# resource type, offset, length and record count, so a reader can seek straight to
+# the slice it needs. Each segment is columnar JSON:
+#   {'count': n, 'columns': {key: [value per record]}, 'absent': {key: [record indexes]}}
+# 'absent' lists records that lack a key, which keeps the round trip lossless.
+
+# Delta scan file (*.delta, written by the archive compaction in src/archive.py): one gzip
+# JSON document holding the scan's top-level fields and, per (region, resource type), the
+# records added or changed against a base scan file in the same directory, the ids removed,
+# and, only when reconstruction would not reproduce it, the full id order:
+#   {'version': 1, 'base': file name, 'header': {...},
+#    'segments': {region: {resource_type: {'upsert': segment, 'removed': [ids], 'order': [ids]}}}}
+# Resource types without an id field (or with duplicate ids) are stored whole as 'records'.
+
+SCAN_FORMAT_VERSION = 1
+COMPACT_EXTENSION = '.scan'
+DELTA_EXTENSION = '.delta'
+_FOOTER = struct.Struct('>Q')
+
+# Resource id field per resource type, used to diff scans
+ID_FIELDS = {'ec2_instances': 'instance_id', 'ebs_volumes': 'volume_id', 'rds_instances': 'db_identifier'}
+
+
+def _encode(obj):
+    return gzip.compress(json.dumps(obj, separators=(',', ':')).encode('utf-8'), compresslevel=6)
+
+
+def _decode(blob):
+    return json.loads(gzip.decompress(blob).decode('utf-8'))
+
+
+def to_columns(records):
+    """Turn a list of dicts into the columnar segment layout"""
+    keys = []
+    for record in records:
+        for key in record:
+            if key not in keys:
+                keys.append(key)
+
+    columns = {key: [] for key in keys}
+    absent = {}
+    for index, record in enumerate(records):
+        for key in keys:
+            if key in record:
+                columns[key].append(record[key])
+            else:
+                columns[key].append(None)
+                absent.setdefault(key, []).append(index)
+
+    return {'count': len(records), 'columns': columns, 'absent': absent}
+
+
+def from_columns(segment):
+    """Inverse of to_columns"""
+    columns = segment['columns']
+    absent = {key: set(indexes) for key, indexes in segment.get('absent', {}).items()}
+    records = []
+    for index in range(segment['count']):
+        records.append({
+            key: values[index] for key, values in columns.items()
+            if index not in absent.get(key, ())
+        })
+    return records
+
+
+def write_scan(results, path):
+    """Write a scan results dict as a compact segmented file"""
+    header = {key: value for key, value in results.items() if key != 'regions'}
+    segments = []
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, 'wb') as f:
+        for region, region_data in results.get('regions', {}).items():
+            for resource_type, records in region_data.items():
+                # The scanner's ResourceColumns already hold the segment layout
+                blob = _encode(records.segment() if isinstance(records, ResourceColumns) else to_columns(records))
+                segments.append({
+                    'region': region,
+                    'resource_type': resource_type,
+                    'offset': f.tell(),
+                    'length': len(blob),
+                    'count': len(records)
+                })
+                f.write(blob)
+
+        index_offset = f.tell()
+        f.write(_encode({'version': SCAN_FORMAT_VERSION, 'header': header, 'segments': segments}))
+        f.write(_FOOTER.pack(index_offset))
+
+    os.replace(tmp_path, path)
+    return path
+
+
+class ScanFile:
+    """Reader for compact scan files; reads only the index until segments are requested"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            f.seek(-_FOOTER.size, os.SEEK_END)
+            footer_offset = f.tell()
+            (index_offset,) = _FOOTER.unpack(f.read(_FOOTER.size))
+            f.seek(index_offset)
+            self.index = _decode(f.read(footer_offset - index_offset))
+
+        if self.index.get('version') != SCAN_FORMAT_VERSION:
+            raise ValueError(f"Unsupported scan file version in {path}: {self.index.get('version')}")
+
+    @property
+    def header(self):
+        return self.index['header']
+
+    def regions(self):
+        """Region names in scan order"""
+        return list(dict.fromkeys(segment['region'] for segment in self.index['segments']))
+
+    def counts(self):
+        """{region: {resource_type: record count}} without decompressing any segment"""
+        counts = {}
+        for segment in self.index['segments']:
+            counts.setdefault(segment['region'], {})[segment['resource_type']] = segment['count']
+        return counts
+
+    def load(self, regions=None, resource_types=None, columnar=False):
+        """Scan dict in the usual schema, limited to the given regions / resource types
+
+        With columnar=True each resource list is left as its columnar segment dict, which
+        CostAnalyzer (via ColumnTable) analyzes without building per-resource dicts.
+        """
+        results = dict(self.header)
+        results['regions'] = {}
+
+        with open(self.path, 'rb') as f:
+            for segment in self.index['segments']:
+                if regions is not None and segment['region'] not in regions:
+                    continue
+                region_data = results['regions'].setdefault(segment['region'], {})
+                if resource_types is not None and segment['resource_type'] not in resource_types:
+                    continue
+                f.seek(segment['offset'])
+                decoded = _decode(f.read(segment['length']))
+                region_data[segment['resource_type']] = decoded if columnar else from_columns(decoded)
+
+        return results
+
+
+def write_delta(results, base_results, base_name, path):
+    """Write results as a delta against base_results (stored in base_name, same directory)"""
+    segments = {}
+    for region, region_data in results.get('regions', {}).items():
+        base_region = base_results.get('regions', {}).get(region, {})
+        for resource_type, records in region_data.items():
+            segments.setdefault(region, {})[resource_type] = _diff_segment(
+                ID_FIELDS.get(resource_type), base_region.get(resource_type, []), records)
+
+    header = {key: value for key, value in results.items() if key != 'regions'}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_encode({'version': SCAN_FORMAT_VERSION, 'base': base_name, 'header': header, 'segments': segments}))
+    os.replace(tmp_path, path)
+    return path
+
+
+def _diff_segment(id_field, base_records, records):
+    ids = [record.get(id_field) for record in records] if id_field else None
+    if not ids or None in ids or len(set(ids)) != len(ids):
+        return {'records': to_columns(records)}
+
+    base = {record.get(id_field): record for record in base_records}
+    current = set(ids)
+    upsert = [record for record in records if base.get(record[id_field]) != record]
+    diff = {'upsert': to_columns(upsert), 'removed': [rid for rid in base if rid not in current]}
+    if _apply_segment(id_field, base_records, diff) != records:
+        diff['order'] = ids
+    return diff
+
+
+def _apply_segment(id_field, base_records, diff):
+    if 'records' in diff:
+        return from_columns(diff['records'])
+
+    removed = set(diff['removed'])
+    merged = {record.get(id_field): record for record in base_records if record.get(id_field) not in removed}
+    for record in from_columns(diff['upsert']):
+        merged[record[id_field]] = record
+    if 'order' in diff:
+        return [merged[rid] for rid in diff['order']]
+    return list(merged.values())
+
+
+def load_delta(path, regions=None, resource_types=None):
+    """Rebuild a scan from a delta file and its base"""
+    with open(path, 'rb') as f:
+        delta = _decode(f.read())
+    if delta.get('version') != SCAN_FORMAT_VERSION:
+        raise ValueError(f"Unsupported delta file version in {path}: {delta.get('version')}")
+
+    base = load_scan(os.path.join(os.path.dirname(path), delta['base']), regions, resource_types)
+    results = dict(delta['header'])
+    results['regions'] = {}
+    for region, region_segments in delta['segments'].items():
+        if regions is not None and region not in regions:
+            continue
+        base_region = base['regions'].get(region, {})
+        region_data = results['regions'][region] = {}
+        for resource_type, diff in region_segments.items():
+            if resource_types is None or resource_type in resource_types:
+                region_data[resource_type] = _apply_segment(ID_FIELDS.get(resource_type),
+                                                             base_region.get(resource_type, []), diff)
+    return results
+
+
+def load_scan(path, regions=None, resource_types=None):
+    """Load a scan file in any format (compact *.scan, *.delta or legacy *.json), optionally sliced"""
+    if path.endswith(COMPACT_EXTENSION):
+        return ScanFile(path).load(regions, resource_types)
+    if path.endswith(DELTA_EXTENSION):
+        return load_delta(path, regions, resource_types)
+
+    with open(path, 'r') as f:
+        results = json.load(f)
+
+    if regions is not None or resource_types is not None:
+        results['regions'] = {
+            region: {
+                resource_type: records for resource_type, records in region_data.items()
+                if resource_types is None or resource_type in resource_types
+            }
+            for region, region_data in results.get('regions', {}).items()
+            if regions is None or region in regions
+        }
+    return results
+
+
+def export_json(path, out_path=None):
+    """Convert a compact scan file to the legacy pretty-printed JSON document"""
+    out_path = out_path or path[:-len(COMPACT_EXTENSION)] + '.json'
+    with open(out_path, 'w') as f:
+        json.dump(load_scan(path), f, indent=2)
+    return out_path
+
+
+def list_scan_files(directory=SCAN_DATA_DIR):
+    """Scan files of every format, oldest first (file names carry the timestamp)"""
+    return sorted(glob.glob(f'{directory}/scan_*.json') + glob.glob(f'{directory}/scan_*{COMPACT_EXTENSION}') +
+                  glob.glob(f'{directory}/scan_*{DELTA_EXTENSION}'))
+
+
+def latest_scan_file(directory=SCAN_DATA_DIR):
+    """Newest scan file of either format, or None"""
+    scan_files = list_scan_files(directory)
+    return scan_files[-1] if scan_files else None
+
+
+if __name__ == '__main__':
+    # Usage: python -m src.storage export data/scans/scan_YYYYmmdd_HHMMSS.scan [out.json]
+    if len(sys.argv) >= 3 and sys.argv[1] == 'export':
+        print(f" Exported to: {export_json(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)}")
+    else:
+        print("Usage: python -m src.storage export <scan file> [out.json]")
@@ -33,12 +33,13 @@ async function loadDashboardData() {
 
 async function loadSavingsData() {
     try {
-        const response = await fetch('/api/latest-recommendations');
+        // Only the report totals are needed, not the recommendation list
+        const response = await fetch('/api/recommendations?limit=1&fields=resource_id');
         const data = await response.json();
 
         if (!data.error) {
-            document.getElementById('potential-savings').textContent =
-                `$${data.total_potential_savings.toFixed(2)}`;
+            const savings = data.report.total_potential_savings ?? data.report.potential_savings;
+            document.getElementById('potential-savings').textContent = `$${savings.toFixed(2)}`;
         }
     } catch (error) {
         console.error('Error loading savings:', error);
@@ -79,13 +80,20 @@ async function triggerManualScan() {
             method: 'POST'
         });
 
-        const result = await response.json();
+        const queued = await response.json();
+        if (!queued.success) {
+            showStatus(' Scan failed: ' + queued.error, 'error');
+            return;
+        }
+
+        const job = await waitForJob(queued.job_id, button);
 
-        if (result.success) {
+        if (job.status === 'succeeded') {
+            const result = job.result;
             showStatus(` Scan complete! Found ${result.recommendations_count} recommendations. Potential savings: $${result.potential_savings}/month`, 'success');
             loadDashboardData(); // Reload dashboard
         } else {
-            showStatus(' Scan failed: ' + result.error, 'error');
+            showStatus(' Scan failed: ' + job.error, 'error');
         }
     } catch (error) {
         showStatus(' Error: ' + error.message, 'error');
@@ -95,6 +103,24 @@ async function triggerManualScan() {
     }
 }
 
+async function waitForJob(jobId, button) {
+    // Poll the background job until it finishes, showing per-region progress on the button
+    while (true) {
+        const response = await fetch(`/api/jobs/${jobId}`);
+        const job = await response.json();
+
+        if (job.status === 'succeeded' || job.status === 'failed' || job.error) {
+            return job;
+        }
+
+        const progress = job.progress;
+        button.textContent = progress.regions_total === null
+            ? ' Scanning...'
+            : ` Scanning... ${progress.regions_done}/${progress.regions_total} regions`;
+        await new Promise(resolve => setTimeout(resolve, 2000));
+    }
+}
+
 function showStatus(message, type) {
     const statusDiv = document.getElementById('status-message');
     statusDiv.textContent = message;
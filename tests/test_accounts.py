@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from botocore.exceptions import ClientError
+from benchmarks.fake_aws import FakeAWS
+from src.accounts import AccountRegistry, AssumedRole
+from src.clients import client_pool
+from src.executor import RemediationExecutor
+from src.ratelimit import RateLimiter
+from src.scanner import AWSResourceScanner
+from config import AWS_REGIONS
+
+AMBIENT = '111111111111'
+MEMBER = '222222222222'
+MISSING = '333333333333'
+
+
+def role_arn(account_id):
+    return f'arn:aws:iam::{account_id}:role/CostOptimizer'
+
+
+class TestAccounts(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [1_700_000_000.0]
+        self.fake = FakeAWS(AWS_REGIONS[:2], instances=40, accounts=[MEMBER], limiter=RateLimiter(enabled=False),
+                            clock=lambda: self.now[0])
+        client_pool.use_factory(self.fake.client)
+        self.addCleanup(client_pool.use_factory, None)
+
+    def test_credentials_are_cached_and_refreshed_before_expiry(self):
+        """AssumeRole runs once per credential lifetime, again inside the refresh margin"""
+        role = AssumedRole(role_arn(MEMBER), sts=lambda: self.fake.client('sts', AWS_REGIONS[0]), duration=3600,
+                           refresh_margin=900, clock=lambda: self.now[0])
+        first = role.get()
+        self.now[0] += 2000
+        self.assertEqual(role.get(), first)
+        self.assertEqual(role.refreshes, 1)
+
+        # A client built with the role keeps working past the first credentials' expiry
+        ec2 = self.fake.client('ec2', AWS_REGIONS[0], credentials=role.get)
+        self.now[0] += 2000
+        ec2.stop_instances(InstanceIds=['i-0102000001'])
+        self.assertEqual(role.refreshes, 2)
+        self.assertNotEqual(role.get()['access_key'], first['access_key'])
+        self.assertEqual(self.fake.calls['sts', 'AssumeRole'], 2)
+
+        with self.assertRaises(ClientError):
+            AssumedRole(role_arn(MISSING), sts=lambda: self.fake.client('sts', AWS_REGIONS[0])).get()
+
+    @patch.object(AWSResourceScanner, 'save_results')
+    def test_scan_fans_out_over_accounts(self, _save):
+        """Every (account, region) is scanned with the account's credentials; a refused role fails only its scopes"""
+        registry = AccountRegistry(role_arns=[role_arn(MEMBER), role_arn(MISSING)], ambient_account_id=AMBIENT,
+                                   clock=lambda: self.now[0])
+        with patch.object(client_pool, 'accounts', registry), patch('src.scanner.account_registry', registry):
+            results = AWSResourceScanner(regions=AWS_REGIONS[:2], utilization_sketches=False).scan_all_regions()
+
+        self.assertEqual(results['summary']['total_ec2_instances'], 40)
+        instances = [instance for region_data in results['regions'].values()
+                     for instance in region_data['ec2_instances']]
+        self.assertEqual({instance['account_id'] for instance in instances}, {MEMBER})
+        self.assertEqual(results['accounts'][MEMBER]['role_arn'], role_arn(MEMBER))
+        self.assertEqual(results['accounts'][MEMBER]['regions'], AWS_REGIONS[:2])
+        self.assertEqual(results['accounts'][MEMBER]['ec2_instances'], 40)
+        failed = set(results['region_errors']) | set(results['scan_errors'])
+        self.assertEqual(failed, {f'{MISSING}/{region}' for region in AWS_REGIONS[:2]})
+
+    def test_executor_acts_in_the_recommendation_account(self):
+        """Recommendations are executed with their own account's client; unknown accounts are refused"""
+        registry = AccountRegistry(role_arns=[role_arn(MEMBER)], ambient_account_id=AMBIENT)
+        rec = {'resource_type': 'EC2', 'resource_id': 'i-1', 'region': AWS_REGIONS[0], 'action': 'STOP',
+               'account_id': MEMBER}
+        ec2 = MagicMock()
+        ec2.stop_instances.return_value = {'StoppingInstances': [{'InstanceId': 'i-1'}]}
+        executor = RemediationExecutor(pricing=MagicMock(), dry_run=False)
+        with patch('src.executor.account_registry', registry), \
+                patch('src.executor.get_client', return_value=ec2) as get_client:
+            actions = executor.execute_batch([rec, dict(rec, resource_id='i-2', account_id=MISSING)])
+
+        get_client.assert_called_once_with('ec2', AWS_REGIONS[0], MEMBER)
+        self.assertEqual([action['success'] for action in actions], [True, False])
+        self.assertIn(MISSING, actions[1]['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
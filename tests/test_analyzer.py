@@ -0,0 +1,76 @@
+import contextlib
+import io
+import unittest
+from benchmarks.bench_analyzer import synthetic_region
+from src.analyzer import CostAnalyzer, smaller_instance_types
+from src.resources import ResourceColumns
+from src.storage import to_columns
+
+
+class TestCostAnalyzer(unittest.TestCase):
+
+    def analyze(self, scan, columnar):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return CostAnalyzer(scan, columnar=columnar).analyze()
+
+    def test_columnar_matches_loop(self):
+        """The vectorized path produces exactly the per-dict path's output"""
+        scan = {'regions': {
+            'us-east-1': synthetic_region(2000, 500, idle_rate=0.1, seed=1),
+            'eu-west-1': synthetic_region(300, 100, idle_rate=0.3, seed=2),
+            'ap-southeast-1': {'ec2_instances': [], 'ebs_volumes': [], 'rds_instances': []},
+        }}
+        loop = self.analyze(scan, columnar=False)
+        columnar = self.analyze(scan, columnar=True)
+
+        self.assertGreater(len(loop['recommendations']), 0)
+        self.assertEqual(loop['recommendations'], columnar['recommendations'])
+        self.assertEqual(loop['total_potential_savings'], columnar['total_potential_savings'])
+
+    def test_columnar_segments(self):
+        """Columnar segments from a compact scan file analyze like the dicts they encode"""
+        region = synthetic_region(500, 200, idle_rate=0.2, seed=3)
+        segments = {key: to_columns(records) for key, records in region.items()}
+
+        loop = self.analyze({'regions': {'us-east-1': region}}, columnar=False)
+        columnar = self.analyze({'regions': {'us-east-1': segments}}, columnar=True)
+        self.assertEqual(loop['recommendations'], columnar['recommendations'])
+
+    def test_columnar_resource_columns(self):
+        """The scanner's ResourceColumns analyze like the dicts streamed into them"""
+        region = synthetic_region(800, 200, idle_rate=0.2, seed=4)
+        columns = {key: ResourceColumns(key, records) for key, records in region.items()}
+
+        loop = self.analyze({'regions': {'us-east-1': region}}, columnar=False)
+        columnar = self.analyze({'regions': {'us-east-1': columns}}, columnar=True)
+        self.assertGreater(len(columnar['recommendations']), 0)
+        self.assertEqual(loop['recommendations'], columnar['recommendations'])
+        self.assertEqual(loop['total_potential_savings'], columnar['total_potential_savings'])
+
+    def test_rightsizing(self):
+        """Busy-enough instances whose doubled p95 fits get a one-size-down recommendation"""
+        base = {'state': 'running', 'cpu_avg_7d': 12.0, 'tags': {}, 'platform': 'Linux/UNIX', 'tenancy': 'default'}
+        scan = {'regions': {'us-east-1': {
+            'ec2_instances': [
+                dict(base, instance_id='i-fits', type='t3.medium', cpu_p95=30.0, memory_p95=None),
+                dict(base, instance_id='i-hot', type='t3.medium', cpu_p95=40.0, memory_p95=None),
+                dict(base, instance_id='i-memory', type='t3.medium', cpu_p95=20.0, memory_p95=60.0),
+                dict(base, instance_id='i-nodata', type='t3.medium', cpu_p95=None),
+                dict(base, instance_id='i-smallest', type='t3.micro', cpu_p95=5.0, memory_p95=None),
+            ],
+            'ebs_volumes': [],
+        }}}
+
+        for columnar in (False, True):
+            recs = [rec for rec in self.analyze(scan, columnar)['recommendations'] if rec['type'] == 'EC2_RIGHTSIZE']
+            self.assertEqual([rec['resource_id'] for rec in recs], ['i-fits'])
+            self.assertEqual(recs[0]['target_type'], 't3.small')
+            self.assertEqual(recs[0]['recommendation'], 'Downsize from t3.medium → t3.small')
+            self.assertEqual(recs[0]['monthly_savings'], round((0.0416 - 0.0208) * 24 * 30, 2))
+
+        self.assertEqual(smaller_instance_types('m5.2xlarge')[0], ('m5.xlarge', 2.0))
+        self.assertEqual(smaller_instance_types('m5.metal'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from src import app as app_module
+from src.artifacts import LatestArtifact, notify_written
+from src.jobs import JobManager
+from src.scheduler import CostOptimizerScheduler
+
+
+class TestLatestEndpoints(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.rec_dir = self.tmp.name
+        patcher = patch.object(app_module, 'latest_recommendations', LatestArtifact(self.rec_dir))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+        self.client = app_module.app.test_client()
+
+    def write_report(self, name, recommendations):
+        with open(os.path.join(self.rec_dir, name), 'w') as f:
+            json.dump({'recommendations': recommendations}, f)
+        notify_written(self.rec_dir)
+
+    def test_missing_report_is_404(self):
+        self.assertEqual(self.client.get('/api/latest-recommendations').status_code, 404)
+
+    def test_etag_revalidation(self):
+        """Unchanged report answers 304; a newer report gets a new ETag"""
+        self.write_report('report_1.json', [{'resource_id': 'i-1'}])
+        first = self.client.get('/api/latest-recommendations')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.get_json()['recommendations'][0]['resource_id'], 'i-1')
+        self.assertIsNotNone(first.headers.get('Last-Modified'))
+
+        etag = first.headers['ETag']
+        cached = self.client.get('/api/latest-recommendations', headers={'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+
+        time.sleep(0.01)  # distinct ctime for the newer file
+        self.write_report('report_2.json', [{'resource_id': 'i-2'}])
+        fresh = self.client.get('/api/latest-recommendations', headers={'If-None-Match': etag})
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh.headers['ETag'], etag)
+        self.assertEqual(fresh.get_json()['recommendations'][0]['resource_id'], 'i-2')
+
+    def test_recommendations_query_api(self):
+        """/api/recommendations filters, pages and rejects bad input with 400"""
+        self.write_report('report_1.json', [
+            {'type': 'EC2_IDLE', 'severity': 'HIGH', 'region': 'us-east-1', 'resource_id': f'i-{n}',
+             'action': 'STOP', 'monthly_savings': float(n), 'details': {}}
+            for n in range(5)
+        ])
+        page = self.client.get('/api/recommendations?type=EC2_IDLE&sort=-monthly_savings&limit=2').get_json()
+        self.assertEqual([item['resource_id'] for item in page['items']], ['i-4', 'i-3'])
+        self.assertEqual(page['total'], 5)
+
+        second = self.client.get(f"/api/recommendations?type=EC2_IDLE&sort=-monthly_savings&limit=2"
+                                 f"&cursor={page['next_cursor']}").get_json()
+        self.assertEqual([item['resource_id'] for item in second['items']], ['i-2', 'i-1'])
+        self.assertEqual(self.client.get('/api/recommendations?sort=bogus').status_code, 400)
+
+    def test_manual_trigger_joins_running_daily_scan(self):
+        """A manual scan requested while the daily job runs gets the daily job back"""
+        manager = JobManager(max_concurrent=2)
+        self.addCleanup(manager.shutdown)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        scheduler = CostOptimizerScheduler()
+
+        with patch.object(app_module, 'job_manager', manager), patch('src.scheduler.job_manager', manager), \
+                patch.object(scheduler, 'daily_scan_and_optimize', lambda job: release.wait(5)):
+            daily = scheduler.enqueue_daily_scan()
+            response = self.client.post('/api/trigger-scan').get_json()
+
+        self.assertTrue(response['deduplicated'])
+        self.assertEqual(response['job_id'], daily.id)
+
+    def test_deduplicated_manual_trigger_gets_manual_result_shape(self):
+        """The daily job's result, seen by a manual trigger that joined it, has the fields the dashboard reads"""
+        manager = JobManager(max_concurrent=2)
+        self.addCleanup(manager.shutdown)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        scheduler = CostOptimizerScheduler()
+
+        class FakeShardRunner:
+            def __init__(self, **kwargs):
+                pass
+
+            def run(self, shards):
+                release.wait(5)
+                return {'scan': {'scan_time': '2025-03-01T02:00:00', 'summary': {'total_ec2_instances': 3}},
+                        'analysis': {'recommendations': [{'type': 'EC2_IDLE'}], 'total_potential_savings': 12.5},
+                        'shards': [], 'diff': None, 'baseline': None}
+
+        shards = [{'name': 'us-east-1', 'regions': ['us-east-1'], 'accounts': None}]
+        with patch.object(app_module, 'job_manager', manager), patch('src.scheduler.job_manager', manager), \
+                patch('src.scheduler.ShardRunner', FakeShardRunner), \
+                patch('src.scheduler.plan_shards', return_value=shards), \
+                patch('src.scheduler.MLRecommender') as recommender, \
+                patch('src.scheduler.RemediationExecutor') as executor, \
+                patch('src.scheduler.FileLease'), patch('src.scheduler.get_archive'), \
+                patch('src.scheduler.notify_written'), patch('src.scheduler.HISTORY_ENABLED', False), \
+                patch('src.scheduler.RECOMMENDATIONS_DIR', self.rec_dir):
+            recommender.return_value.generate_ml_recommendations.return_value = []
+            executor.return_value.execute_recommendations.return_value = []
+            scheduler.enqueue_daily_scan()
+            job_id = self.client.post('/api/trigger-scan').get_json()['job_id']
+            for _ in range(500):
+                progress = self.client.get(f'/api/jobs/{job_id}').get_json()['progress']
+                if progress['regions_total'] is not None:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(progress['regions_total'], 1)
+            release.set()
+            manager.shutdown()
+            job = self.client.get(f'/api/jobs/{job_id}').get_json()
+
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(set(job['result']), {'summary', 'recommendations_count', 'potential_savings', 'report_file'})
+        self.assertEqual(job['result']['recommendations_count'], 1)
+        self.assertEqual(job['result']['potential_savings'], 12.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from src.archive import Archive, load_report
+from src.storage import load_scan, write_scan
+
+
+def scan_at(day, hour=2, cpu=1.0):
+    return {
+        'scan_time': f'2024-{day}T{hour:02d}:00:00',
+        'regions': {'us-east-1': {
+            'ec2_instances': [{'instance_id': f'i-{n}', 'type': 't3.micro', 'cpu_avg_7d': cpu if n == 0 else 50.0}
+                              for n in range(20)],
+            'ebs_volumes': [], 'rds_instances': [],
+        }},
+    }
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = self.tmp.name
+        self.archive = Archive(self.dir, 'scan', full_days=7, retention_days=60)
+
+    def write(self, day, **kwargs):
+        name = f"scan_2024{day.replace('-', '')}_020000.scan"
+        path = write_scan(scan_at(day, **kwargs), os.path.join(self.dir, name))
+        self.archive.register(path)
+        return path
+
+    def test_latest_and_as_of(self):
+        """Lookups come from the manifest, which is rebuilt from file names when missing"""
+        for day in ('01-05', '01-03', '01-04'):
+            self.write(day)
+        self.assertTrue(self.archive.latest().endswith('scan_20240105_020000.scan'))
+        self.assertTrue(self.archive.as_of('2024-01-04T12:00:00').endswith('scan_20240104_020000.scan'))
+        self.assertTrue(self.archive.as_of(datetime(2024, 1, 4, 2)).endswith('scan_20240104_020000.scan'))
+        self.assertIsNone(self.archive.as_of('2024-01-01T00:00:00'))
+
+        os.remove(self.archive.path)
+        fresh = Archive(self.dir, 'scan')
+        self.assertEqual([entry['name'] for entry in fresh.entries()],
+                         ['scan_20240103_020000.scan', 'scan_20240104_020000.scan', 'scan_20240105_020000.scan'])
+
+    def test_compaction_and_retention(self):
+        """Old scans become deltas on their month's base; past retention only the bases remain"""
+        for day, cpu in (('01-01', 1.0), ('01-02', 2.0), ('01-03', 3.0), ('02-01', 4.0), ('02-02', 5.0),
+                         ('03-20', 6.0)):
+            self.write(day, cpu=cpu)
+        expected = {entry['name']: load_scan(path) for entry, path in zip(self.archive.entries(),
+                                                                         self.archive.paths())}
+
+        stats = self.archive.compact(now=datetime(2024, 2, 20))
+        entries = {entry['name']: entry for entry in self.archive.entries()}
+        self.assertEqual(stats['compacted'], 3)
+        self.assertEqual(entries['scan_20240102_020000.delta']['base'], 'scan_20240101_020000.scan')
+        self.assertEqual(entries['scan_20240201_020000.scan']['kind'], 'full')
+        self.assertEqual(load_scan(os.path.join(self.dir, 'scan_20240202_020000.delta')),
+                         expected['scan_20240202_020000.scan'])
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'scan_20240102_020000.scan')))
+
+        stats = self.archive.compact(now=datetime(2024, 3, 25))  # January is now past retention
+        self.assertEqual(stats['removed'], 2)
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         ['manifest.json', 'scan_20240101_020000.scan', 'scan_20240201_020000.scan',
+                          'scan_20240202_020000.delta', 'scan_20240320_020000.scan'])
+        self.assertTrue(self.archive.entries()[0]['rollup'])
+        self.assertTrue(self.archive.as_of('2024-01-03').endswith('scan_20240101_020000.scan'))
+
+    def test_reports_are_gzipped(self):
+        archive = Archive(self.dir, 'report', full_days=7, retention_days=365)
+        for day in ('01', '09'):
+            path = os.path.join(self.dir, f"report_202401{day}_020000.json")
+            with open(path, 'w') as f:
+                json.dump({'timestamp': day, 'recommendations': []}, f)
+            archive.register(path)
+
+        archive.compact(now=datetime(2024, 1, 10))
+        old = archive.as_of('2024-01-05')
+        self.assertTrue(old.endswith('.json.gz'))
+        with gzip.open(old, 'rt') as f:
+            self.assertEqual(json.load(f)['timestamp'], '01')
+        self.assertEqual(load_report(archive.latest())['timestamp'], '09')
+
+
+if __name__ == '__main__':
+    unittest.main()
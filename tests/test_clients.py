@@ -0,0 +1,48 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+from src.accounts import AccountRegistry
+from src.clients import ClientPool
+
+ROLE_ARN = 'arn:aws:iam::123456789012:role/CostOptimizer'
+
+
+class TestClientPool(unittest.TestCase):
+
+    def setUp(self):
+        sts = MagicMock()
+        sts.assume_role.return_value = {'Credentials': {
+            'AccessKeyId': 'AKIA', 'SecretAccessKey': 'secret', 'SessionToken': 'token',
+            'Expiration': datetime.now(timezone.utc) + timedelta(hours=1)}}
+        self.sts = sts
+        accounts = AccountRegistry(role_arns=[ROLE_ARN], ambient_account_id='111111111111', sts=lambda: sts)
+        self.pool = ClientPool(max_pool_connections=5, accounts=accounts)
+
+    def test_client_is_reused(self):
+        """Same service/region/account returns the cached client"""
+        first = self.pool.get_client('ec2', 'us-east-1')
+        self.assertIs(first, self.pool.get_client('ec2', 'us-east-1'))
+        self.assertIsNot(first, self.pool.get_client('ec2', 'eu-west-1'))
+        other = self.pool.get_client('ec2', 'us-east-1', account_id='123456789012')
+        self.assertIsNot(first, other)
+        self.assertIs(other, self.pool.get_client('ec2', 'us-east-1', account_id='123456789012'))
+        self.assertEqual(first.meta.config.max_pool_connections, 5)
+
+    def test_account_clients_use_assumed_role_credentials(self):
+        """An account's clients sign with its role's credentials; unknown accounts are refused"""
+        client = self.pool.get_client('s3', 'us-east-1', account_id='123456789012')
+        self.assertEqual(client._request_signer._credentials.get_frozen_credentials().access_key, 'AKIA')
+        self.assertEqual(self.sts.assume_role.call_args.kwargs['RoleArn'], ROLE_ARN)
+        with self.assertRaises(KeyError):
+            self.pool.get_client('s3', 'us-east-1', account_id='999999999999')
+
+    def test_concurrent_access_creates_one_client(self):
+        """Threads racing for the same key all get one client"""
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            clients = list(pool.map(lambda _: self.pool.get_client('rds', 'us-west-2'), range(32)))
+        self.assertEqual(len({id(client) for client in clients}), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import contextlib
+import copy
+import io
+import math
+import unittest
+from benchmarks.bench_analyzer import synthetic_region
+from src.analyzer import CostAnalyzer
+from src.diff import action_key, analyze_changes, completed_actions, diff_scans
+
+
+def rec_key(rec):
+    return rec['type'], rec['resource_id']
+
+
+class TestScanDiff(unittest.TestCase):
+
+    def setUp(self):
+        self.old = {'scan_time': 'old', 'regions': {'us-east-1': synthetic_region(300, 100, idle_rate=0.1, seed=4)}}
+        self.new = copy.deepcopy(self.old)
+        self.new['scan_time'] = 'new'
+        region = self.new['regions']['us-east-1']
+        instances = region['ec2_instances']
+        running = [instance for instance in instances if instance['state'] == 'running']
+        busy = [instance for instance in running if instance['cpu_avg_7d'] >= 10]
+
+        self.idle = busy[0]
+        self.idle.update(cpu_avg_7d=1.5, cpu_p50=1.5)                           # went idle
+        self.drifted = busy[1]
+        self.drifted['cpu_avg_7d'] = math.floor(self.drifted['cpu_avg_7d']) + 0.99  # same 1-point bucket
+        self.drifted['network_in_p95'] = 12345.0                                # not compared
+        self.detached = next(volume for volume in region['ebs_volumes'] if volume['state'] == 'in-use')
+        self.detached['state'] = 'available'                                    # newly detached
+        self.removed = instances.pop(-1)
+        instances.append(dict(self.idle, instance_id='i-new', cpu_avg_7d=50.0, cpu_p50=50.0))
+
+    def test_added_removed_changed(self):
+        """Only real changes are reported; metric drift inside a bucket is not one"""
+        diff = diff_scans(self.old, self.new)
+
+        self.assertEqual([key[3] for key in diff.added], ['i-new'])
+        self.assertEqual([key[3] for key in diff.removed], [self.removed['instance_id']])
+        self.assertEqual(sorted(key[3] for key in diff.changed),
+                         sorted([self.idle['instance_id'], self.detached['volume_id']]))
+        self.assertEqual(diff.unchanged, 300 + 100 - 1 - 2)
+
+        changes = {change['resource_id']: change for change in diff.summary()['changes']}
+        self.assertEqual(changes[self.detached['volume_id']]['fields'], {'state': ['in-use', 'available']})
+        self.assertEqual(sorted(changes[self.idle['instance_id']]['fields']), ['cpu_avg_7d', 'cpu_p50'])
+        self.assertEqual(diff_scans(self.old, self.new, metric_step=0).changed.keys() - diff.changed.keys(),
+                         {('ec2_instances', None, 'us-east-1', self.drifted['instance_id'])})
+
+    def test_incremental_analysis_matches_full_analysis(self):
+        """Analyzing the churn and re-checking previous recommendations gives the full analysis"""
+        running = [instance for instance in self.new['regions']['us-east-1']['ec2_instances']
+                   if instance['state'] == 'running' and instance['type'].startswith('t')]
+        # Inside one 3-point bucket, but across the idle threshold and the rightsizing
+        # threshold (p95 x 2 < 70)
+        going_idle, getting_busy = running[10], running[11]
+        old_instances = {instance['instance_id']: instance
+                         for instance in self.old['regions']['us-east-1']['ec2_instances']}
+        for instance, before, after in ((going_idle, {'cpu_avg_7d': 5.2}, {'cpu_avg_7d': 4.9}),
+                                        (getting_busy, {'cpu_p95': 34.8}, {'cpu_p95': 35.1})):
+            common = {'cpu_avg_7d': 40.0, 'cpu_p95': 10.0, 'memory_p95': None}
+            old_instances[instance['instance_id']].update(common, **before)
+            instance.update(common, **after)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            previous = CostAnalyzer(self.old).analyze()
+            full = CostAnalyzer(self.new).analyze()
+            diff = diff_scans(self.old, self.new, metric_step=3)
+            incremental = analyze_changes(self.new, diff, previous['recommendations'])
+
+        self.assertEqual(incremental['recommendations'], full['recommendations'])
+        self.assertEqual(incremental['total_potential_savings'], full['total_potential_savings'])
+        self.assertIn(('ec2_instances', None, 'us-east-1', going_idle['instance_id']), diff.changed)
+        self.assertIn(('ec2_instances', None, 'us-east-1', getting_busy['instance_id']), diff.changed)
+        self.assertLess(len(diff.changed_scan(self.new)['regions']['us-east-1']['ec2_instances']), 10)
+
+    def test_only_completed_actions_are_skipped(self):
+        """Actions that succeeded for real last run are not repeated; failed and dry-run ones are"""
+        stop = {'type': 'EC2_IDLE', 'region': 'us-east-1', 'resource_id': 'i-1', 'action': 'STOP'}
+        delete = {'type': 'EBS_UNATTACHED', 'region': 'us-east-1', 'resource_id': 'vol-1',
+                  'action': 'SNAPSHOT_DELETE'}
+        throttled = dict(stop, resource_id='i-2')
+        rehearsed = dict(stop, resource_id='i-3')
+        actions_taken = [
+            {'recommendation': stop, 'success': True, 'dry_run': False},
+            {'recommendation': delete, 'success': True, 'result': 'Snapshot snap-1 created, volume deleted'},
+            {'recommendation': throttled, 'success': False, 'dry_run': False, 'error': 'Throttling'},
+            {'recommendation': rehearsed, 'success': True, 'dry_run': True},
+            {'recommendation': dict(delete, resource_id='vol-2'), 'success': True,
+             'result': '[DRY RUN] Would snapshot and delete vol-2'},
+        ]
+
+        completed = completed_actions(actions_taken)
+        self.assertEqual(completed, {action_key(stop), action_key(delete)})
+        self.assertNotIn(action_key(dict(stop, action='RESIZE')), completed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+from botocore.exceptions import ClientError
+from src.executor import RemediationExecutor
+
+
+def stop_rec(region, instance_id):
+    return {'action': 'STOP', 'region': region, 'resource_id': instance_id, 'monthly_savings': 5.0}
+
+
+def stopping(ids):
+    return {'StoppingInstances': [{'InstanceId': i, 'CurrentState': {'Name': 'stopping'}} for i in ids]}
+
+
+class TestRemediationExecutor(unittest.TestCase):
+
+    def executor(self, **kwargs):
+        return RemediationExecutor(pricing=MagicMock(), **kwargs)
+
+    def test_stops_are_batched_per_region_and_reported_in_input_order(self):
+        clients = {}
+        lock = threading.Lock()
+
+        def client(service, region, account_id=None):
+            with lock:
+                if region not in clients:
+                    clients[region] = MagicMock()
+                    clients[region].stop_instances.side_effect = lambda InstanceIds: stopping(InstanceIds)
+                return clients[region]
+
+        recs = [stop_rec('us-east-1', 'i-1'), stop_rec('eu-west-1', 'i-2'), stop_rec('us-east-1', 'i-3'),
+                stop_rec('us-east-1', 'i-4'), stop_rec('eu-west-1', 'i-5')]
+        executor = self.executor(dry_run=False, batch_size=2)
+        with patch('src.executor.get_client', side_effect=client):
+            actions = executor.execute_batch(recs)
+
+        self.assertEqual([a['recommendation']['resource_id'] for a in actions], ['i-1', 'i-2', 'i-3', 'i-4', 'i-5'])
+        self.assertTrue(all(a['success'] for a in actions))
+        calls = [c.kwargs['InstanceIds'] for c in clients['us-east-1'].stop_instances.call_args_list]
+        self.assertEqual(calls, [['i-1', 'i-3'], ['i-4']])
+        calls = [c.kwargs['InstanceIds'] for c in clients['eu-west-1'].stop_instances.call_args_list]
+        self.assertEqual(calls, [['i-2', 'i-5']])
+
+    def test_failed_batch_falls_back_to_single_ids(self):
+        ec2 = MagicMock()
+
+        def stop(InstanceIds):
+            if 'i-bad' in InstanceIds:
+                raise ClientError({'Error': {'Code': 'InvalidInstanceID.NotFound', 'Message': 'i-bad'}},
+                                  'StopInstances')
+            return stopping(InstanceIds)
+
+        ec2.stop_instances.side_effect = stop
+        executor = self.executor(dry_run=False)
+        with patch('src.executor.get_client', return_value=ec2):
+            actions = executor.execute_batch([stop_rec('us-east-1', i) for i in ('i-1', 'i-bad', 'i-2')])
+
+        self.assertEqual([a['success'] for a in actions], [True, False, True])
+        self.assertIn('NotFound', actions[1]['error'])
+        self.assertEqual(ec2.stop_instances.call_count, 4)
+
+    def test_throttled_batch_is_not_split(self):
+        """Errors not tied to an ID fail the whole chunk without one call per ID"""
+        ec2 = MagicMock()
+        ec2.stop_instances.side_effect = ClientError({'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'}},
+                                                     'StopInstances')
+        executor = self.executor(dry_run=False)
+        with patch('src.executor.get_client', return_value=ec2):
+            actions = executor.execute_batch([stop_rec('us-east-1', f'i-{n}') for n in range(5)])
+
+        self.assertEqual([a['success'] for a in actions], [False] * 5)
+        self.assertTrue(all('Rate exceeded' in a['error'] for a in actions))
+        self.assertEqual(ec2.stop_instances.call_count, 1)
+
+    def test_dry_run_groups_the_same_way_without_calls(self):
+        recs = [stop_rec('us-east-1', 'i-1'), stop_rec('us-west-2', 'i-2'),
+                {'action': 'SNAPSHOT_DELETE', 'region': 'us-east-1', 'resource_id': 'vol-1', 'monthly_savings': 1.0},
+                {'action': 'RESIZE', 'region': 'us-east-1', 'resource_id': 'i-3', 'monthly_savings': 1.0}]
+        executor = self.executor(dry_run=True)
+        with patch('src.executor.get_client') as get_client:
+            actions = executor.execute_recommendations(recs)
+
+        get_client.assert_not_called()
+        self.assertEqual(len(actions), 4)
+        self.assertEqual(actions[0]['result'], '[DRY RUN] Would stop instance i-1')
+        self.assertIn('Would snapshot and delete volume vol-1', actions[2]['result'])
+        self.assertEqual(actions[3]['result'], 'Unknown action: RESIZE')
+
+
+if __name__ == '__main__':
+    unittest.main()
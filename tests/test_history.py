@@ -0,0 +1,79 @@
+import unittest
+from datetime import date, timedelta
+from unittest.mock import MagicMock, patch
+from src import app as app_module
+from src.history import HistoryStore
+
+
+def scan(day, instances=2, cpu=3.0):
+    return {
+        'scan_time': f"{day}T02:00:00",
+        'regions': {'us-east-1': {
+            'ec2_instances': [{'instance_id': f'i-{n}', 'type': 't3.micro', 'state': 'running', 'cpu_avg_7d': cpu,
+                               'cpu_p95': cpu * 2} for n in range(instances)],
+            'ebs_volumes': [{'volume_id': 'vol-1', 'size_gb': 100, 'state': 'available', 'attached': False,
+                             'volume_type': 'gp3'}],
+            'rds_instances': [],
+        }},
+    }
+
+
+class TestHistoryStore(unittest.TestCase):
+
+    def setUp(self):
+        pricing = MagicMock()
+        pricing.ec2_hourly.return_value = 0.01
+        pricing.ebs_gb_month.return_value = 0.1
+        self.store = HistoryStore(':memory:', daily_days=30, weekly_days=365, pricing=pricing)
+        self.addCleanup(self.store.close)
+
+    def test_scan_aggregates_and_same_day_replace(self):
+        self.store.record_scan(scan('2025-03-01', instances=2))
+        self.store.record_scan(scan('2025-03-01', instances=3))
+
+        points = self.store.cost_trend(days=10, today='2025-03-02')
+        self.assertEqual(len(points), 1)
+        self.assertEqual((points[0]['bucket'], points[0]['resolution']), ('2025-03-01', 'day'))
+        self.assertEqual((points[0]['ec2_total'], points[0]['ec2_idle'], points[0]['ebs_unattached']), (3, 3, 1))
+        self.assertEqual(points[0]['monthly_cost'], round(3 * 0.01 * 720 + 10.0, 2))
+
+    def test_idle_count_follows_configured_threshold(self):
+        with patch('src.history.IDLE_CPU_THRESHOLD', 10.0):
+            self.store.record_scan(scan('2025-03-01', instances=2, cpu=7.0))
+
+        self.assertEqual(self.store.cost_trend(days=10, today='2025-03-02')[0]['ec2_idle'], 2)
+
+    def test_old_days_roll_up_into_weighted_weeks(self):
+        start = date(2025, 1, 6)  # a Monday
+        for offset in range(60):
+            day = (start + timedelta(days=offset)).isoformat()
+            self.store.record_scan(scan(day, instances=2 if offset < 3 else 4, cpu=float(offset)))
+            self.store.record_report({'timestamp': f"{day}T03:00:00",
+                                      'recommendations': [{'type': 'EC2_IDLE', 'monthly_savings': 5.0}]})
+
+        points = self.store.cost_trend(days=365, today=start + timedelta(days=59))
+        first_week = points[0]
+        self.assertEqual((first_week['bucket'], first_week['resolution']), ('2025-01-06', 'week'))
+        self.assertAlmostEqual(first_week['ec2_total'], (3 * 2 + 4 * 4) / 7, places=2)
+        self.assertEqual(points[-1]['resolution'], 'day')
+        self.assertEqual(sum(1 for point in points if point['resolution'] == 'day'), 31)
+
+        history = self.store.resource_trend('i-0', days=365, today=start + timedelta(days=59))
+        self.assertAlmostEqual(history[0]['cpu_avg'], 3.0)  # mean of days 0..6
+        savings = self.store.savings_trend(days=365, rec_type='EC2_IDLE', today=start + timedelta(days=59))
+        self.assertEqual({point['monthly_savings'] for point in savings}, {5.0})
+
+    def test_trend_api(self):
+        self.store.record_scan(scan(date.today().isoformat()))
+        client = app_module.app.test_client()
+        with patch.object(app_module, 'get_history_store', return_value=self.store):
+            response = client.get('/api/trends/cost?days=7&region=us-east-1')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()['points'][0]['ec2_total'], 2)
+            self.assertEqual(client.get('/api/trends/cost?days=0').status_code, 400)
+            resource = client.get('/api/trends/resources/vol-1').get_json()
+            self.assertEqual(resource['points'][0]['resource_type'], 'ebs')
+
+
+if __name__ == '__main__':
+    unittest.main()
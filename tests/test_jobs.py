@@ -0,0 +1,55 @@
+import threading
+import time
+import unittest
+from src.jobs import JobManager
+
+
+class TestJobManager(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = JobManager(max_concurrent=1, history_size=10)
+        self.addCleanup(self.manager.shutdown)
+
+    def test_overlapping_submits_share_one_job(self):
+        """A second trigger while the first is running gets the same job back"""
+        release = threading.Event()
+
+        def body(job):
+            job.region_progress('us-east-1', 'done', elapsed=0.1)
+            release.wait(5)
+            return {'ok': True}
+
+        first, first_dedup = self.manager.submit('manual_scan', body, dedup_key='scan')
+        second, second_dedup = self.manager.submit('manual_scan', body, dedup_key='scan')
+        self.assertFalse(first_dedup)
+        self.assertTrue(second_dedup)
+        self.assertIs(first, second)
+
+        release.set()
+        self.manager.shutdown()
+        status = first.to_dict()
+        self.assertEqual(status['status'], 'succeeded')
+        self.assertEqual(status['result'], {'ok': True})
+        self.assertEqual(status['progress']['regions_done'], 1)
+
+    def test_failed_job_records_error(self):
+        """Exceptions mark the job failed and free the dedup key"""
+        def body(job):
+            raise RuntimeError('no credentials')
+
+        job, _ = self.manager.submit('manual_scan', body, dedup_key='scan')
+        for _ in range(500):
+            if job.finished_at:
+                break
+            time.sleep(0.01)
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.error, 'no credentials')
+        self.assertIs(self.manager.get(job.id), job)
+
+        retry, deduplicated = self.manager.submit('manual_scan', lambda job: None, dedup_key='scan')
+        self.assertFalse(deduplicated)
+        self.assertIsNot(retry, job)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+import subprocess
+import sys
+import unittest
+from src.lazy import LazyModule, lazy_import
+
+HEAVY = ('numpy', 'sklearn', 'boto3', 'botocore')
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def test_lazy_module_loads_on_first_access(self):
+        self.assertIs(lazy_import('json'), sys.modules['json'])
+        module = LazyModule('colorsys')
+        self.assertEqual(module.rgb_to_hsv(1, 0, 0), (0.0, 1.0, 1.0))
+        self.assertIn('hls_to_rgb', module.__dict__)  # later lookups skip __getattr__
+
+    def test_entry_points_do_not_import_heavy_dependencies(self):
+        """Importing the dashboard, scheduler and scanner loads neither NumPy/scikit-learn nor boto3"""
+        for module in ('src.app', 'src.scheduler', 'src.scanner'):
+            probe = (f"import sys; import {module}; "
+                     f"print('loaded:' + ','.join(p for p in {HEAVY!r} if p in sys.modules))")
+            completed = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True)
+            self.assertEqual(completed.stdout.splitlines()[-1], 'loaded:', module)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import json
+import os
+import tempfile
+import unittest
+from src.leases import FileLease, LeaseHeld
+
+
+class TestFileLease(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.now = [1000.0]
+
+    def lease(self, owner):
+        return FileLease('shard-us-east-1', directory=self.tmp.name, ttl=60, owner=owner, clock=lambda: self.now[0])
+
+    def test_exclusive_until_released(self):
+        first, second = self.lease('a'), self.lease('b')
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        self.assertEqual(second.holder()['owner'], 'a')
+
+        with self.assertRaises(LeaseHeld):
+            with second.hold():
+                pass
+
+        first.release()
+        with second.hold():
+            self.assertFalse(first.acquire())
+        self.assertTrue(first.acquire())
+
+    def test_expired_lease_is_broken_and_renewal_is_guarded(self):
+        """A dead holder's lease is taken over after ttl; the old holder can then no longer renew it"""
+        first, second = self.lease('a'), self.lease('b')
+        self.assertTrue(first.acquire())
+        self.now[0] += 30
+        self.assertTrue(first.renew())
+        self.now[0] += 59
+        self.assertFalse(second.acquire())  # renewal pushed the expiry out
+
+        self.now[0] += 2
+        self.assertTrue(second.acquire())
+        self.assertFalse(first.renew())
+        first.release()  # not ours any more: must not remove it
+        with open(second.path) as f:
+            self.assertEqual(json.load(f)['owner'], 'b')
+        self.assertEqual([name for name in os.listdir(self.tmp.name)], ['shard-us-east-1.lease'])
+
+
+if __name__ == '__main__':
+    unittest.main()
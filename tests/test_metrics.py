@@ -0,0 +1,55 @@
+import unittest
+from unittest.mock import patch
+from src import app as app_module
+from src.metrics import NULL_RUN, NULL_TIMER, Metrics, metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_timers_counters_and_prometheus_text(self):
+        registry = Metrics(enabled=True)
+        with registry.timer('stage', stage='analyze'):
+            pass
+        with self.assertRaises(ValueError):
+            with registry.timer('stage', stage='analyze'):
+                raise ValueError('boom')
+        registry.inc('bytes_written', 512, artifact='scan')
+        registry.inc('bytes_written', 512, artifact='scan')
+
+        text = registry.render()
+        self.assertIn('# TYPE costopt_stage_seconds summary', text)
+        self.assertIn('costopt_stage_seconds_count{stage="analyze"} 2', text)
+        self.assertIn('costopt_stage_errors_total{stage="analyze"} 1', text)
+        self.assertIn('costopt_bytes_written_total{artifact="scan"} 1024', text)
+
+    def test_run_report_holds_only_its_own_deltas(self):
+        registry = Metrics(enabled=True)
+        registry.inc('resources_scanned', 5, region='us-east-1')
+        with registry.run('scan') as run:
+            registry.inc('resources_scanned', 3, region='us-east-1')
+            registry.observe('scan_region', 0.5, region='us-east-1')
+
+        self.assertEqual(run.report['kind'], 'scan')
+        self.assertEqual(run.report['counters'], {'resources_scanned{region="us-east-1"}': 3})
+        self.assertEqual(run.report['timings'], {'scan_region{region="us-east-1"}': {'count': 1, 'seconds': 0.5}})
+
+    def test_disabled_registry_is_inert(self):
+        registry = Metrics(enabled=False)
+        self.assertIs(registry.timer('stage', stage='scan'), NULL_TIMER)
+        self.assertIs(registry.run('scan'), NULL_RUN)
+        registry.inc('bytes_written', 10)
+        self.assertEqual(registry.snapshot(), {'counters': {}, 'timings': {}, 'gauges': {}})
+
+    def test_metrics_endpoint(self):
+        registry = Metrics(enabled=True)
+        registry.inc('actions', action='STOP', success=True, dry_run=True)
+        with patch.object(app_module, 'metrics', registry):
+            response = app_module.app.test_client().get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertIn('costopt_actions_total{action="STOP",dry_run="True",success="True"} 1', response.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
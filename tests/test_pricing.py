@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+from src.pricing import PricingEngine, compile_index
+
+OFFER_CSV = '''"FormatVersion","v1.0"
+"Disclaimer","This pricing list is for informational purposes only."
+"Publication Date","2024-01-01T00:00:00Z"
+"Version","20240101000000"
+"OfferCode","AmazonEC2"
+"SKU","OfferTermCode","RateCode","TermType","PriceDescription","EffectiveDate","StartingRange","EndingRange","Unit","PricePerUnit","Currency","Product Family","Instance Type","Tenancy","Operating System","License Model","Pre Installed S/W","CapacityStatus","Volume API Name","Region Code"
+"A1","JRTCKXETXF","A1.1","OnDemand","t3.medium","2024-01-01","0","Inf","Hrs","0.0416","USD","Compute Instance","t3.medium","Shared","Linux","No License required","NA","Used","","us-east-1"
+"A2","JRTCKXETXF","A2.1","OnDemand","t3.medium","2024-01-01","0","Inf","Hrs","0.0448","USD","Compute Instance","t3.medium","Shared","Linux","No License required","NA","Used","","eu-west-1"
+"A3","JRTCKXETXF","A3.1","OnDemand","t3.medium win","2024-01-01","0","Inf","Hrs","0.0600","USD","Compute Instance","t3.medium","Shared","Windows","No License required","NA","Used","","us-east-1"
+"A4","JRTCKXETXF","A4.1","OnDemand","reserved cap","2024-01-01","0","Inf","Hrs","0.0000","USD","Compute Instance","t3.medium","Shared","Linux","No License required","NA","AllocatedCapacityReservation","","us-east-1"
+"A5","4NA7Y494T4","A5.1","Reserved","1yr","2024-01-01","0","Inf","Hrs","0.0260","USD","Compute Instance","t3.medium","Shared","Linux","No License required","NA","Used","","us-east-1"
+"B1","JRTCKXETXF","B1.1","OnDemand","gp3","2024-01-01","0","Inf","GB-Mo","0.08","USD","Storage","","","","","","","gp3","us-east-1"
+'''
+
+
+class TestPricing(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        offer = os.path.join(self.tmp.name, 'AmazonEC2.csv')
+        with open(offer, 'w') as f:
+            f.write(OFFER_CSV)
+        self.index_path = os.path.join(self.tmp.name, 'price_index.bin')
+        self.assertEqual(compile_index([offer], self.index_path), 4)
+        self.engine = PricingEngine(self.index_path)
+
+    def test_indexed_lookups(self):
+        """On-demand prices are found by region, type, OS and tenancy"""
+        self.assertEqual(self.engine.ec2_hourly('us-east-1', 't3.medium'), 0.0416)
+        self.assertEqual(self.engine.ec2_hourly('eu-west-1', 't3.medium', 'Linux/UNIX', 'default'), 0.0448)
+        self.assertEqual(self.engine.ec2_hourly('us-east-1', 't3.medium', 'Windows'), 0.06)
+        self.assertEqual(self.engine.ebs_gb_month('us-east-1', 'gp3'), 0.08)
+
+    def test_fallback_to_config(self):
+        """Unknown keys and a missing index fall back to the config tables"""
+        self.assertEqual(self.engine.ec2_hourly('us-east-1', 't3.micro'), 0.0104)
+        self.assertEqual(self.engine.ec2_hourly('us-east-1', 'x9.huge'), 0.05)
+        self.assertEqual(PricingEngine(os.path.join(self.tmp.name, 'missing.bin')).ebs_gb_month('us-east-1', 'gp3'),
+                         0.10)
+
+
+if __name__ == '__main__':
+    unittest.main()
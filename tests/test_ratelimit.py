@@ -0,0 +1,88 @@
+import os
+import unittest
+from unittest.mock import patch
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+from src.clients import ClientPool
+from src.ratelimit import RateLimiter, TokenBucket
+
+THROTTLED = (b'<Response><Errors><Error><Code>RequestLimitExceeded</Code><Message>Request limit exceeded.'
+             b'</Message></Error></Errors><RequestID>r</RequestID></Response>')
+REGIONS = (b'<DescribeRegionsResponse xmlns="http://ec2.amazonaws.com/doc/2016-11-15/">'
+           b'<requestId>r</requestId><regionInfo/></DescribeRegionsResponse>')
+
+
+class Raw:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_waits_once_burst_is_spent_and_adapts(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, burst=2, min_rate=1, max_rate=20, clock=clock)
+        self.assertEqual([bucket.acquire(), bucket.acquire()], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.acquire(), 0.1)
+        self.assertAlmostEqual(bucket.acquire(), 0.2)  # queued behind the previous reservation
+
+        bucket.on_throttle()
+        self.assertEqual(bucket.rate, 5)
+        for _ in range(300):
+            bucket.on_success()
+        self.assertEqual(bucket.rate, 20)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.dict(os.environ, {'AWS_ACCESS_KEY_ID': 'test', 'AWS_SECRET_ACCESS_KEY': 'test'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def client(self, limiter, statuses):
+        """EC2 client whose responses follow `statuses` (503 = throttled, 200 = ok)"""
+        client = ClientPool(limiter=limiter).get_client('ec2', 'us-east-1')
+        responses = iter(statuses)
+
+        def send(request, **kwargs):
+            status = next(responses)
+            return AWSResponse(request.url, status, {}, Raw(REGIONS if status == 200 else THROTTLED))
+
+        client.meta.events.register('before-send', send)
+        return client
+
+    def test_throttled_calls_are_retried_and_counted(self):
+        limiter = RateLimiter(enabled=True, rate=10, max_attempts=5, rng=lambda: 0.0)
+        client = self.client(limiter, [503, 503, 200])
+        client.describe_regions()
+
+        counters = limiter.counters()['ec2/us-east-1/DescribeRegions']
+        self.assertEqual((counters['attempts'], counters['throttled'], counters['retries'], counters['failed']),
+                         (3, 2, 2, 0))
+        self.assertLess(counters['rate'], 10)
+
+    def test_exhausted_retries_raise_instead_of_returning_nothing(self):
+        limiter = RateLimiter(enabled=True, max_attempts=5, retry_budget=1, rng=lambda: 0.0)
+        client = self.client(limiter, [503] * 5)
+        with self.assertRaises(ClientError) as raised:
+            client.describe_regions()
+
+        self.assertEqual(raised.exception.response['Error']['Code'], 'RequestLimitExceeded')
+        totals = limiter.totals()
+        self.assertEqual((totals['attempts'], totals['retries'], totals['budget_exhausted']), (2, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
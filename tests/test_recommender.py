@@ -0,0 +1,60 @@
+import contextlib
+import io
+import os
+import random
+import tempfile
+import unittest
+from src.recommender import MLRecommender
+
+
+def fleet(seed):
+    rng = random.Random(seed)
+    instances = []
+    for n in range(300):
+        busy = n % 3
+        instances.append({
+            'instance_id': f'i-{n}',
+            'type': 't3.medium',
+            'state': 'running' if n % 10 else 'stopped',
+            'launch_time': f'2024-0{1 + busy}-01T00:00:00+00:00',
+            'cpu_avg_7d': round([rng.uniform(0, 4), rng.uniform(40, 60), rng.uniform(80, 95)][busy], 2),
+        })
+    return {'regions': {'us-east-1': {'ec2_instances': instances}}}
+
+
+class TestMLRecommender(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.model_path = os.path.join(self.tmp.name, 'model.pkl')
+
+    def run_recommender(self, scan):
+        recommender = MLRecommender(model_path=self.model_path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return recommender, recommender.generate_ml_recommendations(scan)
+
+    def test_model_persists_and_updates_incrementally(self):
+        """Second run loads the artifact, does one more partial fit and keeps clusters stable"""
+        first, first_recs = self.run_recommender(fleet(1))
+        self.assertTrue(os.path.exists(self.model_path))
+        self.assertEqual(first.runs, 1)
+
+        second, second_recs = self.run_recommender(fleet(2))
+        self.assertEqual(second.runs, 2)
+        self.assertEqual(second.samples_seen, 2 * 270)
+
+        # Only the idle third of the running fleet is flagged, under the same cluster id both days
+        self.assertEqual(len(first_recs), 90)
+        self.assertEqual({rec['resource_id'] for rec in first_recs}, {rec['resource_id'] for rec in second_recs})
+        self.assertEqual({rec['cluster'] for rec in first_recs}, {rec['cluster'] for rec in second_recs})
+        self.assertEqual(first_recs[0]['target_type'], 't3.small')
+
+    def test_not_enough_data(self):
+        _, recs = self.run_recommender({'regions': {'us-east-1': {'ec2_instances': []}}})
+        self.assertEqual(recs, [])
+        self.assertFalse(os.path.exists(self.model_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
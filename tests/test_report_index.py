@@ -0,0 +1,91 @@
+import unittest
+from src.report_index import InvalidQuery, RecommendationIndex
+
+
+def sample_report():
+    recommendations = []
+    for n in range(25):
+        recommendations.append({
+            'type': 'EC2_IDLE' if n % 2 else 'EBS_UNATTACHED',
+            'severity': 'HIGH' if n % 2 else 'MEDIUM',
+            'region': 'us-east-1' if n < 20 else 'eu-west-1',
+            'resource_id': f'r-{n}',
+            'action': 'STOP' if n % 2 else 'SNAPSHOT_DELETE',
+            'monthly_savings': float(n),
+            'details': {'id': n}
+        })
+    return {'timestamp': '2024-01-01T02:00:00', 'potential_savings': 300.0, 'recommendations': recommendations}
+
+
+class TestRecommendationIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = RecommendationIndex(sample_report(), report_id='abc')
+
+    def test_filter_sort_and_paginate(self):
+        """Cursor pages walk the filtered set in savings order without repeats"""
+        filters = {'type': ['EC2_IDLE'], 'region': ['us-east-1']}
+        seen = []
+        cursor = None
+        while True:
+            page = self.index.query(filters=filters, sort='-monthly_savings', cursor=cursor, limit=4)
+            self.assertEqual(page['total'], 10)
+            seen.extend(item['resource_id'] for item in page['items'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(seen, [f'r-{n}' for n in range(19, 0, -2)])
+
+    def test_filtered_pages_match_a_full_scan(self):
+        """Merged and intersected posting lists page through the same records as filtering the report"""
+        recommendations = sample_report()['recommendations']
+        cases = [{'region': ['eu-west-1']}, {'type': ['EC2_IDLE', 'EBS_UNATTACHED'], 'region': ['eu-west-1']},
+                 {'severity': ['HIGH'], 'action': ['STOP', 'NONE'], 'region': ['us-east-1', 'eu-west-1']},
+                 {'type': ['EC2_IDLE'], 'action': ['SNAPSHOT_DELETE']}, {'type': []}]
+        for filters in cases:
+            for sort, reverse in ((None, False), ('monthly_savings', False), ('-monthly_savings', True)):
+                expected = [rec['resource_id'] for rec in sorted(recommendations, key=lambda rec: rec['monthly_savings'],
+                                                                 reverse=reverse)
+                            if all(rec[field] in values for field, values in filters.items())]
+                seen = []
+                cursor = None
+                while True:
+                    page = self.index.query(filters=filters, sort=sort, cursor=cursor, limit=3)
+                    self.assertEqual(page['total'], len(expected))
+                    seen.extend(item['resource_id'] for item in page['items'])
+                    cursor = page['next_cursor']
+                    if cursor is None:
+                        break
+                self.assertEqual(seen, expected, (filters, sort))
+
+    def test_projection(self):
+        """details are left out by default, kept with '*', and fields narrows the records"""
+        self.assertNotIn('details', self.index.query(limit=1)['items'][0])
+        self.assertIn('details', self.index.query(limit=1, fields=['*'])['items'][0])
+        self.assertEqual(self.index.query(limit=1, fields=['resource_id'])['items'], [{'resource_id': 'r-0'}])
+        self.assertEqual(self.index.query(limit=1)['report']['potential_savings'], 300.0)
+
+    def test_invalid_queries(self):
+        """Unknown fields, stale cursors and bad limits are rejected"""
+        with self.assertRaises(InvalidQuery):
+            self.index.query(filters={'owner': ['x']})
+        with self.assertRaises(InvalidQuery):
+            self.index.query(sort='cpu')
+        with self.assertRaises(InvalidQuery):
+            self.index.query(limit=0)
+
+        cursor = self.index.query(limit=2)['next_cursor']
+        newer = RecommendationIndex(sample_report(), report_id='def')
+        with self.assertRaises(InvalidQuery):
+            newer.query(limit=2, cursor=cursor)
+
+        # Well-formed cursors with a forged position
+        for rank in ('x', -1, True, 1.5, None):
+            with self.assertRaises(InvalidQuery):
+                self.index.query(sort='-monthly_savings', limit=2,
+                                 cursor=self.index.encode_cursor(rank, '-monthly_savings'))
+
+
+if __name__ == '__main__':
+    unittest.main()
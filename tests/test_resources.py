@@ -0,0 +1,90 @@
+import contextlib
+import io
+import json
+import os
+import pickle
+import tempfile
+import unittest
+from benchmarks.bench_analyzer import synthetic_region
+from src.analyzer import CostAnalyzer
+from src.resources import EBSVolume, EC2Instance, ResourceColumns, compact_scan, to_json
+from src.storage import load_scan, to_columns, write_scan
+from config import UTILIZATION_FIELDS
+
+
+class TestResources(unittest.TestCase):
+
+    def test_json_round_trip_is_lossless(self):
+        """A record serializes to exactly the dict it was built from, extra fields included"""
+        record = dict(synthetic_region(1, 0)['ec2_instances'][0], account_id='111111111111', custom=[1, {'a': 2}])
+        instance = EC2Instance(record)
+
+        self.assertEqual(instance, record)
+        self.assertEqual(json.dumps(instance, default=to_json), json.dumps(record))
+        self.assertEqual(json.loads(json.dumps(instance, default=to_json)), record)
+        self.assertEqual(pickle.loads(pickle.dumps(instance)), record)
+
+        # Absent fields stay absent; None stays None
+        self.assertNotIn('memory_p99', instance)
+        self.assertIsNone(instance.get('memory_p99'))
+        instance['memory_p99'] = None
+        self.assertIn('memory_p99', instance)
+        del instance['custom']
+        self.assertEqual(len(instance), len(record))
+
+    def test_utilization_fields_are_slots(self):
+        """Every percentile the scanner sets has a slot, none lands in the per-record dict"""
+        instance = EC2Instance(dict.fromkeys(UTILIZATION_FIELDS, 1.0), instance_id='i-1')
+        self.assertIsNone(instance._extra)
+
+    def test_strings_are_shared(self):
+        first = EBSVolume(volume_id='vol-1', state=''.join(['avail', 'able']), volume_type='gp3')
+        second = EBSVolume(volume_id='vol-2', state=''.join(['avail', 'able']), volume_type='gp3')
+        self.assertIs(first['state'], second['state'])
+
+    def test_scan_file_and_recommendations(self):
+        """Compact records store and load like dicts, and recommendations reference them"""
+        scan = {'scan_time': '2024-01-01T00:00:00', 'regions': {
+            'us-east-1': synthetic_region(200, 50, idle_rate=0.2, seed=5)}}
+        expected = json.loads(json.dumps(scan))
+        compact_scan(scan)
+        self.assertIsInstance(scan['regions']['us-east-1']['ec2_instances'][0], EC2Instance)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write_scan(scan, os.path.join(tmp, 'scan_20240101_000000.scan'))
+            self.assertEqual(load_scan(path), expected)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            recommendations = CostAnalyzer(scan).analyze()['recommendations']
+        instances = {id(instance) for instance in scan['regions']['us-east-1']['ec2_instances']}
+        idle = [rec for rec in recommendations if rec['type'] == 'EC2_IDLE']
+        self.assertGreater(len(idle), 0)
+        self.assertTrue(all(id(rec['details']) in instances for rec in idle))
+
+    def test_resource_columns(self):
+        """Columns give back the streamed records, absent fields and extra keys included"""
+        records = synthetic_region(50, 0, idle_rate=0.2, seed=7)['ec2_instances']
+        del records[3]['memory_p95']
+        records[5]['custom'] = [1, {'a': 2}]
+        columns = ResourceColumns('ec2_instances', iter(records))
+
+        self.assertEqual(len(columns), 50)
+        self.assertEqual(columns, records)
+        self.assertEqual(columns[3], records[3])
+        self.assertEqual(columns.rows([5, 3, 0]), [records[5], records[3], records[0]])
+        self.assertEqual(columns.segment(), to_columns(records))
+        self.assertEqual(json.loads(json.dumps(columns, default=to_json)), records)
+        self.assertEqual(pickle.loads(pickle.dumps(columns)), records)
+
+        codes, states = columns.codes('state')
+        self.assertEqual([states[code] for code in codes], [record['state'] for record in records])
+        self.assertIsNone(columns.numbers('tags'))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write_scan({'regions': {'us-east-1': {'ec2_instances': columns}}},
+                              os.path.join(tmp, 'scan_20240101_000000.scan'))
+            self.assertEqual(load_scan(path)['regions']['us-east-1']['ec2_instances'], records)
+
+
+if __name__ == '__main__':
+    unittest.main()
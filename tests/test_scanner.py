@@ -1,6 +1,15 @@
 import unittest
-from src.scanner import AWSResourceScanner
+from unittest.mock import MagicMock, patch
+from src.scanner import AWSResourceScanner, utilization_due
 import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from src.metric_cache import MetricCache
+from src.clients import client_pool
+from src.ratelimit import RateLimiter
+from benchmarks.fake_aws import FakeAWS
+from config import AWS_REGIONS
 
 
 class TestScanner(unittest.TestCase):
@@ -25,6 +34,210 @@ class TestScanner(unittest.TestCase):
         self.assertIsInstance(self.scanner.results, dict)
         self.assertIsInstance(self.scanner.results['regions'], dict)
 
+    @patch.object(AWSResourceScanner, 'save_results')
+    def test_parallel_scan_merges_regions(self, _save):
+        """Parallel scan fills every region and isolates per-region failures"""
+        scanner = AWSResourceScanner(parallel=True, region_concurrency=4, service_concurrency=3)
+
+        def fake_ec2(region, account_id=None):
+            if region == 'eu-west-1':
+                raise RuntimeError('boom')
+            return [{'instance_id': f'i-{region}', 'state': 'running', 'cpu_avg_7d': 1.0}]
+
+        with patch.object(scanner, 'scan_ec2_instances', side_effect=fake_ec2), \
+                patch.object(scanner, 'scan_ebs_volumes', return_value=[]), \
+                patch.object(scanner, 'scan_rds_instances', return_value=[]):
+            results = scanner.scan_all_regions()
+
+        self.assertEqual(list(results['regions']), list(scanner.results['region_timings']))
+        self.assertEqual(results['regions']['eu-west-1']['ec2_instances'], [])
+        self.assertIn('eu-west-1', results['region_errors'])
+        self.assertEqual(results['regions']['us-east-1']['ec2_instances'][0]['instance_id'], 'i-us-east-1')
+        self.assertEqual(results['summary']['total_ec2_instances'], len(results['regions']) - 1)
+
+    def test_service_failures_are_recorded(self):
+        """A throttled service or metric fetch shows up in scan_errors instead of an empty region"""
+        ec2 = MagicMock()
+        ec2.get_paginator.return_value.paginate.side_effect = RuntimeError('RequestLimitExceeded')
+        cloudwatch = MagicMock()
+        cloudwatch.meta.region_name = 'us-west-2'
+        cloudwatch.get_metric_data.side_effect = RuntimeError('Throttling')
+
+        with patch.object(self.scanner, '_client', return_value=ec2):
+            self.assertEqual(self.scanner.scan_ebs_volumes('us-east-1'), [])
+        self.scanner.fill_ec2_metrics(cloudwatch, [{'instance_id': 'i-1'}])
+
+        self.assertEqual(self.scanner.results['scan_errors'], {
+            'us-east-1': {'ebs_volumes': 'RequestLimitExceeded'},
+            'us-west-2': {'cloudwatch': 'Throttling'},
+        })
+
+    @patch.object(AWSResourceScanner, 'save_results')
+    def test_full_scan_against_throttling_fake_aws(self, _save):
+        """A scan through the synthetic AWS stand-in keeps every resource despite throttling"""
+        limiter = RateLimiter(enabled=True, rate=1000, burst=1000, max_attempts=10, sleep=lambda s: None,
+                              rng=lambda: 0.0)
+        fake = FakeAWS(AWS_REGIONS[:2], instances=1200, throttle_rate=0.2, limiter=limiter, sleep=lambda s: None)
+        client_pool.use_factory(fake.client)
+        self.addCleanup(client_pool.use_factory, None)
+
+        results = AWSResourceScanner(utilization_sketches=False).scan_all_regions()
+
+        self.assertEqual(results['scan_errors'], {})
+        self.assertEqual(results['summary']['total_ec2_instances'], 1200)
+        self.assertEqual(results['summary']['total_ebs_volumes'], 600)
+        self.assertGreater(limiter.totals()['retries'], 0)
+        scanned = f'resources_scanned{{region="{AWS_REGIONS[0]}",resource_type="ec2_instances"}}'
+        self.assertEqual(results['metrics']['counters'][scanned], 600)
+        instance = results['regions'][AWS_REGIONS[0]]['ec2_instances'][0]
+        self.assertEqual(instance['cpu_avg_7d'], round(instance['cpu_avg_7d'], 2))
+        self.assertGreater(instance['cpu_avg_7d'], 0)
+
+    def test_fill_ec2_metrics_batches_and_pages(self):
+        """GetMetricData is called once per 500 queries and NextToken pages are merged"""
+        instances = [{'instance_id': f'i-{n}'} for n in range(501)]
+        day = datetime(2024, 1, 1)
+        cloudwatch = MagicMock()
+
+        def get_metric_data(MetricDataQueries, NextToken=None, **kwargs):
+            self.assertLessEqual(len(MetricDataQueries), 500)
+            if NextToken is None and len(MetricDataQueries) == 500:
+                return {'MetricDataResults': [{'Id': 'm0_0', 'Timestamps': [day], 'Values': [2.0]}],
+                        'NextToken': 'page2'}
+            return {'MetricDataResults': [{'Id': q['Id'], 'Timestamps': [day], 'Values': [4.0]}
+                                          for q in MetricDataQueries]}
+
+        cloudwatch.get_metric_data.side_effect = get_metric_data
+        self.scanner.fill_ec2_metrics(cloudwatch, instances)
+
+        self.assertEqual(cloudwatch.get_metric_data.call_count, 3)
+        self.assertEqual(instances[0]['cpu_avg_7d'], 3.0)
+        self.assertEqual(instances[500]['cpu_avg_7d'], 4.0)
+
+    def test_scan_ebs_volumes_reads_every_page(self):
+        """Volumes beyond the first describe_volumes page are not dropped"""
+        pages = [
+            {'Volumes': [{'VolumeId': f'vol-{page}-{n}', 'Size': 8, 'State': 'available',
+                          'CreateTime': datetime(2024, 1, 1)} for n in range(3)]}
+            for page in range(2)
+        ]
+        ec2 = MagicMock()
+        ec2.get_paginator.return_value.paginate.return_value = iter(pages)
+
+        with patch.object(self.scanner, '_client', return_value=ec2):
+            volumes = self.scanner.scan_ebs_volumes('us-east-1')
+
+        ec2.get_paginator.assert_called_once_with('describe_volumes')
+        self.assertEqual(len(volumes), 6)
+        self.assertEqual(volumes[-1]['volume_id'], 'vol-1-2')
+        self.assertFalse(volumes[0]['attached'])
+
+    def test_incremental_metrics_fetch_only_missing_days(self):
+        """A second incremental run only asks CloudWatch for days not already cached"""
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        starts = []
+
+        def get_metric_data(MetricDataQueries, StartTime, EndTime, **kwargs):
+            starts.append(StartTime)
+            days = [StartTime + timedelta(days=n) for n in range((EndTime - StartTime).days)]
+            return {'MetricDataResults': [{'Id': q['Id'], 'Timestamps': days, 'Values': [1.0] * len(days)}
+                                          for q in MetricDataQueries]}
+
+        cloudwatch = MagicMock()
+        cloudwatch.get_metric_data.side_effect = get_metric_data
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = MetricCache(path=os.path.join(tmp, 'cache.json'))
+            scanner = AWSResourceScanner(incremental=True, metric_cache=cache)
+            instance = {'instance_id': 'i-1', 'type': 't3.micro', 'state': 'running'}
+            scanner.fill_ec2_metrics(cloudwatch, [dict(instance)])
+            self.assertEqual(starts[-1], today - timedelta(days=7))
+
+            # Pretend yesterday was never fetched
+            cache.resources['i-1']['metrics']['cpu_avg_7d'].pop((today - timedelta(days=1)).date().isoformat())
+            cache.save()
+
+            scanner = AWSResourceScanner(incremental=True, metric_cache=MetricCache(path=cache.path))
+            refreshed = scanner.fill_ec2_metrics(cloudwatch, [dict(instance)])
+            self.assertEqual(starts[-1], today - timedelta(days=1))
+            self.assertEqual(refreshed[0]['cpu_avg_7d'], 1.0)
+
+            # Nothing missing: no call at all
+            scanner.fill_ec2_metrics(cloudwatch, [dict(instance)])
+            self.assertEqual(len(starts), 2)
+
+    def test_utilization_sketches(self):
+        """Hourly series are summarized into percentiles; missing metrics read as None"""
+        def get_metric_data(MetricDataQueries, NextToken=None, **kwargs):
+            # CPU arrives split over two pages, memory has no datapoints
+            if NextToken is None:
+                return {'MetricDataResults': [{'Id': 'u0_0', 'Values': [float(v) for v in range(1, 51)]}],
+                        'NextToken': 'page2'}
+            return {'MetricDataResults': [{'Id': 'u0_0', 'Values': [float(v) for v in range(51, 101)]},
+                                          {'Id': 'u0_3', 'Values': []}]}
+
+        cloudwatch = MagicMock()
+        cloudwatch.get_metric_data.side_effect = get_metric_data
+        instance = {'instance_id': 'i-1'}
+        self.scanner.fill_utilization_sketches(cloudwatch, [instance])
+
+        self.assertAlmostEqual(instance['cpu_p95'], 95.0, delta=1.0)
+        self.assertAlmostEqual(instance['cpu_p50'], 50.0, delta=1.0)
+        self.assertIsNone(instance['memory_p95'])
+        self.assertIsNone(instance['network_in_p99'])
+
+    def test_memory_query_uses_agent_dimensions(self):
+        """mem_used_percent is queried with the dimension set the CloudWatch agent publishes"""
+        def get_metric_data(MetricDataQueries, **kwargs):
+            # Only the series with exactly the agent's dimensions has datapoints, as in CloudWatch
+            published = [{'Name': 'InstanceId', 'Value': 'i-1'}, {'Name': 'ImageId', 'Value': 'ami-1'},
+                         {'Name': 'InstanceType', 'Value': 'm5.large'}]
+            return {'MetricDataResults': [
+                {'Id': q['Id'], 'Values': [60.0] * 24 if q['MetricStat']['Metric']['Dimensions'] == published else []}
+                for q in MetricDataQueries if q['MetricStat']['Metric']['Namespace'] == 'CWAgent']}
+
+        cloudwatch = MagicMock()
+        cloudwatch.get_metric_data.side_effect = get_metric_data
+        instance = {'instance_id': 'i-1', 'image_id': 'ami-1', 'type': 'm5.large'}
+        self.scanner.fill_utilization_sketches(cloudwatch, [instance])
+        self.assertAlmostEqual(instance['memory_p95'], 60.0, delta=1.0)
+
+        cpu_query = cloudwatch.get_metric_data.call_args[1]['MetricDataQueries'][0]
+        self.assertEqual(cpu_query['MetricStat']['Metric']['Dimensions'], [{'Name': 'InstanceId', 'Value': 'i-1'}])
+
+        # Agent aggregating by InstanceId only (CWAGENT_DIMENSIONS=InstanceId)
+        with patch('src.scanner.CWAGENT_DIMENSIONS', ['InstanceId']):
+            self.scanner.fill_utilization_sketches(cloudwatch, [instance])
+        self.assertIsNone(instance['memory_p95'])
+
+    def test_utilization_percentiles_are_cached_between_refreshes(self):
+        """With a metric cache, percentiles are refetched only on the instance's refresh day"""
+        def get_metric_data(MetricDataQueries, **kwargs):
+            return {'MetricDataResults': [{'Id': q['Id'], 'Values': [10.0, 20.0]} for q in MetricDataQueries]}
+
+        cloudwatch = MagicMock()
+        cloudwatch.get_metric_data.side_effect = get_metric_data
+        instances = [{'instance_id': f'i-{n}'} for n in range(70)]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            scanner = AWSResourceScanner(metric_cache=MetricCache(path=os.path.join(tmp, 'cache.json')))
+            fetched = scanner.fill_utilization_sketches(cloudwatch, [dict(instance) for instance in instances])
+            first_calls = cloudwatch.get_metric_data.call_count
+
+            cached = [dict(instance) for instance in instances]
+            scanner.fill_utilization_sketches(cloudwatch, cached)
+            self.assertEqual(cloudwatch.get_metric_data.call_count, first_calls)
+            self.assertEqual(cached, fetched)
+            self.assertIsNotNone(cached[0]['cpu_p95'])
+
+        # Each instance is due once every UTILIZATION_REFRESH_DAYS, spread over the fleet
+        today = datetime.utcnow().date()
+        first_due = [next(offset for offset in range(1, 8)
+                          if utilization_due(instance['instance_id'], today.isoformat(), today + timedelta(offset)))
+                     for instance in instances]
+        self.assertLess(max(first_due.count(offset) for offset in range(1, 8)), 25)
+        self.assertFalse(utilization_due('i-1', today.isoformat(), today))
+
 
 if __name__ == '__main__':
     unittest.run()
@@ -0,0 +1,72 @@
+import functools
+import tempfile
+import unittest
+from unittest.mock import patch
+from benchmarks.fake_aws import FakeAWS
+from src.clients import client_pool
+from src.leases import FileLease
+from src.ratelimit import RateLimiter
+from src.scanner import AWSResourceScanner
+from src.shards import ShardRunner, plan_shards
+from config import AWS_REGIONS
+
+
+class TestShardRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        limiter = RateLimiter(enabled=False)
+        fake = FakeAWS(AWS_REGIONS[:2], instances=400, limiter=limiter)
+        client_pool.use_factory(fake.client)
+        self.addCleanup(client_pool.use_factory, None)
+        self.lease_factory = functools.partial(FileLease, directory=self.tmp.name)
+
+    @patch.object(AWSResourceScanner, 'save_results')
+    def test_shards_merge_into_one_scan_and_skip_leased_shards(self, save):
+        """Shards run on the pool and merge in order; a shard leased elsewhere is skipped and reported"""
+        shards = plan_shards('region', AWS_REGIONS[:3])
+        busy = self.lease_factory(f"shard-{AWS_REGIONS[1]}", owner='other-instance')
+        self.assertTrue(busy.acquire())
+
+        runner = ShardRunner(workers=2, stagger=0, lease_wait=0, incremental=False,
+                             lease_factory=self.lease_factory)
+        result = runner.run(shards)
+
+        self.assertEqual([shard['status'] for shard in result['shards']], ['done', 'skipped', 'done'])
+        scan = result['scan']
+        self.assertEqual(list(scan['regions']), [AWS_REGIONS[0], AWS_REGIONS[2]])
+        self.assertIn('other-instance', scan['region_errors'][AWS_REGIONS[1]])
+        self.assertEqual(scan['summary']['total_ec2_instances'], 200)
+        self.assertEqual(save.call_count, 1)  # one merged scan file, not one per shard
+        self.assertTrue(all(rec['region'] != AWS_REGIONS[1] for rec in result['analysis']['recommendations']))
+        self.assertGreater(len(result['analysis']['recommendations']), 0)
+
+        # The shard leases are released once the run is over
+        self.assertIsNone(self.lease_factory(f"shard-{AWS_REGIONS[0]}").holder())
+
+    @patch.object(AWSResourceScanner, 'save_results')
+    def test_api_calls_are_counted_once(self, _save):
+        """Concurrent shards' calls are counted once in the merged scan, not once per overlapping shard"""
+        limiter = RateLimiter(enabled=True)
+        fake = FakeAWS(AWS_REGIONS[:4], instances=400, limiter=limiter)
+        client_pool.use_factory(fake.client)
+        with patch('src.shards.rate_limiter', limiter), patch('src.scanner.rate_limiter', limiter):
+            result = ShardRunner(workers=4, stagger=0, incremental=False,
+                                 lease_factory=self.lease_factory).run(plan_shards('region', AWS_REGIONS[:4]))
+
+        self.assertEqual(result['scan']['api_calls']['attempts'], sum(fake.calls.values()))
+
+    def test_plan_shards(self):
+        self.assertEqual(plan_shards('region', ['a', 'b'], ['1', '2']),
+                         [{'name': 'a', 'regions': ['a'], 'accounts': ['1', '2']},
+                          {'name': 'b', 'regions': ['b'], 'accounts': ['1', '2']}])
+        self.assertEqual(plan_shards('account', ['a', 'b'], ['1', '2']),
+                         [{'name': '1', 'regions': ['a', 'b'], 'accounts': ['1']},
+                          {'name': '2', 'regions': ['a', 'b'], 'accounts': ['2']}])
+        with self.assertRaises(ValueError):
+            plan_shards('zone')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import random
+import unittest
+from src.sketch import QuantileSketch
+
+
+class TestQuantileSketch(unittest.TestCase):
+
+    def test_relative_accuracy(self):
+        """Quantiles stay within the configured relative error of the exact values"""
+        rng = random.Random(7)
+        values = [rng.lognormvariate(2, 1) for _ in range(20000)]
+        sketch = QuantileSketch(relative_accuracy=0.01, max_bins=2048)
+        sketch.extend(values)
+
+        ordered = sorted(values)
+        for q in (0.5, 0.95, 0.99):
+            exact = ordered[int(q * (len(ordered) - 1))]
+            self.assertAlmostEqual(sketch.quantile(q) / exact, 1.0, delta=0.011)
+
+    def test_memory_is_bounded(self):
+        """Bins never exceed max_bins and upper quantiles survive collapsing"""
+        sketch = QuantileSketch(relative_accuracy=0.01, max_bins=64)
+        sketch.extend(float(v) for v in range(1, 100001))
+        self.assertLessEqual(len(sketch.bins), 64)
+        self.assertAlmostEqual(sketch.quantile(0.99) / 99000, 1.0, delta=0.011)
+
+    def test_zeros_and_empty(self):
+        sketch = QuantileSketch()
+        self.assertIsNone(sketch.quantile(0.5))
+        sketch.extend([0.0, 0.0, 0.0, 50.0])
+        self.assertEqual(sketch.quantile(0.5), 0.0)
+        self.assertLessEqual(sketch.quantile(1.0), 50.0)
+
+        other = QuantileSketch()
+        other.extend([50.0] * 4)
+        sketch.merge(other)
+        self.assertEqual(sketch.count, 8)
+        self.assertAlmostEqual(sketch.quantile(0.99), 50.0, delta=0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
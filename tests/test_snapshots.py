@@ -0,0 +1,86 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from src.snapshots import SnapshotPipeline
+
+
+class FakeEC2:
+    """Snapshots complete after `polls` DescribeSnapshots rounds; vol-err's snapshot fails"""
+
+    def __init__(self, polls=2):
+        self.polls = polls
+        self.snapshots = {}
+        self.deleted = []
+        self.describe_calls = []
+        self.max_in_flight = 0
+
+    def create_snapshot(self, VolumeId, Description):
+        snapshot_id = f"snap-{VolumeId}"
+        self.snapshots[snapshot_id] = {'volume': VolumeId, 'age': 0}
+        in_flight = sum(1 for s in self.snapshots.values() if s['age'] < self.polls)
+        self.max_in_flight = max(self.max_in_flight, in_flight)
+        return {'SnapshotId': snapshot_id}
+
+    def describe_snapshots(self, SnapshotIds):
+        self.describe_calls.append(list(SnapshotIds))
+        result = []
+        for snapshot_id in SnapshotIds:
+            snapshot = self.snapshots[snapshot_id]
+            snapshot['age'] += 1
+            if snapshot['volume'] == 'vol-err':
+                state = 'error'
+            else:
+                state = 'completed' if snapshot['age'] >= self.polls else 'pending'
+            result.append({'SnapshotId': snapshot_id, 'State': state})
+        return {'Snapshots': result}
+
+    def delete_volume(self, VolumeId):
+        self.deleted.append(VolumeId)
+
+
+class TestSnapshotPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.state_path = os.path.join(self.tmp.name, 'state.json')
+
+    def pipeline(self, **kwargs):
+        return SnapshotPipeline(state_path=self.state_path, poll_interval=0, sleep=lambda s: None, **kwargs)
+
+    def test_caps_in_flight_and_polls_in_batches(self):
+        ec2 = FakeEC2(polls=2)
+        volumes = [f"vol-{i}" for i in range(7)] + ['vol-err']
+        with patch('src.snapshots.get_client', return_value=ec2):
+            outcomes = self.pipeline(max_in_flight=3).run('us-east-1', volumes)
+
+        self.assertLessEqual(ec2.max_in_flight, 3)
+        self.assertTrue(all(len(call) <= 3 for call in ec2.describe_calls))
+        self.assertEqual(sorted(ec2.deleted), sorted(volumes[:-1]))
+        self.assertIsNone(outcomes['vol-0'][1])
+        self.assertIn('failed', outcomes['vol-err'][1])
+        with open(self.state_path) as f:
+            self.assertEqual(json.load(f)['volumes'], {})
+
+    def test_resumes_snapshots_left_in_flight(self):
+        ec2 = FakeEC2(polls=1)
+        ec2.snapshots['snap-vol-1'] = {'volume': 'vol-1', 'age': 0}
+        with open(self.state_path, 'w') as f:
+            json.dump({'version': 1, 'volumes': {'vol-1': {'region': 'eu-west-1', 'status': 'snapshotting',
+                                                           'snapshot_id': 'snap-vol-1', 'started': None}}}, f)
+
+        pipeline = self.pipeline()
+        self.assertEqual(pipeline.pending_regions(), ['eu-west-1'])
+        ec2.create_snapshot = MagicMock(side_effect=AssertionError('must not snapshot again'))
+        with patch('src.snapshots.get_client', return_value=ec2):
+            outcomes = pipeline.resume()
+
+        self.assertEqual(ec2.deleted, ['vol-1'])
+        self.assertEqual(outcomes['vol-1'], ('Created snapshot snap-vol-1, deleted volume vol-1', None))
+        self.assertEqual(pipeline.pending_regions(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import copy
+import json
+import os
+import tempfile
+import unittest
+from src.storage import ScanFile, export_json, latest_scan_file, load_scan, write_delta, write_scan
+
+
+def sample_scan():
+    return {
+        'scan_time': '2024-01-01T02:00:00',
+        'regions': {
+            'us-east-1': {
+                'ec2_instances': [
+                    {'instance_id': 'i-1', 'type': 't3.micro', 'state': 'running', 'launch_time': None,
+                     'cpu_avg_7d': 1.5, 'tags': {'Name': 'web'}},
+                    {'instance_id': 'i-2', 'type': 't3.small', 'state': 'stopped', 'cpu_avg_7d': 0.0, 'tags': {}},
+                ],
+                'ebs_volumes': [{'volume_id': 'vol-1', 'size_gb': 8, 'state': 'available', 'attached': False}],
+                'rds_instances': [],
+            },
+            'eu-west-1': {'ec2_instances': [], 'ebs_volumes': [], 'rds_instances': []},
+        },
+        'summary': {'total_ec2_instances': 2},
+    }
+
+
+class TestStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'scan_20240101_020000.scan')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_is_lossless(self):
+        """Compact files load back to exactly the original dict, including missing keys"""
+        write_scan(sample_scan(), self.path)
+        self.assertEqual(load_scan(self.path), sample_scan())
+
+    def test_partial_load(self):
+        """Index gives counts and a single slice can be loaded on its own"""
+        write_scan(sample_scan(), self.path)
+        scan_file = ScanFile(self.path)
+        self.assertEqual(scan_file.counts()['us-east-1']['ec2_instances'], 2)
+        self.assertEqual(scan_file.header['summary'], {'total_ec2_instances': 2})
+
+        sliced = load_scan(self.path, regions=['us-east-1'], resource_types=['ebs_volumes'])
+        self.assertEqual(list(sliced['regions']), ['us-east-1'])
+        self.assertEqual(list(sliced['regions']['us-east-1']), ['ebs_volumes'])
+
+    def test_json_export_and_legacy_files(self):
+        """Exported JSON matches, and legacy JSON scans load through the same API"""
+        write_scan(sample_scan(), self.path)
+        exported = export_json(self.path)
+        with open(exported) as f:
+            self.assertEqual(json.load(f), sample_scan())
+        self.assertEqual(load_scan(exported, resource_types=['rds_instances'])['regions']['eu-west-1'],
+                         {'rds_instances': []})
+        self.assertEqual(latest_scan_file(self.tmp.name), self.path)
+
+    def test_delta_round_trip(self):
+        """A delta against a base reproduces the scan: changed, added, removed and reordered records"""
+        write_scan(sample_scan(), self.path)
+        scan = copy.deepcopy(sample_scan())
+        instances = scan['regions']['us-east-1']['ec2_instances']
+        instances[0]['cpu_avg_7d'] = 2.5
+        instances.reverse()
+        instances.append({'instance_id': 'i-3', 'type': 'm5.large', 'state': 'running'})
+        scan['regions']['us-east-1']['ebs_volumes'] = []
+        scan['regions']['ap-south-1'] = {'ec2_instances': [], 'ebs_volumes': [], 'rds_instances': []}
+        scan['scan_time'] = '2024-01-02T02:00:00'
+
+        delta_path = os.path.join(self.tmp.name, 'scan_20240102_020000.delta')
+        write_delta(scan, sample_scan(), os.path.basename(self.path), delta_path)
+        self.assertEqual(load_scan(delta_path), scan)
+        self.assertEqual(load_scan(delta_path, resource_types=['ebs_volumes'])['regions']['us-east-1'],
+                         {'ebs_volumes': []})
+
+
+if __name__ == '__main__':
+    unittest.main()